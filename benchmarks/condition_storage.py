@@ -0,0 +1,169 @@
+"""
+Compares the two storage formats of bogie checksheet conditions
+(BOGIE_CONDITION_STORAGE=jsonb vs compact, see kpa_api/conditions.py).
+
+    python -m benchmarks.condition_storage --rows 10000
+    python -m benchmarks.condition_storage --rows 1000000 --database
+
+Without --database, forms from benchmarks.datagen are encoded in memory: the
+stored bytes per row are estimated (JSONB as its JSON text, the compact format as
+a Postgres integer array), and the Python cost of encoding and decoding is timed.
+These are estimates only: they leave out JSONB's binary overhead, tuple headers,
+TOAST compression and indexes, so decide on the --database figures.
+With --database (migrations applied), the same forms are loaded into two
+temporary tables holding only the condition columns of each format, with the
+GIN indexes each format has in bogie_checksheets. Reported: table, TOAST and
+index sizes (in total and per row; the compact format's include the dictionary), the
+time of a full condition aggregation (what `python -m kpa_api.rollups rebuild`
+scans) and of an indexed search for one condition, best of --repeat runs.
+Nothing is written outside the temporary tables except dictionary codes.
+"""
+import argparse
+import json
+import time
+
+from benchmarks.datagen import generate
+from kpa_api import conditions, schemas
+
+# Postgres array header (24 bytes for one dimension) + 4 bytes per int4 element
+ARRAY_HEADER_BYTES = 24
+
+
+def _forms(rows: int, seed: int):
+    return [schemas.BogieChecksheetCreate.model_validate(payload) for payload in generate("bogie", rows, seed)]
+
+
+def _jsonb_objects(form):
+    return (
+        form.bmbcChecksheet.model_dump(mode="json") if form.bmbcChecksheet else None,
+        form.bogieChecksheet.model_dump(mode="json") if form.bogieChecksheet else None,
+    )
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_offline(rows: int, seed: int, repeat: int) -> dict:
+    forms = _forms(rows, seed)
+    # Offline codes: numbered in order of appearance, as the dictionary would
+    conditions.condition_codes.add(
+        (code, condition) for code, condition in enumerate(sorted(conditions.form_conditions(forms)), start=1)
+    )
+    encoded = [conditions.encode(form) for form in forms]
+    jsonb_bytes = sum(
+        len(json.dumps(value, separators=(",", ":"))) for form in forms for value in _jsonb_objects(form) if value
+    )
+    compact_bytes = sum(ARRAY_HEADER_BYTES + 4 * len(elements) for elements in encoded)
+
+    encode = _best(lambda: [conditions.encode(form) for form in forms], repeat)
+    decode = _best(lambda: [conditions.decode(elements) for elements in encoded], repeat)
+    return {
+        "rows": rows,
+        "estimatedBytesPerRow": {"jsonb": round(jsonb_bytes / rows, 1), "compact": round(compact_bytes / rows, 1)},
+        "encodeUsPerRow": round(1e6 * encode / rows, 2),
+        "decodeUsPerRow": round(1e6 * decode / rows, 2),
+        "dictionarySize": len(conditions.form_conditions(forms)),
+    }
+
+
+def run_database(rows: int, seed: int, repeat: int, chunk_size: int) -> dict:
+    from sqlalchemy import text
+
+    from kpa_api import models
+    from kpa_api.database import get_engine
+
+    forms = _forms(rows, seed)
+    engine = get_engine()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        conditions.assign_codes(connection, conditions.form_conditions(forms))
+        connection.execute(text(
+            "CREATE TEMP TABLE bench_conditions_jsonb (id serial PRIMARY KEY, bmbc_checksheet jsonb, bogie_checksheet_details jsonb)"
+        ))
+        connection.execute(text("CREATE TEMP TABLE bench_conditions_compact (id serial PRIMARY KEY, conditions integer[])"))
+        for start in range(0, rows, chunk_size):
+            chunk = forms[start:start + chunk_size]
+            connection.execute(
+                text("INSERT INTO bench_conditions_jsonb (bmbc_checksheet, bogie_checksheet_details) VALUES (CAST(:bmbc AS jsonb), CAST(:details AS jsonb))"),
+                [dict(zip(("bmbc", "details"), (json.dumps(value) if value else None for value in _jsonb_objects(form)))) for form in chunk],
+            )
+            connection.execute(
+                text("INSERT INTO bench_conditions_compact (conditions) VALUES (:conditions)"),
+                [{"conditions": conditions.encode(form)} for form in chunk],
+            )
+        connection.execute(text("CREATE INDEX ON bench_conditions_jsonb USING gin (bmbc_checksheet jsonb_path_ops)"))
+        connection.execute(text("CREATE INDEX ON bench_conditions_jsonb USING gin (bogie_checksheet_details jsonb_path_ops)"))
+        connection.execute(text("CREATE INDEX ON bench_conditions_compact USING gin (conditions)"))
+        connection.execute(text("VACUUM ANALYZE bench_conditions_jsonb"))
+        connection.execute(text("VACUUM ANALYZE bench_conditions_compact"))
+
+        def sizes(table: str, extra: str = None) -> dict:
+            heap, total, indexes = connection.execute(text(
+                f"SELECT pg_relation_size('{table}'), pg_table_size('{table}'), pg_indexes_size('{table}')"
+            )).one()
+            result = {"tableBytes": heap, "toastBytes": total - heap, "indexBytes": indexes}
+            if extra:
+                result["dictionaryBytes"] = connection.execute(text(f"SELECT pg_total_relation_size('{extra}')")).scalar()
+            result["bytesPerRow"] = round(sum(result.values()) / rows, 1)
+            return result
+
+        def timed(sql: str) -> float:
+            return round(1000 * _best(lambda: connection.execute(text(sql)).all(), repeat), 1)
+
+        bolster_cracked = conditions.COMPONENT_NUMBERS["bolster"] << conditions.CODE_BITS | conditions.condition_codes.code("Cracked")
+        result = {
+            "rows": rows,
+            "jsonb": {
+                **sizes("bench_conditions_jsonb"),
+                "aggregateMs": timed(
+                    "SELECT e.key, e.value, count(*) FROM bench_conditions_jsonb,"
+                    " jsonb_each_text(coalesce(bmbc_checksheet, '{}') || coalesce(bogie_checksheet_details, '{}')) e"
+                    " GROUP BY 1, 2"
+                ),
+                "searchMs": timed(
+                    "SELECT count(*) FROM bench_conditions_jsonb WHERE bogie_checksheet_details @> '{\"bolster\": \"Cracked\"}'"
+                ),
+            },
+            "compact": {
+                **sizes("bench_conditions_compact", models.BogieChecksheetConditionCode.__tablename__),
+                # Grouped on the codes, decoded once per group, as rollups.rebuild could
+                "aggregateMs": timed(
+                    "SELECT g.element >> 24, c.condition, g.count FROM"
+                    " (SELECT element, count(*) FROM bench_conditions_compact, unnest(conditions) element GROUP BY 1) g"
+                    " LEFT JOIN bogie_checksheet_condition_codes c ON c.code = g.element & 16777215"
+                ),
+                "searchMs": timed(f"SELECT count(*) FROM bench_conditions_compact WHERE conditions && ARRAY[{bolster_cracked}]"),
+            },
+        }
+        connection.execute(text("DROP TABLE bench_conditions_jsonb, bench_conditions_compact"))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows per INSERT with --database")
+    parser.add_argument("--database", action="store_true", help="Measure in the configured database instead of in memory")
+    args = parser.parse_args()
+
+    if args.database:
+        result = run_database(args.rows, args.seed, args.repeat, args.chunk_size)
+        jsonb, compact = result["jsonb"], result["compact"]
+        result["sizeSavingPercent"] = round(100 * (1 - compact["bytesPerRow"] / jsonb["bytesPerRow"]), 1)
+        result["aggregateSpeedup"] = round(jsonb["aggregateMs"] / max(compact["aggregateMs"], 1e-9), 2)
+    else:
+        result = run_offline(args.rows, args.seed, args.repeat)
+        estimated = result["estimatedBytesPerRow"]
+        result["estimatedSizeSavingPercent"] = round(100 * (1 - estimated["compact"] / estimated["jsonb"]), 1)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
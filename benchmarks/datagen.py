@@ -0,0 +1,232 @@
+"""
+Generates realistic, reproducible bogie checksheet and wheel specification
+payloads for benchmarking, from a few thousand up to tens of millions of forms.
+
+    python -m benchmarks.datagen --bogie 100000 --wheel 100000 --output data/
+    python -m benchmarks.datagen --bogie 1000000 --wheel 1000000 --database
+
+--output writes bogie_checksheets.ndjson and wheel_specifications.ndjson (one
+BogieChecksheetCreate / WheelSpecificationCreate payload per line; the bogie file
+can be posted as-is to /api/forms/bogie-checksheet/bulk). --database inserts the
+forms into the configured database in chunks, through the same write paths as
+the API, so rollups, measurements and partitions are populated as well.
+
+The same --seed always produces the same forms. Form numbers carry --prefix, so
+several data sets can be loaded side by side.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from typing import Iterator
+
+# Shape of the generated data; benchmarks.load draws its filter values from here.
+FIRST_DATE = date(2023, 1, 1)
+DAYS = 730
+INSPECTORS = [f"user_id_{i:03d}" for i in range(200)]
+DIVISIONS = ["NR", "CR", "WR", "ER", "SR", "NER", "NFR", "SCR", "SER", "ECR", "NWR", "WCR"]
+MAKERS = ["RDSO", "ICF", "RCF", "MCF"]
+
+# bmbcChecksheet values are recorded upper-case, bogieChecksheet values in title case
+BMBC_CONDITIONS = (["GOOD"] * 16) + ["WORN OUT", "WORN OUT", "DAMAGED", "CRACKED"]
+BOGIE_CONDITIONS = (["Good"] * 16) + ["Worn", "Worn", "Cracked", "Damaged"]
+
+# Share of wheel measurements generated outside their tolerance limits
+OUT_OF_TOLERANCE_RATE = 0.03
+
+
+def form_date(rng: random.Random) -> date:
+    return FIRST_DATE + timedelta(days=rng.randrange(DAYS))
+
+
+def bogie_checksheet_payload(rng: random.Random, index: int, prefix: str = "BENCH") -> dict:
+    """One BogieChecksheetCreate payload as JSON-compatible dict."""
+    inspection_date = form_date(rng)
+    incoming = inspection_date - timedelta(days=rng.randrange(1, 15))
+    return {
+        "bmbcChecksheet": {
+            "adjustingTube": rng.choice(BMBC_CONDITIONS),
+            "cylinderBody": rng.choice(BMBC_CONDITIONS),
+            "pistonTrunnion": rng.choice(BMBC_CONDITIONS),
+            "plungerSpring": rng.choice(BMBC_CONDITIONS),
+        },
+        "bogieChecksheet": {
+            "axleGuide": rng.choice(BOGIE_CONDITIONS),
+            "bogieFrameCondition": rng.choice(BOGIE_CONDITIONS),
+            "bolster": rng.choice(BOGIE_CONDITIONS),
+            "bolsterSuspensionBracket": rng.choice(BOGIE_CONDITIONS),
+            "lowerSpringSeat": rng.choice(BOGIE_CONDITIONS),
+        },
+        "bogieDetails": {
+            "bogieNo": f"BG{rng.randrange(1, 50000):05d}",
+            "dateOfIOH": (inspection_date - timedelta(days=rng.randrange(30, 540))).isoformat(),
+            "deficitComponents": "None" if rng.random() < 0.9 else rng.choice(["Bolster", "Axle guide", "Spring seat"]),
+            "incomingDivAndDate": f"{rng.choice(DIVISIONS)} / {incoming.isoformat()}",
+            "makerYearBuilt": f"{rng.choice(MAKERS)}/{rng.randrange(1995, 2025)}",
+        },
+        "formNumber": f"BOGIE-{prefix}-{index:09d}",
+        "inspectionBy": rng.choice(INSPECTORS),
+        "inspectionDate": inspection_date.isoformat(),
+    }
+
+
+def _value(rng: random.Random, low: float, high: float, decimals: int = 0) -> str:
+    """A reading within [low, high], or just outside it at OUT_OF_TOLERANCE_RATE."""
+    span = high - low
+    if rng.random() < OUT_OF_TOLERANCE_RATE:
+        value = rng.choice([low - rng.uniform(0.01, 0.1) * span, high + rng.uniform(0.01, 0.1) * span])
+    else:
+        value = rng.uniform(low, high)
+    return f"{value:.{decimals}f}"
+
+
+def wheel_specification_fields(rng: random.Random) -> dict:
+    """Measurements in the notations used by the forms (see schemas.WheelSpecificationFields)."""
+    return {
+        "condemningDia": f"{_value(rng, 800, 900)} (800-900)",
+        "lastShopIssueSize": f"{_value(rng, 800, 900)} (800-900)",
+        "treadDiameterNew": f"{_value(rng, 900, 1000)} (900-1000)",
+        "wheelGauge": f"{_value(rng, 1599, 1602)} (+2,-1)",
+        "axleBoxHousingBoreDia": f"{_value(rng, 280.030, 280.052, 3)} (+0.030/+0.052)",
+        "bearingSeatDiameter": "130.043 TO 130.068",
+        "intermediateWWP": "20 TO 28",
+        "rollerBearingBoreDia": f"{_value(rng, 129.975, 130.0, 3)} (+0.0/-0.025)",
+        "rollerBearingOuterDia": f"{_value(rng, 279.965, 280.0, 3)} (+0.0/-0.035)",
+        "rollerBearingWidth": f"{_value(rng, 92.75, 93.0, 3)} (+0/-0.250)",
+        "variationSameAxle": _value(rng, 0, 0.5, 1),
+        "variationSameBogie": _value(rng, 0, 5),
+        "variationSameCoach": _value(rng, 0, 13),
+        "wheelDiscWidth": f"{_value(rng, 127, 131)} (+4/-0)",
+        "wheelProfile": f"{_value(rng, 22, 30, 1)} Flange Thickness",
+    }
+
+
+def wheel_specification_payload(rng: random.Random, index: int, prefix: str = "BENCH") -> dict:
+    """One WheelSpecificationCreate payload as JSON-compatible dict."""
+    return {
+        "fields": wheel_specification_fields(rng),
+        "formNumber": f"WHEEL-{prefix}-{index:09d}",
+        "submittedBy": rng.choice(INSPECTORS),
+        "submittedDate": form_date(rng).isoformat(),
+    }
+
+
+def generate(kind: str, count: int, seed: int = 1, prefix: str = "BENCH", start: int = 0) -> Iterator[dict]:
+    """Yields `count` payloads of `kind` ("bogie" or "wheel"); form numbers start at `start`."""
+    rng = random.Random(f"{seed}:{kind}:{prefix}:{start}")
+    make = bogie_checksheet_payload if kind == "bogie" else wheel_specification_payload
+    for index in range(start, start + count):
+        yield make(rng, index, prefix)
+
+
+def _chunks(payloads: Iterator[dict], size: int) -> Iterator[list]:
+    chunk = []
+    for payload in payloads:
+        chunk.append(payload)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert_wheel_specifications(db, items) -> int:
+    """Inserts a chunk of wheel specifications and their parsed measurements; returns the number inserted."""
+    from sqlalchemy import insert
+
+    from kpa_api import crud, models, partitions
+    from kpa_api.measurements import measurement_rows
+
+    partitions.ensure_partitions(db.get_bind(), models.WheelSpecification.__tablename__, {item.submittedDate for item in items})
+    table = models.WheelSpecification.__table__
+    statement = crud.claiming_insert_statement(
+        models.WheelSpecification, models.WheelSpecificationFormNumber,
+        [
+            dict(
+                form_number=item.formNumber,
+                submitted_by=item.submittedBy,
+                submitted_date=item.submittedDate,
+                fields=item.fields.model_dump(mode="json"),
+            )
+            for item in items
+        ],
+    ).returning(table.c.id, table.c.fields)
+
+    inserted = db.execute(statement).all()
+    measurements = [
+        dict(
+            wheel_specification_id=spec_id,
+            field=row.field,
+            nominal=row.nominal,
+            min_value=row.min_value,
+            max_value=row.max_value,
+        )
+        for spec_id, fields in inserted
+        for row in measurement_rows(fields)
+    ]
+    if measurements:
+        db.execute(insert(models.WheelSpecificationMeasurement), measurements)
+    db.commit()
+    return len(inserted)
+
+
+def load_database(bogie: int, wheel: int, seed: int, prefix: str, chunk_size: int):
+    from kpa_api import crud, schemas
+    from kpa_api.cache import wheel_specifications_cache
+    from kpa_api.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        for kind, count in (("bogie", bogie), ("wheel", wheel)):
+            inserted = 0
+            started = time.perf_counter()
+            for chunk in _chunks(generate(kind, count, seed, prefix), chunk_size):
+                if kind == "bogie":
+                    items = [schemas.BogieChecksheetCreate.model_validate(payload) for payload in chunk]
+                    inserted += len(crud.bulk_create_bogie_checksheets(db, items))
+                else:
+                    items = [schemas.WheelSpecificationCreate.model_validate(payload) for payload in chunk]
+                    inserted += _insert_wheel_specifications(db, items)
+                print(f"\r{kind}: {inserted}/{count} inserted", end="", file=sys.stderr)
+            elapsed = time.perf_counter() - started
+            print(f"\r{kind}: {inserted}/{count} inserted in {elapsed:.1f}s ({inserted / max(elapsed, 1e-9):.0f}/s)", file=sys.stderr)
+        wheel_specifications_cache.invalidate()
+    finally:
+        db.close()
+
+
+def write_files(bogie: int, wheel: int, seed: int, prefix: str, directory: str):
+    os.makedirs(directory, exist_ok=True)
+    for kind, count, name in (("bogie", bogie, "bogie_checksheets.ndjson"), ("wheel", wheel, "wheel_specifications.ndjson")):
+        if not count:
+            continue
+        path = os.path.join(directory, name)
+        with open(path, "w", encoding="utf-8") as file:
+            for payload in generate(kind, count, seed, prefix):
+                file.write(json.dumps(payload, separators=(",", ":")) + "\n")
+        print(f"Wrote {count} forms to {path}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bogie", type=int, default=10000, help="Number of bogie checksheets")
+    parser.add_argument("--wheel", type=int, default=10000, help="Number of wheel specifications")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--prefix", default="BENCH", help="Part of every generated formNumber")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Forms per INSERT with --database")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--output", metavar="DIR", help="Write NDJSON files to DIR")
+    target.add_argument("--database", action="store_true", help="Insert into the configured database")
+    args = parser.parse_args()
+
+    if args.database:
+        load_database(args.bogie, args.wheel, args.seed, args.prefix, args.chunk_size)
+    else:
+        write_files(args.bogie, args.wheel, args.seed, args.prefix, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""
+Drives the form endpoints of a running API at a fixed concurrency and reports
+latency percentiles, throughput and database round-trips per request.
+
+    uvicorn kpa_api.main:app --workers 1
+    python -m benchmarks.datagen --bogie 100000 --wheel 100000 --database
+    python -m benchmarks.load --concurrency 16 --duration 30 --output results/run.json
+    python -m benchmarks.load ... --baseline results/baseline.json --threshold 10
+
+Scenarios (--scenario, repeatable; all by default):
+    post_bogie_checksheet    POST /api/forms/bogie-checksheet with new forms
+    get_wheel_unfiltered     GET /api/forms/wheel-specifications (first page)
+    get_wheel_filtered       GET ... filtered by submittedBy or submittedDate
+    get_wheel_paginated      GET ... following `next` cursors page after page
+
+Each worker is a thread with its own keep-alive connection. Round-trips are the
+statements and commits the server reports in /internal/pool-stats, so run the
+server with a single worker process. GET responses may be served from the
+response cache; set RESPONSE_CACHE_TTL_SECONDS=0 on the server to measure the
+database path only.
+
+Results are written as JSON. With --baseline, every scenario is compared with the
+baseline run and the command exits with status 1 if p50/p95/p99 latency or
+round-trips per request rose, or throughput fell, by more than --threshold percent.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks import datagen
+
+WHEEL_SPECIFICATIONS_PATH = "/api/forms/wheel-specifications"
+
+
+class Client:
+    """One keep-alive HTTP/1.1 connection; reconnects after errors."""
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.timeout = timeout
+        self._connection = None
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None):
+        if self._connection is None:
+            self._connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        try:
+            self._connection.request(method, path, body=body, headers=headers)
+            response = self._connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            self._connection.close()
+            self._connection = None
+            raise
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+
+
+# --- Scenarios ---
+# A scenario is a factory returning, per worker, a function that performs one request.
+
+def post_bogie_checksheet(run_id: str, worker: int, seed: int):
+    payloads = datagen.generate("bogie", 10 ** 9, seed=seed, prefix=f"{run_id}-{worker}")
+
+    def step(client: Client):
+        return client.request("POST", "/api/forms/bogie-checksheet", json.dumps(next(payloads)).encode())
+    return step
+
+
+def get_wheel_unfiltered(run_id: str, worker: int, seed: int):
+    def step(client: Client):
+        return client.request("GET", f"{WHEEL_SPECIFICATIONS_PATH}?limit=100")
+    return step
+
+
+def get_wheel_filtered(run_id: str, worker: int, seed: int):
+    rng = random.Random(f"{seed}:{worker}")
+
+    def step(client: Client):
+        if rng.random() < 0.5:
+            query = {"submittedBy": rng.choice(datagen.INSPECTORS), "limit": 100}
+        else:
+            query = {"submittedDate": datagen.form_date(rng).isoformat(), "limit": 100}
+        return client.request("GET", f"{WHEEL_SPECIFICATIONS_PATH}?{urlencode(query)}")
+    return step
+
+
+def get_wheel_paginated(run_id: str, worker: int, seed: int):
+    state = {"cursor": None}
+
+    def step(client: Client):
+        query = {"limit": 100}
+        if state["cursor"]:
+            query["cursor"] = state["cursor"]
+        status, body = client.request("GET", f"{WHEEL_SPECIFICATIONS_PATH}?{urlencode(query)}")
+        # Start over from the first page at the end of the table or after an error
+        state["cursor"] = json.loads(body).get("next") if status == 200 else None
+        return status, body
+    return step
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "post_bogie_checksheet": post_bogie_checksheet,
+    "get_wheel_unfiltered": get_wheel_unfiltered,
+    "get_wheel_filtered": get_wheel_filtered,
+    "get_wheel_paginated": get_wheel_paginated,
+}
+
+
+# --- Measurement ---
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), round(fraction * len(sorted_values) + 0.5)))
+    return sorted_values[rank - 1]
+
+
+def server_round_trips(base_url: str) -> Optional[int]:
+    """Statements plus commits executed so far by the server, or None if pool stats are unavailable."""
+    client = Client(base_url)
+    try:
+        status, body = client.request("GET", "/internal/pool-stats")
+    except (OSError, http.client.HTTPException):
+        return None
+    finally:
+        client.close()
+    if status != 200:
+        return None
+    pools = json.loads(body).get("pools", [])
+    if not pools or any("statements" not in pool for pool in pools):
+        return None
+    return sum(pool["statements"] + pool["commits"] for pool in pools)
+
+
+def run_scenario(name: str, base_url: str, concurrency: int, duration: float, warmup: float, seed: int) -> dict:
+    run_id = uuid.uuid4().hex[:8]
+    steps = [SCENARIOS[name](run_id, worker, seed) for worker in range(concurrency)]
+    latencies: List[List[float]] = [[] for _ in range(concurrency)]
+    statuses: List[Counter] = [Counter() for _ in range(concurrency)]
+    phase = {"measuring": False, "stop": False}
+    ready = threading.Barrier(concurrency + 1)
+
+    def worker(index: int):
+        client = Client(base_url)
+        ready.wait()
+        try:
+            while not phase["stop"]:
+                started = time.perf_counter()
+                try:
+                    status, _ = steps[index](client)
+                except (OSError, http.client.HTTPException):
+                    status = "connection-error"
+                elapsed = time.perf_counter() - started
+                if phase["measuring"]:
+                    latencies[index].append(elapsed)
+                    statuses[index][str(status)] += 1
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=worker, args=(index,), daemon=True) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    time.sleep(warmup)
+
+    round_trips_before = server_round_trips(base_url)
+    phase["measuring"] = True
+    measured_from = time.perf_counter()
+    time.sleep(duration)
+    phase["measuring"] = False
+    measured_for = time.perf_counter() - measured_from
+    phase["stop"] = True
+    for thread in threads:
+        thread.join()
+    round_trips_after = server_round_trips(base_url)
+
+    all_latencies = sorted(value for worker_latencies in latencies for value in worker_latencies)
+    status_counts = sum(statuses, Counter())
+    requests = len(all_latencies)
+    errors = sum(count for status, count in status_counts.items() if not status.startswith(("2", "3")))
+    # Warm-up and in-flight requests also hit the database; the counter is
+    # sampled outside the measured window, so this is a close upper bound.
+    round_trips = None
+    if requests and round_trips_before is not None and round_trips_after is not None:
+        round_trips = round((round_trips_after - round_trips_before) / requests, 2)
+
+    return {
+        "requests": requests,
+        "errors": errors,
+        "statuses": dict(sorted(status_counts.items())),
+        "throughputRps": round(requests / measured_for, 1),
+        "latencyMs": {
+            "p50": round(1000 * percentile(all_latencies, 0.50), 2),
+            "p95": round(1000 * percentile(all_latencies, 0.95), 2),
+            "p99": round(1000 * percentile(all_latencies, 0.99), 2),
+            "max": round(1000 * (all_latencies[-1] if all_latencies else 0.0), 2),
+        },
+        "roundTripsPerRequest": round_trips,
+    }
+
+
+# --- Baseline comparison ---
+
+# (metric path, True if higher is worse)
+COMPARED_METRICS = [
+    (("latencyMs", "p50"), True),
+    (("latencyMs", "p95"), True),
+    (("latencyMs", "p99"), True),
+    (("throughputRps",), False),
+    (("roundTripsPerRequest",), True),
+]
+
+
+def _metric(result: dict, path) -> Optional[float]:
+    for key in path:
+        result = result.get(key) if isinstance(result, dict) else None
+    return result
+
+
+def compare(current: dict, baseline: dict, threshold_percent: float) -> List[dict]:
+    """Returns one entry per compared metric of every scenario present in both runs."""
+    comparisons = []
+    for name, result in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        for path, higher_is_worse in COMPARED_METRICS:
+            now, before = _metric(result, path), _metric(base, path)
+            if now is None or before is None:
+                continue
+            change = 100.0 * (now - before) / before if before else (0.0 if now == before else float("inf"))
+            worse = change if higher_is_worse else -change
+            comparisons.append({
+                "scenario": name,
+                "metric": ".".join(path),
+                "baseline": before,
+                "current": now,
+                "changePercent": round(change, 1),
+                "regression": worse > threshold_percent,
+            })
+    return comparisons
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of the running API")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Scenario to run (repeatable)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent connections")
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Unmeasured seconds before each scenario")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "startedAt": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "url": args.url,
+            "concurrency": args.concurrency,
+            "durationSeconds": args.duration,
+            "warmupSeconds": args.warmup,
+            "seed": args.seed,
+            "gitCommit": _git_commit(),
+            "python": platform.python_version(),
+        },
+        "scenarios": {},
+    }
+    for name in args.scenario or list(SCENARIOS):
+        print(f"Running {name} ({args.concurrency} connections, {args.duration:g}s)...", file=sys.stderr)
+        result = run_scenario(name, args.url, args.concurrency, args.duration, args.warmup, args.seed)
+        results["scenarios"][name] = result
+        latency = result["latencyMs"]
+        print(
+            f"  {result['throughputRps']} req/s  p50 {latency['p50']} ms  p95 {latency['p95']} ms  p99 {latency['p99']} ms"
+            f"  round-trips/req {result['roundTripsPerRequest']}  errors {result['errors']}",
+            file=sys.stderr,
+        )
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            results["comparison"] = compare(results, json.load(file), args.threshold)
+        regressions = [entry for entry in results["comparison"] if entry["regression"]]
+        for entry in regressions:
+            print(
+                f"REGRESSION {entry['scenario']} {entry['metric']}: {entry['baseline']} -> {entry['current']}"
+                f" ({entry['changePercent']:+}%)",
+                file=sys.stderr,
+            )
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
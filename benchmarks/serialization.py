@@ -0,0 +1,124 @@
+"""
+Compares the Python CPU cost per row of the two list serialization modes of
+GET /api/forms/wheel-specifications (RESPONSE_SERIALIZATION=orm vs database).
+
+    python -m benchmarks.serialization --rows 10000
+    python -m benchmarks.serialization --rows 10000 --database
+
+Without --database, the rows are built in memory and the JSON that Postgres would
+render is emulated, which isolates the Python-side work of each mode and checks
+that both produce byte-identical bodies. With --database, both modes query the
+wheel_specifications table (populate it first, e.g. with benchmarks.datagen) and
+the process CPU time of each request is measured end to end.
+"""
+import argparse
+import json
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from kpa_api import crud, models, schemas
+from kpa_api.serialization import wheel_specification_list_response, wheel_specifications_json_body
+
+SAMPLE_FIELDS = schemas.WheelSpecificationFields.model_json_schema()["properties"]
+
+
+def _sample_rows(count: int):
+    fields = {name: prop.get("example") for name, prop in SAMPLE_FIELDS.items()}
+    return [
+        models.WheelSpecification(
+            id=i + 1,
+            form_number=f"WHEEL-BENCH-{i:08d}",
+            submitted_by=f"user_id_{i % 50}",
+            submitted_date=date(2025, 1, 1) + timedelta(days=i % 365),
+            fields=fields,
+        )
+        for i in range(count)
+    ]
+
+
+def _pg_json_text(value) -> str:
+    """Python stand-in for to_json(text)::text, used to emulate crud.wheel_specification_item_json()."""
+    if value is None:
+        return "null"
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _emulated_page(rows, limit: int):
+    items = []
+    for row in rows[:limit]:
+        fields = row.fields or {}
+        rendered = ",".join(f'"{name}":{_pg_json_text(fields.get(name))}' for name in schemas.WheelSpecificationFields.model_fields)
+        items.append(
+            '{"fields":{' + rendered + '},"formNumber":' + _pg_json_text(row.form_number)
+            + ',"submittedBy":' + _pg_json_text(row.submitted_by)
+            + ',"submittedDate":"' + row.submitted_date.isoformat() + '"}'
+        )
+    last = rows[limit - 1] if len(rows) > limit else None
+    return SimpleNamespace(
+        items=",".join(items) or None,
+        matched=len(rows),
+        last_date=last.submitted_date if last else None,
+        last_id=last.id if last else None,
+    )
+
+
+def _time_cpu(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        fn()
+        best = min(best, time.process_time() - start)
+    return best
+
+
+def run_offline(rows: int, repeat: int) -> dict:
+    data = _sample_rows(rows + 1)
+    page = _emulated_page(data, rows)
+
+    orm_body = wheel_specification_list_response(data, rows).model_dump_json().encode()
+    database_body = wheel_specifications_json_body(page, rows)
+    if orm_body != database_body:
+        raise SystemExit("Serialization modes produced different bodies")
+
+    orm = _time_cpu(lambda: wheel_specification_list_response(data, rows).model_dump_json().encode(), repeat)
+    database = _time_cpu(lambda: wheel_specifications_json_body(page, rows), repeat)
+    return {"rows": rows, "ormUsPerRow": 1e6 * orm / rows, "databaseUsPerRow": 1e6 * database / rows, "identicalBodies": True}
+
+
+def run_database(rows: int, repeat: int) -> dict:
+    from kpa_api.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        def orm_mode():
+            specs = crud.get_wheel_specifications(db, limit=rows + 1)
+            return wheel_specification_list_response(specs, rows).model_dump_json().encode()
+
+        def database_mode():
+            return wheel_specifications_json_body(crud.get_wheel_specifications_json(db, limit=rows), rows)
+
+        if orm_mode() != database_mode():
+            raise SystemExit("Serialization modes produced different bodies")
+        fetched = len(crud.get_wheel_specifications(db, limit=rows))
+        orm = _time_cpu(orm_mode, repeat)
+        database = _time_cpu(database_mode, repeat)
+    finally:
+        db.close()
+    return {"rows": fetched, "ormUsPerRow": 1e6 * orm / max(fetched, 1), "databaseUsPerRow": 1e6 * database / max(fetched, 1), "identicalBodies": True}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--database", action="store_true", help="Query the configured database instead of in-memory rows")
+    args = parser.parse_args()
+
+    result = run_database(args.rows, args.repeat) if args.database else run_offline(args.rows, args.repeat)
+    result["savingPercent"] = round(100 * (1 - result["databaseUsPerRow"] / result["ormUsPerRow"]), 1)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
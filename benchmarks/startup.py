@@ -0,0 +1,129 @@
+"""
+Measures worker startup: the time a fresh interpreter takes to import
+kpa_api.main (what every uvicorn/gunicorn worker does before serving), to run
+the application's startup and to answer its first request, and the database
+work each step did.
+
+    python -m benchmarks.startup --runs 10
+    python -m benchmarks.startup --runs 10 --revision <baseline commit>
+
+Each run is a separate process, so module caches start cold (the bytecode cache
+stays warm, as it does for real workers). Connections opened and SQL statements
+run are counted with SQLAlchemy pool and engine events, so they are comparable
+across revisions. The first request (--path, default the wheel specification
+list) needs DATABASE_URL to point at a migrated database; --path '' measures the
+import only.
+
+With --revision, the same measurement also runs on that git revision, checked
+out into a temporary worktree, and both results are printed side by side: run
+it against the revision before a change to see what the change saved.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+counts = {{"connectionsOpened": 0, "statements": 0}}
+phase = {{"name": "import"}}
+by_phase = {{}}
+
+def count(key):
+    counts[key] += 1
+    by_phase.setdefault(phase["name"], {{"connectionsOpened": 0, "statements": 0}})[key] += 1
+
+event.listen(Pool, "connect", lambda *args: count("connectionsOpened"))
+event.listen(Engine, "before_cursor_execute", lambda *args: count("statements"))
+
+result = {{}}
+started = time.perf_counter()
+import kpa_api.main
+result["importMs"] = round(1000 * (time.perf_counter() - started), 1)
+if {path!r}:
+    from fastapi.testclient import TestClient
+
+    phase["name"] = "startup"
+    before = time.perf_counter()
+    with TestClient(kpa_api.main.app) as client:
+        result["startupMs"] = round(1000 * (time.perf_counter() - before), 1)
+        phase["name"] = "firstRequest"
+        before = time.perf_counter()
+        response = client.get({path!r})
+        result["firstRequestMs"] = round(1000 * (time.perf_counter() - before), 1)
+        result["firstResponseMs"] = round(1000 * (time.perf_counter() - started), 1)
+        result["status"] = response.status_code
+result.update(counts, byPhase=by_phase)
+print(json.dumps(result))
+"""
+
+TIMINGS = ("importMs", "startupMs", "firstRequestMs", "firstResponseMs")
+
+
+def measure(runs: int, path: str, root: str = ROOT) -> dict:
+    samples = []
+    for _ in range(runs):
+        process = subprocess.run(
+            [sys.executable, "-c", CHILD.format(root=root, path=path)], capture_output=True, text=True, cwd=root,
+        )
+        if process.returncode != 0:
+            # e.g. a revision that cannot even be imported without a database
+            error = process.stderr.strip().splitlines() or [f"exit status {process.returncode}"]
+            return {"runs": len(samples), "error": error[-1]}
+        samples.append(json.loads(process.stdout.strip().splitlines()[-1]))
+    result = {"runs": runs}
+    for timing in TIMINGS:
+        values = sorted(sample[timing] for sample in samples if timing in sample)
+        if values:
+            result[timing] = {"median": round(statistics.median(values), 1), "min": values[0], "max": values[-1]}
+    if path:
+        result["statuses"] = sorted({sample["status"] for sample in samples})
+    # Per worker; the same in every run unless something is cached across processes
+    result["connectionsOpened"] = max(sample["connectionsOpened"] for sample in samples)
+    result["statements"] = max(sample["statements"] for sample in samples)
+    result["byPhase"] = samples[-1]["byPhase"]
+    return result
+
+
+def measure_revision(revision: str, runs: int, path: str) -> dict:
+    """Runs measure() on a temporary git worktree of `revision`."""
+    worktree = tempfile.mkdtemp(prefix="startup-")
+    subprocess.run(["git", "worktree", "add", "--detach", worktree, revision], cwd=ROOT, check=True, capture_output=True)
+    try:
+        return measure(runs, path, worktree)
+    finally:
+        subprocess.run(["git", "worktree", "remove", "--force", worktree], cwd=ROOT, check=True, capture_output=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="Number of fresh processes to time")
+    parser.add_argument(
+        "--path", default="/api/forms/wheel-specifications?limit=1",
+        help="First request to send after startup; '' to measure the import only",
+    )
+    parser.add_argument("--revision", help="Also measure this git revision (e.g. the commit before a change)")
+    args = parser.parse_args()
+
+    # The worktree of --revision has no .env; its processes inherit these settings
+    from dotenv import load_dotenv
+
+    load_dotenv(os.path.join(ROOT, ".env"))
+    result = measure(args.runs, args.path)
+    if args.revision:
+        result = {"current": result, args.revision: measure_revision(args.revision, args.runs, args.path)}
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+import asyncio
+import os
+import re
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from starlette.responses import JSONResponse
+
+from .database import ENGINE_PROFILE
+from .pool_metrics import recent_checkout_wait
+
+# Admission control (ADMISSION_CONTROL=1). Each API request belongs to a route
+# class; a class runs at most its own number of requests at once, and all classes
+# together at most ADMISSION_MAX_CONCURRENCY, per worker process. A request that
+# finds no free slot waits in a bounded queue; freed slots go to waiting writes
+# first, then reads, then bulk reads. A write arriving at a full queue takes the
+# place of the newest queued bulk read, else read, which is shed. A request is
+# answered 503 with Retry-After at once when the queue is full (or it was shed
+# for a write), when it has waited ADMISSION_QUEUE_TIMEOUT_MS,
+# or, for reads, when checkouts from the connection pools have recently waited
+# more than ADMISSION_MAX_CHECKOUT_WAIT_MS (see pool_metrics.recent_checkout_wait).
+# The database is then shielded from work the clients would time out on anyway.
+
+
+def _env_flag(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _positive_int(env_var: str, default: int) -> int:
+    value = int(os.getenv(env_var) or default)
+    if value < 1:
+        raise ValueError(f"{env_var} must be at least 1, got {value}")
+    return value
+
+
+ADMISSION_CONTROL = _env_flag(os.getenv("ADMISSION_CONTROL", "0"))
+
+# By default one request per pooled connection (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+ADMISSION_MAX_CONCURRENCY = _positive_int(
+    "ADMISSION_MAX_CONCURRENCY", ENGINE_PROFILE["pool_size"] + ENGINE_PROFILE["max_overflow"]
+)
+ADMISSION_WRITE_CONCURRENCY = _positive_int("ADMISSION_WRITE_CONCURRENCY", ADMISSION_MAX_CONCURRENCY)
+ADMISSION_READ_CONCURRENCY = _positive_int("ADMISSION_READ_CONCURRENCY", ADMISSION_MAX_CONCURRENCY)
+# Exports, NDJSON streams and bulk uploads hold a connection for long
+ADMISSION_BULK_CONCURRENCY = _positive_int("ADMISSION_BULK_CONCURRENCY", max(1, ADMISSION_MAX_CONCURRENCY // 4))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "100"))
+ADMISSION_QUEUE_TIMEOUT_MS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", "2000"))
+# 0 disables shedding on checkout wait
+ADMISSION_MAX_CHECKOUT_WAIT_MS = float(os.getenv("ADMISSION_MAX_CHECKOUT_WAIT_MS", "250"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+
+if ADMISSION_QUEUE_SIZE < 0:
+    raise ValueError(f"ADMISSION_QUEUE_SIZE must not be negative, got {ADMISSION_QUEUE_SIZE}")
+
+# --- Route classes ---
+# In priority order. The first rule matching the method and path decides the class;
+# requests matching none or a rule without a class (docs, /login, /internal/*,
+# /metrics, the long-lived change feed streams) are not limited.
+ROUTE_CLASSES = ("write", "read", "bulk")
+
+ROUTE_RULES = [
+    ("GET", re.compile(r"/api/forms/[^/]+/changes"), None),
+    ("POST", re.compile(r"/api/forms/bogie-checksheet/bulk"), "bulk"),
+    ("POST", re.compile(r"/api/forms/bogie-checksheet"), "write"),
+    ("GET", re.compile(r"/api/forms/[^/]+/export"), "bulk"),
+    ("GET", re.compile(r"/api/.*"), "read"),
+]
+
+
+def route_class(method: str, path: str, accept: str = "") -> Optional[str]:
+    for rule_method, pattern, name in ROUTE_RULES:
+        if method == rule_method and pattern.fullmatch(path):
+            # The NDJSON stream of the wheel specification list is a bulk read
+            if name == "read" and "application/x-ndjson" in accept:
+                return "bulk"
+            return name
+    return None
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str):
+        self.reason = reason
+
+
+class RouteClassStats:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.waiting: deque = deque()  # futures of queued requests, oldest first
+        self.admitted = 0
+        self.queued = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.rejected = {"queue_full": 0, "queue_timeout": 0, "overload": 0, "displaced": 0}
+
+
+class AdmissionController:
+    """
+    Concurrency limits and priority queue of one worker process. Only used from
+    the event loop, so it needs no locking.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, int],
+        max_concurrency: int = ADMISSION_MAX_CONCURRENCY,
+        queue_size: int = ADMISSION_QUEUE_SIZE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_MS / 1000,
+        max_checkout_wait: float = ADMISSION_MAX_CHECKOUT_WAIT_MS / 1000,
+    ):
+        self.max_concurrency = max_concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.max_checkout_wait = max_checkout_wait
+        self.classes = {name: RouteClassStats(limits[name]) for name in ROUTE_CLASSES}
+        self.active = 0
+        self.peak_queue = 0
+
+    def queue_depth(self) -> int:
+        return sum(len(stats.waiting) for stats in self.classes.values())
+
+    def _has_slot(self, name: str) -> bool:
+        return self.active < self.max_concurrency and self.classes[name].active < self.classes[name].limit
+
+    def _start(self, name: str):
+        self.active += 1
+        self.classes[name].active += 1
+        self.classes[name].admitted += 1
+
+    def _overloaded(self, name: str) -> bool:
+        # Writes are never shed for pool pressure: they only queue behind the limits
+        return name != "write" and self.max_checkout_wait > 0 and recent_checkout_wait() > self.max_checkout_wait
+
+    async def acquire(self, name: str):
+        """Waits for a slot of route class `name`; raises Rejected when the request should be shed."""
+        stats = self.classes[name]
+        if self._overloaded(name):
+            stats.rejected["overload"] += 1
+            raise Rejected("overload")
+        # First come, first served within a class
+        if self._has_slot(name) and not stats.waiting:
+            self._start(name)
+            return
+        depth = self.queue_depth()
+        if depth >= self.queue_size:
+            if not (name == "write" and self._displace_read()):
+                stats.rejected["queue_full"] += 1
+                raise Rejected("queue_full")
+            depth -= 1
+
+        waiter = asyncio.get_running_loop().create_future()
+        stats.waiting.append(waiter)
+        stats.queued += 1
+        self.peak_queue = max(self.peak_queue, depth + 1)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait({waiter}, timeout=self.queue_timeout)
+        except BaseException:
+            # The client went away while waiting
+            if not waiter.done():
+                stats.waiting.remove(waiter)
+            elif waiter.result():
+                self.release(name)
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            stats.queue_wait_total += waited
+            stats.queue_wait_max = max(stats.queue_wait_max, waited)
+        if not waiter.done():
+            stats.waiting.remove(waiter)
+            stats.rejected["queue_timeout"] += 1
+            raise Rejected("queue_timeout")
+        if not waiter.result():
+            raise Rejected("displaced")
+
+    def _displace_read(self) -> bool:
+        """Sheds the newest queued bulk read, else read, to make room for a write; False if none is queued."""
+        for name in reversed(ROUTE_CLASSES[1:]):
+            stats = self.classes[name]
+            if stats.waiting:
+                # Its acquire() wakes up and raises Rejected("displaced")
+                stats.waiting.pop().set_result(False)
+                stats.rejected["displaced"] += 1
+                return True
+        return False
+
+    def release(self, name: str):
+        self.active -= 1
+        self.classes[name].active -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Hands free slots to waiting requests, higher-priority classes first."""
+        for name in ROUTE_CLASSES:
+            waiting = self.classes[name].waiting
+            while waiting and self._has_slot(name):
+                self._start(name)
+                waiting.popleft().set_result(True)
+
+    def snapshot(self) -> dict:
+        return {
+            "maxConcurrency": self.max_concurrency,
+            "active": self.active,
+            "queueDepth": self.queue_depth(),
+            "queueSize": self.queue_size,
+            "peakQueueDepth": self.peak_queue,
+            "recentCheckoutWaitMs": round(1000 * recent_checkout_wait(), 3),
+            "classes": {
+                name: {
+                    "limit": stats.limit,
+                    "active": stats.active,
+                    "waiting": len(stats.waiting),
+                    "admitted": stats.admitted,
+                    "queued": stats.queued,
+                    "queueWaitAvgMs": round(1000 * stats.queue_wait_total / stats.queued, 3) if stats.queued else 0.0,
+                    "queueWaitMaxMs": round(1000 * stats.queue_wait_max, 3),
+                    "rejected": dict(stats.rejected),
+                }
+                for name, stats in self.classes.items()
+            },
+        }
+
+
+admission_controller = AdmissionController(
+    {"write": ADMISSION_WRITE_CONCURRENCY, "read": ADMISSION_READ_CONCURRENCY, "bulk": ADMISSION_BULK_CONCURRENCY}
+)
+
+REJECTION_DETAILS = {
+    "queue_full": "Server is busy: too many requests are waiting. Retry later.",
+    "queue_timeout": "Server is busy: the request waited too long to start. Retry later.",
+    "overload": "Server is busy: the database is saturated. Retry later.",
+    "displaced": "Server is busy: the request gave way to writes. Retry later.",
+}
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that admits API requests through admission_controller and
+    answers shed ones with 503 and Retry-After. A slot is held until the response,
+    including a streamed body, is complete.
+    """
+
+    def __init__(self, app, controller: AdmissionController = admission_controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        name = None
+        if scope["type"] == "http":
+            accept = dict(scope["headers"]).get(b"accept", b"").decode("latin-1")
+            name = route_class(scope["method"], scope["path"], accept)
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.controller.acquire(name)
+        except Rejected as rejected:
+            response = JSONResponse(
+                {"detail": REJECTION_DETAILS[rejected.reason]},
+                status_code=503,
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER_SECONDS)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(name)
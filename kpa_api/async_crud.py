@@ -0,0 +1,148 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, schemas, rollups, partitions, conditions
+from .cache import wheel_specifications_cache
+from .database import get_async_engine
+from .measurements import MeasurementFilter, measurement_rows
+from .crud import (
+    insert_bogie_checksheet_statement, bulk_insert_bogie_checksheets_statement, wheel_specifications_query,
+    wheel_specifications_json_query, bogie_checksheets_search_query, saved_bogie_checksheets, current_wal_lsn_query,
+)
+from typing import Optional, List, Set, Tuple, AsyncIterator
+from datetime import date
+
+# Async counterparts of the functions in crud.py, used when DB_MODE=async.
+# Query construction is shared with crud.py so both paths stay in step.
+
+# --- CRUD Operations for Bogie Checksheet ---
+
+async def create_bogie_checksheet(db: AsyncSession, bogie_checksheet: schemas.BogieChecksheetCreate):
+    """
+    Creates a new bogie checksheet record in the database.
+    Returns the inserted row, or None if the formNumber already exists.
+    """
+    await partitions.ensure_partitions_async(get_async_engine(), models.BogieChecksheet.__tablename__, [bogie_checksheet.inspectionDate])
+    await conditions.ensure_codes_async(get_async_engine(), [bogie_checksheet])
+    result = await db.execute(insert_bogie_checksheet_statement(bogie_checksheet))
+    db_bogie_checksheet = result.one_or_none()
+    if db_bogie_checksheet is not None:
+        await _increment_condition_rollups(db, [bogie_checksheet])
+    await db.commit()
+    return db_bogie_checksheet
+
+async def _increment_condition_rollups(db: AsyncSession, bogie_checksheets: List[schemas.BogieChecksheetCreate]):
+    statement = rollups.increment_statement(bogie_checksheets)
+    if statement is not None:
+        await db.execute(statement)
+
+async def bulk_create_bogie_checksheets(db: AsyncSession, bogie_checksheets: List[schemas.BogieChecksheetCreate]) -> Set[str]:
+    """
+    Inserts a chunk of bogie checksheets with a single multi-row INSERT.
+    Returns the set of form numbers that were actually inserted.
+    """
+    if not bogie_checksheets:
+        return set()
+
+    await partitions.ensure_partitions_async(
+        get_async_engine(), models.BogieChecksheet.__tablename__, {item.inspectionDate for item in bogie_checksheets}
+    )
+    await conditions.ensure_codes_async(get_async_engine(), bogie_checksheets)
+    inserted = set(await db.scalars(bulk_insert_bogie_checksheets_statement(bogie_checksheets)))
+    await _increment_condition_rollups(db, saved_bogie_checksheets(bogie_checksheets, inserted))
+    await db.commit()
+    return inserted
+
+async def search_bogie_checksheets(db: AsyncSession, limit: int = 100, **filters) -> List[models.BogieChecksheet]:
+    """
+    Searches bogie checksheets (see crud.bogie_checksheets_search_query for the filters).
+    """
+    sheets = list(await db.scalars(bogie_checksheets_search_query(**filters).limit(limit)))
+    await conditions.load_async(db, [sheet.conditions for sheet in sheets])
+    return sheets
+
+async def get_condition_counts(db: AsyncSession, group_by: List[str], **filters):
+    """
+    Returns condition counts from the rollup table (see crud.get_condition_counts).
+    """
+    result = await db.execute(rollups.condition_counts_query(group_by, **filters))
+    return result.all()
+
+# --- CRUD Operations for Wheel Specifications ---
+
+async def get_wheel_specifications(
+    db: AsyncSession,
+    form_number: Optional[str] = None,
+    submitted_by: Optional[str] = None,
+    submitted_date: Optional[date] = None,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[Tuple[date, int]] = None,
+    measurement: Optional[MeasurementFilter] = None,
+) -> List[models.WheelSpecification]:
+    """
+    Retrieves wheel specification records from the database with optional filters.
+    """
+    query = wheel_specifications_query(form_number, submitted_by, submitted_date, after, measurement)
+    if skip:
+        query = query.offset(skip)
+    return list(await db.scalars(query.limit(limit)))
+
+async def iter_wheel_specifications(
+    db: AsyncSession,
+    form_number: Optional[str] = None,
+    submitted_by: Optional[str] = None,
+    submitted_date: Optional[date] = None,
+    after: Optional[Tuple[date, int]] = None,
+    measurement: Optional[MeasurementFilter] = None,
+    batch_size: int = 1000,
+) -> AsyncIterator[models.WheelSpecification]:
+    """
+    Streams every matching wheel specification through a server-side cursor,
+    buffering only `batch_size` rows at a time.
+    """
+    query = wheel_specifications_query(form_number, submitted_by, submitted_date, after, measurement)
+    result = await db.stream_scalars(query.execution_options(yield_per=batch_size))
+    async for spec in result:
+        yield spec
+
+async def get_wheel_specifications_json(
+    db: AsyncSession,
+    form_number: Optional[str] = None,
+    submitted_by: Optional[str] = None,
+    submitted_date: Optional[date] = None,
+    limit: int = 100,
+    after: Optional[Tuple[date, int]] = None,
+    measurement: Optional[MeasurementFilter] = None,
+):
+    """
+    Renders a page of wheel specifications to JSON inside Postgres
+    (see crud.get_wheel_specifications_json).
+    """
+    result = await db.execute(wheel_specifications_json_query(form_number, submitted_by, submitted_date, limit, after, measurement))
+    return result.one()
+
+async def create_dummy_wheel_specification(db: AsyncSession, item: schemas.WheelSpecificationCreate):
+    """
+    Creates a dummy wheel specification record. Used for populating initial data.
+    """
+    await partitions.ensure_partitions_async(get_async_engine(), models.WheelSpecification.__tablename__, [item.submittedDate])
+    db_item = models.WheelSpecification(
+        form_number=item.formNumber,
+        submitted_by=item.submittedBy,
+        submitted_date=item.submittedDate,
+        fields=item.fields.model_dump(mode='json') if item.fields else None,
+        measurements=measurement_rows(item.fields.model_dump() if item.fields else None),
+    )
+    db.add(models.WheelSpecificationFormNumber(form_number=item.formNumber, submitted_date=item.submittedDate))
+    db.add(db_item)
+    await db.commit()
+    await wheel_specifications_cache.invalidate_async()
+    await db.refresh(db_item)
+    return db_item
+
+# --- Read-your-writes ---
+
+async def current_wal_lsn(db: AsyncSession) -> str:
+    """
+    The primary's current WAL position (see crud.current_wal_lsn).
+    """
+    return (await db.execute(current_wal_lsn_query())).scalar_one()
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+# Seconds a cached response stays fresh; 0 disables the response cache.
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+# Optional shared backend, e.g. redis://localhost:6379/0, so all workers see the same entries and invalidations.
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL")
+
+
+class CachedResponse(NamedTuple):
+    etag: str
+    body: bytes
+
+
+class LocalCacheBackend:
+    """In-process LRU with per-entry expiry. Each worker process has its own copy."""
+
+    blocking = False
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class RedisCacheBackend:
+    """
+    Shared backend on Redis. Requires the optional `redis` package. Its calls
+    block on the network, so async endpoints go through ResponseCache's *_async methods.
+    """
+
+    blocking = True
+
+    def __init__(self, url: str):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self._client.set(key, value, px=int(ttl * 1000))
+
+    def counter(self, key: str) -> int:
+        return int(self._client.get(key) or 0)
+
+    def incr(self, key: str) -> int:
+        return self._client.incr(key)
+
+
+def make_backend(url: Optional[str] = RESPONSE_CACHE_URL):
+    if url and url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCacheBackend(url)
+    if url:
+        raise ValueError(f"Unsupported RESPONSE_CACHE_URL scheme: '{url}'")
+    return LocalCacheBackend()
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag derived from the exact response bytes."""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+class ResponseCache:
+    """
+    Read-through cache of serialized responses for one resource, keyed on the
+    normalized query parameters. invalidate() bumps a generation number that is
+    part of every key, so all previously cached responses become unreachable at once.
+    """
+
+    def __init__(self, namespace: str, backend=None, ttl: float = RESPONSE_CACHE_TTL_SECONDS):
+        self.namespace = namespace
+        self.backend = backend if backend is not None else make_backend()
+        self.ttl = ttl
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def key(self, params: dict) -> str:
+        """
+        Builds the cache key for `params`. Take the key before querying the database,
+        so a response computed concurrently with an invalidation is stored under the
+        old generation and never served.
+
+        That only holds for responses read from the primary, which has every write
+        that invalidated the cache before the key was taken. A read replica may not
+        have replayed them yet, so callers must not set() responses read from a
+        replica (read sessions record it in info["replica"]), nor serve reads that
+        carry a consistency token from the cache; pass key=None to bypass it.
+        """
+        normalized = json.dumps(
+            {name: value for name, value in params.items() if value is not None},
+            sort_keys=True, default=str, separators=(",", ":")
+        )
+        generation = self.backend.counter(f"{self.namespace}:generation")
+        return f"{self.namespace}:{generation}:{hashlib.sha256(normalized.encode()).hexdigest()}"
+
+    def get(self, key: Optional[str]) -> Optional[CachedResponse]:
+        """The cached response under `key`; a None key (a read that must bypass the cache) never hits."""
+        if not self.enabled or key is None:
+            return None
+        value = self.backend.get(key)
+        if value is None:
+            return None
+        etag, _, body = value.partition(b"\n")
+        return CachedResponse(etag.decode(), body)
+
+    def set(self, key: Optional[str], body: bytes) -> CachedResponse:
+        """Wraps `body` with its ETag and stores it under `key`, unless `key` is None."""
+        cached = CachedResponse(make_etag(body), body)
+        if self.enabled and key is not None:
+            self.backend.set(key, cached.etag.encode() + b"\n" + body, self.ttl)
+        return cached
+
+    def invalidate(self):
+        self.backend.incr(f"{self.namespace}:generation")
+
+    # --- DB_MODE=async ---
+    # A blocking backend (Redis) runs in the threadpool so it does not stall the
+    # event loop; the in-process backend only takes a lock and is called directly.
+
+    async def _run(self, method, *args):
+        if self.backend.blocking:
+            return await run_in_threadpool(method, *args)
+        return method(*args)
+
+    async def key_async(self, params: dict) -> str:
+        return await self._run(self.key, params)
+
+    async def get_async(self, key: Optional[str]) -> Optional[CachedResponse]:
+        return await self._run(self.get, key)
+
+    async def set_async(self, key: Optional[str], body: bytes) -> CachedResponse:
+        return await self._run(self.set, key, body)
+
+    async def invalidate_async(self):
+        await self._run(self.invalidate)
+
+
+# Invalidated by every insert into wheel_specifications (see crud.py / async_crud.py)
+wheel_specifications_cache = ResponseCache("wheel_specifications")
@@ -0,0 +1,364 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import select as select_module
+import threading
+import time
+from datetime import date
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import BigInteger, Text, cast, create_engine, delete, func, literal, select, tuple_
+from sqlalchemy.pool import NullPool
+
+from . import models
+
+# Change feed of new forms. Inserts into wheel_specifications and bogie_checksheets
+# append to form_change_log and send a NOTIFY on CHANGE_FEED_CHANNEL (triggers from
+# migration v0007). Each worker LISTENs on one dedicated connection, in a thread
+# started with its first subscriber; a notification only wakes it up to read the
+# log, and it hands every new row to the subscribers of that kind of form. The
+# /changes endpoints stream them as Server-Sent Events.
+#
+# Event ids are cursors "<transaction>-<position>" into the log. Positions are
+# taken at insert, not at commit, so a form can commit after forms with higher
+# positions; readers therefore go through the log in (transaction, position)
+# order and only read rows of transactions older than every transaction still
+# running (pg_snapshot_xmin). Everything before a cursor is then final, and a
+# client resuming with Last-Event-ID first gets exactly the forms it missed, read
+# from the log, then the live feed. A long-running writing transaction delays
+# the feed until it ends; nothing is skipped.
+
+logger = logging.getLogger(__name__)
+
+CHANGE_FEED_CHANNEL = "form_changes"
+# Comment line sent on idle streams so proxies and clients keep them open; the
+# listener also re-reads the log this often
+CHANGE_FEED_KEEPALIVE_SECONDS = float(os.getenv("CHANGE_FEED_KEEPALIVE_SECONDS", "15"))
+# A resume that missed more forms than this gets a `reset` event instead of a replay
+CHANGE_FEED_REPLAY_LIMIT = int(os.getenv("CHANGE_FEED_REPLAY_LIMIT", "10000"))
+# Events buffered for a subscriber that reads too slowly; beyond it its stream ends
+# and the client resumes from its last event id
+CHANGE_FEED_SUBSCRIBER_BUFFER = int(os.getenv("CHANGE_FEED_SUBSCRIBER_BUFFER", "1000"))
+
+# (transaction id, position) of a form_change_log row
+Cursor = Tuple[int, int]
+# Resumes with a reset: event ids from before the change log were form ids
+RESET_CURSOR: Cursor = (-1, -1)
+
+
+def format_cursor(cursor: Cursor) -> str:
+    return f"{cursor[0]}-{cursor[1]}"
+
+
+def parse_cursor(text: str) -> Cursor:
+    """Parses an event id; raises ValueError if it is not one."""
+    if text.isdigit():
+        return RESET_CURSOR
+    xact_id, position = text.split("-")
+    return int(xact_id), int(position)
+
+
+class FeedKind(NamedTuple):
+    by_field: str
+    date_field: str
+
+
+KINDS: Dict[str, FeedKind] = {
+    "wheel-specifications": FeedKind("submittedBy", "submittedDate"),
+    "bogie-checksheet": FeedKind("inspectionBy", "inspectionDate"),
+}
+
+
+class FormChange(NamedTuple):
+    kind: str
+    id: int
+    form_number: str
+    by: str
+    date: str  # YYYY-MM-DD
+    cursor: Cursor
+
+    def matches(self, by: Optional[str] = None, on_date: Optional[str] = None) -> bool:
+        return (by is None or self.by == by) and (on_date is None or self.date == on_date)
+
+    def event(self) -> str:
+        """The form as one Server-Sent Event."""
+        kind = KINDS[self.kind]
+        data = {"id": self.id, "formNumber": self.form_number, kind.by_field: self.by, kind.date_field: self.date}
+        return f"id: {format_cursor(self.cursor)}\nevent: created\ndata: {json.dumps(data)}\n\n"
+
+
+# --- Reading the log ---
+
+def _horizon():
+    """Oldest transaction still running: every transaction before it has ended."""
+    return cast(cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text), BigInteger)
+
+
+def changes_query(after: Optional[Cursor], limit: int, kind: Optional[str] = None, by: Optional[str] = None, on_date=None):
+    """Logged forms after cursor `after` (all by default) whose transactions and all older ones have ended, in cursor order."""
+    log = models.FormChangeLogEntry
+    query = select(
+        log.kind, log.form_id, log.form_number, log.submitter, log.form_date, log.xact_id, log.position
+    ).where(log.xact_id < _horizon())
+    if after is not None:
+        query = query.where(tuple_(log.xact_id, log.position) > tuple_(*[literal(value, BigInteger) for value in after]))
+    if kind:
+        query = query.where(log.kind == kind)
+    if by:
+        query = query.where(log.submitter == by)
+    if on_date:
+        query = query.where(log.form_date == on_date)
+    return query.order_by(log.xact_id, log.position).limit(limit)
+
+
+def latest_query():
+    """The cursor of the last form changes_query can return, if any."""
+    log = models.FormChangeLogEntry
+    return (
+        select(log.xact_id, log.position).where(log.xact_id < _horizon())
+        .order_by(log.xact_id.desc(), log.position.desc()).limit(1)
+    )
+
+
+def oldest_query():
+    log = models.FormChangeLogEntry
+    return select(log.xact_id, log.position).order_by(log.xact_id, log.position).limit(1)
+
+
+def _changes(rows) -> List[FormChange]:
+    return [FormChange(row[0], row[1], row[2], row[3], row[4].isoformat(), (row[5], row[6])) for row in rows]
+
+
+def _cursor(row) -> Cursor:
+    return (row[0], row[1]) if row else (0, 0)
+
+
+def _pruned(after: Cursor, oldest) -> bool:
+    """Whether forms after `after` may have been pruned from the log (rows before position 1 existed)."""
+    return after == RESET_CURSOR or (oldest is not None and oldest[1] > 1 and after < tuple(oldest))
+
+
+def replay(db, kind: str, after: Cursor, **filters) -> Tuple[List[FormChange], Optional[Cursor]]:
+    """
+    The forms a client resuming after `after` missed, or, when there are more than
+    CHANGE_FEED_REPLAY_LIMIT or some may have been pruned, no forms and the
+    cursor to restart from.
+    """
+    rows = db.execute(changes_query(after, CHANGE_FEED_REPLAY_LIMIT + 1, kind, **filters)).all()
+    if len(rows) > CHANGE_FEED_REPLAY_LIMIT or _pruned(after, db.execute(oldest_query()).first()):
+        return [], _cursor(db.execute(latest_query()).first())
+    return _changes(rows), None
+
+
+async def replay_async(db, kind: str, after: Cursor, **filters) -> Tuple[List[FormChange], Optional[Cursor]]:
+    """Async variant of replay."""
+    rows = (await db.execute(changes_query(after, CHANGE_FEED_REPLAY_LIMIT + 1, kind, **filters))).all()
+    if len(rows) > CHANGE_FEED_REPLAY_LIMIT or _pruned(after, (await db.execute(oldest_query())).first()):
+        return [], _cursor((await db.execute(latest_query())).first())
+    return _changes(rows), None
+
+
+def prune(db, before) -> int:
+    """Deletes log rows written before `before`; clients resuming from them get a reset. Returns the count."""
+    log = models.FormChangeLogEntry
+    deleted = db.execute(delete(log).where(log.created_at < before)).rowcount
+    db.commit()
+    return deleted
+
+
+# --- Listener ---
+
+class Subscription:
+    """One client's stream; its queue is filled on the client's event loop."""
+
+    def __init__(self, kind: str, loop: asyncio.AbstractEventLoop, buffer: int = CHANGE_FEED_SUBSCRIBER_BUFFER):
+        self.kind = kind
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(buffer)
+        self.overflowed = False
+        # Cursor of the last change published before it subscribed; it gets every later one
+        self.cursor: Optional[Cursor] = None
+
+    def put(self, change: FormChange):
+        try:
+            self.queue.put_nowait(change)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class ChangeFeedListener:
+    """Per-process LISTEN connection and the subscribers it fans notifications out to."""
+
+    def __init__(self, database_url: Callable[[], str]):
+        self._database_url = database_url
+        self._subscribers: Dict[str, Set[Subscription]] = {kind: set() for kind in KINDS}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        # Cursor of the last change published, read on from there after a reconnect
+        self.cursor: Optional[Cursor] = None
+        self.connected = False
+        self.notifications = 0
+        self.connects = 0
+        self.error: Optional[str] = None
+
+    def subscribe(self, kind: str) -> Subscription:
+        subscription = Subscription(kind, asyncio.get_running_loop())
+        with self._lock:
+            subscription.cursor = self.cursor
+            self._subscribers[kind].add(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="change-feed-listener", daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers[subscription.kind].discard(subscription)
+
+    def publish(self, change: FormChange):
+        """Hands `change` to every subscriber of its kind (called from the listener thread)."""
+        with self._lock:
+            # Under the lock: a subscriber either sees this cursor on subscribing or gets the change
+            self.cursor = change.cursor
+            subscribers = list(self._subscribers[change.kind])
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, change)
+            except RuntimeError:
+                # Its event loop is closed
+                self.unsubscribe(subscription)
+
+    def _run(self):
+        backoff = 0.5
+        engine = None
+        while True:
+            try:
+                if engine is None:
+                    engine = create_engine(self._database_url(), poolclass=NullPool)
+                self._listen(engine)
+            except Exception as exc:
+                self.error = f"{type(exc).__name__}: {exc}".strip().splitlines()[0]
+            # Retry soon after losing a working connection; back off while connecting fails
+            backoff = 1.0 if self.connected else min(backoff * 2, 30.0)
+            self.connected = False
+            logger.warning("Change feed listener disconnected, reconnecting in %.0fs: %s", backoff, self.error)
+            time.sleep(backoff)
+
+    def _read(self, connection):
+        """Publishes the changes logged after self.cursor that have become final."""
+        while True:
+            rows = connection.execute(changes_query(self.cursor, CHANGE_FEED_REPLAY_LIMIT)).all()
+            for change in _changes(rows):
+                self.publish(change)
+            if len(rows) < CHANGE_FEED_REPLAY_LIMIT:
+                return
+
+    def _listen(self, engine):
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.exec_driver_sql(f"LISTEN {CHANGE_FEED_CHANNEL}")
+            if self.cursor is None:
+                self.cursor = _cursor(connection.execute(latest_query()).first())
+            # Notifications sent while this worker was not listening are lost: read on in the log
+            self._read(connection)
+            self.connected = True
+            self.connects += 1
+            self.error = None
+
+            # psycopg2 connection: readable when notifications arrive
+            driver_connection = connection.connection.driver_connection
+            while True:
+                # Idle, the read also checks the connection and picks up forms held
+                # back by a transaction that has since ended
+                if select_module.select([driver_connection], [], [], CHANGE_FEED_KEEPALIVE_SECONDS)[0]:
+                    driver_connection.poll()
+                    self.notifications += len(driver_connection.notifies)
+                    driver_connection.notifies.clear()
+                self._read(connection)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            subscribers = {kind: len(subscriptions) for kind, subscriptions in self._subscribers.items()}
+        return {
+            "connected": self.connected,
+            "subscribers": subscribers,
+            "notifications": self.notifications,
+            "connects": self.connects,
+            "cursor": format_cursor(self.cursor) if self.cursor else None,
+            "error": self.error,
+        }
+
+
+def _listener_database_url() -> str:
+    from .database import DATABASE_URL
+
+    if not DATABASE_URL:
+        raise ValueError("Database URL is not set in the env file")
+    return DATABASE_URL
+
+
+change_listener = ChangeFeedListener(_listener_database_url)
+
+
+# --- Server-Sent Events ---
+
+Replay = Callable[..., Awaitable[Tuple[List[FormChange], Optional[Cursor]]]]
+
+
+async def stream_events(kind: str, after: Optional[Cursor], replay_changes: Replay, by: Optional[str] = None, on_date=None):
+    """
+    Yields the Server-Sent Events of one subscriber: the forms missed since cursor
+    `after` (read with `replay_changes`), then new forms as they are published,
+    both filtered by submitter and date.
+    """
+    subscription = change_listener.subscribe(kind)
+    on_date_text = on_date.isoformat() if on_date else None
+    try:
+        # Subscribed first, so nothing that becomes final during the replay is lost;
+        # published forms at or before the last cursor sent were replayed already
+        last = after
+        if after is not None:
+            changes, reset = await replay_changes(kind, after, by=by, on_date=on_date)
+            if reset is not None:
+                last = reset
+                yield f"id: {format_cursor(reset)}\nevent: reset\ndata: {{}}\n\n"
+            for change in changes:
+                last = change.cursor
+                yield change.event()
+        elif subscription.cursor is not None:
+            # No data, so no event fires, but the client's last event id is set:
+            # a reconnect then resumes from here. Changes published since subscribing
+            # come after this cursor and are in the queue already
+            last = subscription.cursor
+            yield f"id: {format_cursor(last)}\n\n"
+
+        while True:
+            try:
+                change = await asyncio.wait_for(subscription.queue.get(), CHANGE_FEED_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if subscription.overflowed:
+                # Too slow: end the stream; the client resumes from its last event id
+                return
+            if last is not None and change.cursor <= last:
+                continue
+            last = change.cursor
+            if change.matches(by, on_date_text):
+                yield change.event()
+    finally:
+        change_listener.unsubscribe(subscription)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m kpa_api.changefeed", description="Manage the change feed log.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    prune_parser = commands.add_parser("prune", help="Delete log rows written before a date.")
+    prune_parser.add_argument("--before", type=date.fromisoformat, required=True, help="YYYY-MM-DD")
+    args = parser.parse_args()
+
+    from .database import SessionLocal
+
+    with SessionLocal() as db:
+        print(f"Deleted {prune(db, args.before)} change log row(s).")
@@ -0,0 +1,348 @@
+import argparse
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import (
+    Integer, String, Select, bindparam, case, column, func, literal_column, select, true, tuple_, union_all, update, values,
+)
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+
+from . import models, schemas
+
+# Compact storage of bogie checksheet component conditions. The bmbc_checksheet
+# and bogie_checksheet_details JSONB objects repeat every component name and
+# condition string in each row; with BOGIE_CONDITION_STORAGE=compact a form stores
+# them instead as one integer per component in bogie_checksheets.conditions:
+#
+#     component number << 24 | condition code
+#
+# Condition codes come from the bogie_checksheet_condition_codes dictionary (one
+# per exact spelling, assigned on first use and never changed or removed); code 0
+# stands for a null condition, and a section sent as null stores none of its
+# components. A row is in one format or the other (conditions IS NULL for JSONB
+# rows), so both coexist; `python -m kpa_api.conditions encode|decode` converts
+# existing rows. Responses and exports decode back to the bmbcChecksheet and
+# bogieChecksheet objects (decode()), the rollup rebuild decodes in SQL (entries()).
+
+BOGIE_CONDITION_STORAGE = os.getenv("BOGIE_CONDITION_STORAGE", "jsonb").lower()
+
+if BOGIE_CONDITION_STORAGE not in ("jsonb", "compact"):
+    raise ValueError(f"BOGIE_CONDITION_STORAGE must be 'jsonb' or 'compact', got '{BOGIE_CONDITION_STORAGE}'")
+
+COMPACT = BOGIE_CONDITION_STORAGE == "compact"
+
+# Component -> number. Stored rows depend on these: never renumber, only add.
+COMPONENT_NUMBERS = {
+    "adjustingTube": 1,
+    "cylinderBody": 2,
+    "pistonTrunnion": 3,
+    "plungerSpring": 4,
+    "axleGuide": 5,
+    "bogieFrameCondition": 6,
+    "bolster": 7,
+    "bolsterSuspensionBracket": 8,
+    "lowerSpringSeat": 9,
+}
+COMPONENT_NAMES = {number: name for name, number in COMPONENT_NUMBERS.items()}
+
+# Column of the JSONB format -> its components
+SECTIONS = {
+    "bmbc_checksheet": list(schemas.BmbcChecksheet.model_fields),
+    "bogie_checksheet_details": list(schemas.BogieChecksheetDetails.model_fields),
+}
+
+_unnumbered = [name for components in SECTIONS.values() for name in components if name not in COMPONENT_NUMBERS]
+if _unnumbered:
+    raise RuntimeError(f"Components without a number in COMPONENT_NUMBERS: {_unnumbered}")
+
+CODE_BITS = 24
+CODE_MASK = (1 << CODE_BITS) - 1
+NULL_CODE = 0
+
+
+# --- Dictionary ---
+
+class ConditionCodes:
+    """This process's copy of the condition dictionary; codes never change, so it is never invalidated."""
+
+    def __init__(self):
+        self._codes: Dict[str, int] = {}
+        self._conditions: Dict[int, str] = {NULL_CODE: None}
+        self._lock = threading.Lock()
+
+    def missing_conditions(self, conditions: Iterable[str]) -> Set[str]:
+        return {condition for condition in conditions if condition not in self._codes}
+
+    def has_codes(self, stored: Iterable[Optional[List[int]]]) -> bool:
+        return all(
+            element & CODE_MASK in self._conditions
+            for elements in stored if elements
+            for element in elements
+        )
+
+    def add(self, rows: Iterable[Tuple[int, str]]):
+        with self._lock:
+            for code, condition in rows:
+                if code > CODE_MASK:
+                    raise ValueError(f"Condition code {code} does not fit in {CODE_BITS} bits")
+                self._codes[condition] = code
+                self._conditions[code] = condition
+
+    def code(self, condition: Optional[str]) -> int:
+        return NULL_CODE if condition is None else self._codes[condition]
+
+    def condition(self, code: int) -> Optional[str]:
+        return self._conditions[code]
+
+
+condition_codes = ConditionCodes()
+
+
+def form_conditions(forms: Iterable[schemas.BogieChecksheetCreate]) -> Set[str]:
+    """The distinct condition strings recorded in `forms`."""
+    found = set()
+    for form in forms:
+        for section in (form.bmbcChecksheet, form.bogieChecksheet):
+            if section is not None:
+                found.update(value for value in section.model_dump().values() if value is not None)
+    return found
+
+
+def assign_codes(connection, conditions: Set[str]):
+    """Adds the `conditions` missing from the dictionary (in the caller's transaction) and caches the codes of all of them."""
+    table = models.BogieChecksheetConditionCode
+    connection.execute(
+        pg_insert(table).values([{"condition": condition} for condition in sorted(conditions)])
+        .on_conflict_do_nothing(index_elements=["condition"])
+    )
+    condition_codes.add(connection.execute(
+        select(table.code, table.condition).where(table.condition.in_(conditions))
+    ).all())
+
+
+def ensure_codes(engine, forms: Iterable[schemas.BogieChecksheetCreate]):
+    """
+    With BOGIE_CONDITION_STORAGE=compact, makes sure every condition of `forms`
+    has a code. Known conditions cost nothing; new ones are added in a separate,
+    immediately committed transaction (like partitions.ensure_partitions), so the
+    cached codes stay valid whatever happens to the caller's transaction.
+    """
+    if not COMPACT:
+        return
+    missing = condition_codes.missing_conditions(form_conditions(forms))
+    if missing:
+        with engine.begin() as connection:
+            assign_codes(connection, missing)
+
+
+async def ensure_codes_async(engine, forms: Iterable[schemas.BogieChecksheetCreate]):
+    """Async counterpart of ensure_codes for an AsyncEngine."""
+    if not COMPACT:
+        return
+    missing = condition_codes.missing_conditions(form_conditions(forms))
+    if missing:
+        async with engine.begin() as connection:
+            await connection.run_sync(assign_codes, missing)
+
+
+def dictionary_query() -> Select:
+    table = models.BogieChecksheetConditionCode
+    return select(table.code, table.condition)
+
+
+def load(db, stored: Iterable[Optional[List[int]]]):
+    """Makes sure every code in the `stored` conditions arrays can be decoded (reads the dictionary if not)."""
+    stored = list(stored)
+    if not condition_codes.has_codes(stored):
+        condition_codes.add(db.execute(dictionary_query()).all())
+
+
+async def load_async(db, stored: Iterable[Optional[List[int]]]):
+    """Async counterpart of load for an AsyncSession."""
+    stored = list(stored)
+    if not condition_codes.has_codes(stored):
+        condition_codes.add((await db.execute(dictionary_query())).all())
+
+
+# --- Encoding ---
+
+def encode(form: schemas.BogieChecksheetCreate) -> List[int]:
+    """The conditions array of `form`; its conditions must have codes (ensure_codes)."""
+    elements = []
+    for section in (form.bmbcChecksheet, form.bogieChecksheet):
+        if section is not None:
+            for component, condition in section.model_dump().items():
+                elements.append(COMPONENT_NUMBERS[component] << CODE_BITS | condition_codes.code(condition))
+    return elements
+
+
+def decode_components(stored: List[int]) -> Dict[str, Optional[str]]:
+    """A conditions array -> {component: condition} for the components it records."""
+    return {COMPONENT_NAMES[element >> CODE_BITS]: condition_codes.condition(element & CODE_MASK) for element in stored}
+
+
+def decode(stored: List[int]) -> Tuple[Optional[dict], Optional[dict]]:
+    """A conditions array -> (bmbc_checksheet, bogie_checksheet_details) as the JSONB format holds them."""
+    by_component = decode_components(stored)
+    return tuple(
+        {component: by_component.get(component) for component in components}
+        if any(component in by_component for component in components) else None
+        for components in SECTIONS.values()
+    )
+
+
+def entries(sheet=models.BogieChecksheet):
+    """
+    LATERAL (key, value) pairs of every component condition of a bogie_checksheets
+    row, in either format, for SQL that aggregates conditions (rollups.rebuild).
+    """
+    empty = literal_column("'{}'::jsonb", JSONB)
+
+    def section(stored):
+        # Anything but an object (SQL NULL, or JSON null written by older versions) has no conditions
+        return case((func.jsonb_typeof(stored) == "object", stored), else_=empty)
+
+    from_jsonb = func.jsonb_each_text(
+        section(sheet.bmbc_checksheet).op("||")(section(sheet.bogie_checksheet_details))
+    ).table_valued("key", "value")
+
+    element = func.unnest(sheet.conditions).table_valued("element").render_derived()
+    components = values(column("number", Integer), column("name", String), name="component").data(
+        sorted(COMPONENT_NAMES.items())
+    )
+    codes = models.BogieChecksheetConditionCode
+    from_compact = (
+        select(components.c.name, codes.condition)
+        .select_from(element)
+        .join(codes, codes.code == element.c.element.op("&")(CODE_MASK))
+        .join(components, components.c.number == element.c.element.op(">>")(CODE_BITS))
+    )
+    return union_all(select(from_jsonb.c.key, from_jsonb.c.value), from_compact).lateral("entry")
+
+
+def condition_filter(components: List[str], spellings: List[str]):
+    """
+    WHERE clause for compact rows recording any of `spellings` for any of
+    `components`: conditions && (their element values), served by the GIN index.
+    """
+    codes = models.BogieChecksheetConditionCode
+    numbers = values(column("number", Integer), name="component").data(
+        [(COMPONENT_NUMBERS[name],) for name in components]
+    )
+    wanted = (
+        select(func.array_agg(numbers.c.number.op("<<")(CODE_BITS).op("|")(codes.code)))
+        .select_from(codes)
+        .join(numbers, true())
+        .where(codes.condition.in_(spellings))
+        .scalar_subquery()
+    )
+    return models.BogieChecksheet.conditions.overlap(wanted)
+
+
+# --- Converting stored rows ---
+
+def _batches(db, where, batch_size: int):
+    """Rows matching `where`, batch by batch in (inspection_date, id) order."""
+    sheet = models.BogieChecksheet
+    after = None
+    while True:
+        query = select(sheet.id, sheet.inspection_date, sheet.bmbc_checksheet, sheet.bogie_checksheet_details, sheet.conditions).where(where)
+        if after is not None:
+            query = query.where(tuple_(sheet.inspection_date, sheet.id) > tuple_(*after))
+        rows = db.execute(query.order_by(sheet.inspection_date, sheet.id).limit(batch_size)).all()
+        if not rows:
+            return
+        yield rows
+        after = (rows[-1].inspection_date, rows[-1].id)
+
+
+def _update(db, rows: List[dict]):
+    sheet = models.BogieChecksheet.__table__
+    db.execute(
+        update(sheet)
+        .where(sheet.c.id == bindparam("b_id"), sheet.c.inspection_date == bindparam("b_inspection_date"))
+        .execution_options(synchronize_session=False),
+        rows,
+    )
+
+
+def _encodable(row) -> bool:
+    """Whether the JSONB objects of `row` hold nothing but component conditions (nothing would be lost)."""
+    for name, components in SECTIONS.items():
+        stored = getattr(row, name)
+        if stored is not None and not (
+            isinstance(stored, dict) and set(stored) <= set(components)
+            and all(value is None or isinstance(value, str) for value in stored.values())
+        ):
+            return False
+    return True
+
+
+def encode_rows(db, batch_size: int = 1000) -> int:
+    """
+    Converts JSONB-format rows to the compact format, one committed batch at a
+    time, and returns the count. Rows whose objects hold anything else are left as they are.
+    """
+    sheet = models.BogieChecksheet
+    converted = 0
+    for rows in _batches(db, sheet.conditions.is_(None), batch_size):
+        rows = [row for row in rows if _encodable(row)]
+        if not rows:
+            continue
+        forms = [
+            schemas.BogieChecksheetCreate.model_construct(
+                bmbcChecksheet=schemas.BmbcChecksheet.model_validate(row.bmbc_checksheet) if row.bmbc_checksheet is not None else None,
+                bogieChecksheet=schemas.BogieChecksheetDetails.model_validate(row.bogie_checksheet_details) if row.bogie_checksheet_details is not None else None,
+            )
+            for row in rows
+        ]
+        missing = condition_codes.missing_conditions(form_conditions(forms))
+        if missing:
+            assign_codes(db.connection(), missing)
+            db.commit()
+        _update(db, [
+            dict(b_id=row.id, b_inspection_date=row.inspection_date, conditions=encode(form),
+                 bmbc_checksheet=None, bogie_checksheet_details=None)
+            for row, form in zip(rows, forms)
+        ])
+        db.commit()
+        converted += len(rows)
+    return converted
+
+
+def decode_rows(db, batch_size: int = 1000) -> int:
+    """Converts compact-format rows back to the JSONB format. Returns the count."""
+    sheet = models.BogieChecksheet
+    converted = 0
+    for rows in _batches(db, sheet.conditions.is_not(None), batch_size):
+        load(db, [row.conditions for row in rows])
+        updates = []
+        for row in rows:
+            bmbc_checksheet, bogie_checksheet_details = decode(row.conditions)
+            updates.append(dict(
+                b_id=row.id, b_inspection_date=row.inspection_date, conditions=None,
+                bmbc_checksheet=bmbc_checksheet, bogie_checksheet_details=bogie_checksheet_details,
+            ))
+        _update(db, updates)
+        db.commit()
+        converted += len(rows)
+    return converted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m kpa_api.conditions", description="Convert stored bogie checksheet conditions between formats.",
+    )
+    parser.add_argument("command", choices=["encode", "decode"], help="encode: JSONB -> compact; decode: compact -> JSONB")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    from .database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        convert = encode_rows if args.command == "encode" else decode_rows
+        print(f"Converted {convert(session, args.batch_size)} bogie checksheet(s).")
+    finally:
+        session.close()
@@ -1,20 +1,23 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from . import models, schemas
-from typing import Optional, List
-from datetime import date
+from sqlalchemy import func, select, tuple_, or_, Select, Text, cast, literal, values, column
+from sqlalchemy.dialects.postgresql import insert as pg_insert, aggregate_order_by
+from . import models, schemas, rollups, partitions, conditions
+from .cache import wheel_specifications_cache
+from .measurements import MeasurementFilter, measurement_condition, measurement_rows
+from typing import Optional, List, Set, Tuple, Iterator, Dict
+from datetime import date, datetime
 
 # --- CRUD Operations for Bogie Checksheet ---
 
-def create_bogie_checksheet(db: Session, bogie_checksheet: schemas.BogieChecksheetCreate):
+def bogie_checksheet_values(bogie_checksheet: schemas.BogieChecksheetCreate) -> dict:
     """
-    Creates a new bogie checksheet record in the database.
-    Ensures nested Pydantic models are serialized to JSON-compatible dictionaries
-    before storing in JSONB columns.
+    Maps a BogieChecksheetCreate payload onto bogie_checksheets column values.
+    With BOGIE_CONDITION_STORAGE=compact the conditions are stored as codes, which
+    conditions.ensure_codes must have assigned beforehand.
     """
     # Use model_dump(mode='json') to serialize nested Pydantic models,
     # which correctly handles date objects by converting them to ISO 8601 strings.
-    db_bogie_checksheet = models.BogieChecksheet(
+    row = dict(
         form_number=bogie_checksheet.formNumber,
         inspection_by=bogie_checksheet.inspectionBy,
         inspection_date=bogie_checksheet.inspectionDate,
@@ -22,48 +25,423 @@ def create_bogie_checksheet(db: Session, bogie_checksheet: schemas.BogieCheckshe
         bogie_checksheet_details=bogie_checksheet.bogieChecksheet.model_dump(mode='json') if bogie_checksheet.bogieChecksheet else None,
         bogie_details=bogie_checksheet.bogieDetails.model_dump(mode='json') if bogie_checksheet.bogieDetails else None,
     )
-    db.add(db_bogie_checksheet)
+    if conditions.COMPACT:
+        row.update(bmbc_checksheet=None, bogie_checksheet_details=None, conditions=conditions.encode(bogie_checksheet))
+    return row
+
+def claiming_insert_statement(model, registry, rows: List[dict]):
+    """
+    Builds an INSERT of `rows` into the partitioned table of `model` that only
+    inserts rows whose form_number could be claimed in the `registry` table:
+
+        WITH incoming AS (VALUES ...),
+             claimed AS (INSERT INTO <registry> SELECT ... FROM incoming ON CONFLICT DO NOTHING RETURNING form_number)
+        INSERT INTO <table> SELECT ... FROM incoming JOIN claimed USING (form_number)
+
+    This replaces ON CONFLICT (form_number), which needs a unique index the partitioned
+    table cannot have. `rows` must not repeat a form_number.
+    """
+    table = model.__table__
+    names = list(rows[0])
+    incoming = select(
+        values(*[column(name, table.c[name].type) for name in names], name="payload").data(
+            [tuple(row[name] for name in names) for row in rows]
+        )
+    ).cte("incoming")
+    registry_columns = [registry_column.name for registry_column in registry.__table__.columns]
+    claimed = (
+        pg_insert(registry)
+        .from_select(registry_columns, select(*[incoming.c[name] for name in registry_columns]))
+        .on_conflict_do_nothing(index_elements=["form_number"])
+        .returning(registry.form_number)
+        .cte("claimed")
+    )
+    # Cast back to the column types: a VALUES column holding only NULLs would be text
+    return table.insert().from_select(
+        names,
+        select(*[cast(incoming.c[name], table.c[name].type) for name in names])
+        .join(claimed, claimed.c.form_number == incoming.c.form_number)
+    )
+
+def insert_bogie_checksheet_statement(bogie_checksheet: schemas.BogieChecksheetCreate):
+    """
+    Builds a single-row INSERT that does nothing if the formNumber already exists
+    and returns the columns needed for the creation response.
+    """
+    table = models.BogieChecksheet.__table__
+    return (
+        claiming_insert_statement(models.BogieChecksheet, models.BogieChecksheetFormNumber, [bogie_checksheet_values(bogie_checksheet)])
+        .returning(table.c.id, table.c.form_number, table.c.inspection_by, table.c.inspection_date)
+    )
+
+def create_bogie_checksheet(db: Session, bogie_checksheet: schemas.BogieChecksheetCreate):
+    """
+    Creates a new bogie checksheet record in the database.
+    Ensures nested Pydantic models are serialized to JSON-compatible dictionaries
+    before storing in JSONB columns.
+
+    Duplicate detection and the insert happen in one statement (see
+    claiming_insert_statement), so there is no race between concurrent submits
+    of the same formNumber.
+    The condition rollups (see rollups.py) are updated in the same transaction.
+    Returns the inserted row, or None if the formNumber already exists.
+    """
+    partitions.ensure_partitions(db.get_bind(), models.BogieChecksheet.__tablename__, [bogie_checksheet.inspectionDate])
+    conditions.ensure_codes(db.get_bind(), [bogie_checksheet])
+    db_bogie_checksheet = db.execute(insert_bogie_checksheet_statement(bogie_checksheet)).one_or_none()
+    if db_bogie_checksheet is not None:
+        _increment_condition_rollups(db, [bogie_checksheet])
     db.commit()
-    db.refresh(db_bogie_checksheet)
     return db_bogie_checksheet
 
+def bulk_insert_bogie_checksheets_statement(bogie_checksheets: List[schemas.BogieChecksheetCreate]):
+    """
+    Builds a multi-row INSERT for the given forms that skips formNumbers which
+    already exist (or repeat earlier in the list) and returns the form numbers
+    that were actually inserted.
+    """
+    table = models.BogieChecksheet.__table__
+    first_occurrences = {}
+    for item in bogie_checksheets:
+        first_occurrences.setdefault(item.formNumber, item)
+    return (
+        claiming_insert_statement(
+            models.BogieChecksheet, models.BogieChecksheetFormNumber,
+            [bogie_checksheet_values(item) for item in first_occurrences.values()]
+        )
+        .returning(table.c.form_number)
+    )
+
+def saved_bogie_checksheets(
+    bogie_checksheets: List[schemas.BogieChecksheetCreate], inserted: Set[str]
+) -> List[schemas.BogieChecksheetCreate]:
+    """The forms that were inserted; of a formNumber repeated within the chunk, only the first is."""
+    saved = {}
+    for item in bogie_checksheets:
+        if item.formNumber in inserted:
+            saved.setdefault(item.formNumber, item)
+    return list(saved.values())
+
+def _increment_condition_rollups(db: Session, bogie_checksheets: List[schemas.BogieChecksheetCreate]):
+    statement = rollups.increment_statement(bogie_checksheets)
+    if statement is not None:
+        db.execute(statement)
+
+def bulk_create_bogie_checksheets(db: Session, bogie_checksheets: List[schemas.BogieChecksheetCreate]) -> Set[str]:
+    """
+    Inserts a chunk of bogie checksheets with a single multi-row INSERT.
+    Rows whose formNumber already exists are skipped (see claiming_insert_statement),
+    so the whole chunk costs one statement (plus one for the condition rollups)
+    and one commit.
+    Returns the set of form numbers that were actually inserted.
+    """
+    if not bogie_checksheets:
+        return set()
+
+    partitions.ensure_partitions(
+        db.get_bind(), models.BogieChecksheet.__tablename__, {item.inspectionDate for item in bogie_checksheets}
+    )
+    conditions.ensure_codes(db.get_bind(), bogie_checksheets)
+    inserted = set(db.scalars(bulk_insert_bogie_checksheets_statement(bogie_checksheets)))
+    _increment_condition_rollups(db, saved_bogie_checksheets(bogie_checksheets, inserted))
+    db.commit()
+    return inserted
+
+# --- Queued submissions (INGEST_MODE=queued, see ingest.py) ---
+
+def ingest_bogie_checksheet_submissions(
+    db: Session, submissions: List[Tuple[str, datetime, schemas.BogieChecksheetCreate]]
+) -> Dict[str, str]:
+    """
+    Saves a batch of queued submissions, given as (tracking id, received at, form)
+    in the order they were accepted: one multi-row INSERT for the forms, one for
+    the condition rollups and one recording every submission's outcome, in a
+    single transaction and commit. Of several submissions with the same formNumber
+    only the first is saved. Outcomes already recorded for a tracking id are kept,
+    so writing a batch again after a crash changes nothing.
+    Returns tracking id -> status ("Saved" or "Duplicate").
+    """
+    forms = [form for _, _, form in submissions]
+    partitions.ensure_partitions(
+        db.get_bind(), models.BogieChecksheet.__tablename__, {form.inspectionDate for form in forms}
+    )
+    conditions.ensure_codes(db.get_bind(), forms)
+    inserted = set(db.scalars(bulk_insert_bogie_checksheets_statement(forms)))
+    _increment_condition_rollups(db, saved_bogie_checksheets(forms, inserted))
+
+    outcomes, rows = {}, []
+    for tracking_id, received_at, form in submissions:
+        if form.formNumber in inserted:
+            inserted.discard(form.formNumber)
+            outcomes[tracking_id], detail = "Saved", None
+        else:
+            outcomes[tracking_id], detail = "Duplicate", f"Form with formNumber '{form.formNumber}' already exists."
+        rows.append(dict(
+            tracking_id=tracking_id, form_number=form.formNumber, status=outcomes[tracking_id],
+            detail=detail, received_at=received_at,
+        ))
+    db.execute(
+        pg_insert(models.BogieChecksheetSubmission).values(rows).on_conflict_do_nothing(index_elements=["tracking_id"])
+    )
+    db.commit()
+    return outcomes
+
+def record_failed_bogie_checksheet_submission(
+    db: Session, tracking_id: str, received_at: datetime, form_number: str, detail: str
+):
+    """Records that a queued submission could not be saved (the database rejected the form itself)."""
+    db.execute(
+        pg_insert(models.BogieChecksheetSubmission)
+        .values(
+            tracking_id=tracking_id, form_number=form_number, status="Failed", detail=detail, received_at=received_at,
+        )
+        .on_conflict_do_nothing(index_elements=["tracking_id"])
+    )
+    db.commit()
+
+# --- Search over bogie checksheet JSONB content ---
+
+# Component name -> JSONB column holding its condition
+BOGIE_CHECKSHEET_COMPONENTS = {
+    **{name: models.BogieChecksheet.bmbc_checksheet for name in schemas.BmbcChecksheet.model_fields},
+    **{name: models.BogieChecksheet.bogie_checksheet_details for name in schemas.BogieChecksheetDetails.model_fields},
+}
+
+def _condition_spellings(condition: str) -> List[str]:
+    """Forms store conditions in mixed case ("Cracked", "DAMAGED"); match the common spellings."""
+    return sorted({condition, condition.upper(), condition.lower(), condition.title(), condition.capitalize()})
+
+def bogie_checksheets_search_query(
+    bogie_no: Optional[str] = None,
+    inspection_by: Optional[str] = None,
+    inspection_date_from: Optional[date] = None,
+    inspection_date_to: Optional[date] = None,
+    component: Optional[str] = None,
+    condition: Optional[str] = None,
+    after: Optional[Tuple[date, int]] = None,
+) -> Select:
+    """
+    Builds the bogie checksheet search, ordered by the (inspection_date, id) keyset.
+    Condition filters are JSONB containment (@>) tests, which the jsonb_path_ops
+    GIN indexes answer; without `component`, every known component is tried (OR).
+    Rows in the compact format are matched on their codes (conditions.condition_filter).
+    """
+    sheet = models.BogieChecksheet
+    query = select(sheet)
+
+    if bogie_no:
+        query = query.where(models.bogie_no_expression == bogie_no)
+    if inspection_by:
+        query = query.where(sheet.inspection_by == inspection_by)
+    if inspection_date_from:
+        query = query.where(sheet.inspection_date >= inspection_date_from)
+    if inspection_date_to:
+        query = query.where(sheet.inspection_date <= inspection_date_to)
+    if condition:
+        components = [component] if component else list(BOGIE_CHECKSHEET_COMPONENTS)
+        query = query.where(or_(
+            *[
+                BOGIE_CHECKSHEET_COMPONENTS[name].contains({name: spelling})
+                for name in components
+                for spelling in _condition_spellings(condition)
+            ],
+            conditions.condition_filter(components, _condition_spellings(condition)),
+        ))
+    if after:
+        query = query.where(tuple_(sheet.inspection_date, sheet.id) > tuple_(*after))
+
+    return query.order_by(sheet.inspection_date, sheet.id)
+
+def search_bogie_checksheets(db: Session, limit: int = 100, **filters) -> List[models.BogieChecksheet]:
+    """
+    Searches bogie checksheets by bogieNo, inspector, inspection date range and
+    component condition (see bogie_checksheets_search_query for the filters).
+    """
+    sheets = list(db.scalars(bogie_checksheets_search_query(**filters).limit(limit)))
+    conditions.load(db, [sheet.conditions for sheet in sheets])
+    return sheets
+
+# --- Condition analytics over the rollup table ---
+
+def get_condition_counts(db: Session, group_by: List[str], **filters):
+    """
+    Returns condition counts from the rollup table, one row per group
+    (see rollups.condition_counts_query for the filters).
+    """
+    return db.execute(rollups.condition_counts_query(group_by, **filters)).all()
+
 # --- CRUD Operations for Wheel Specifications ---
 
+def wheel_specifications_query(
+    form_number: Optional[str] = None,
+    submitted_by: Optional[str] = None,
+    submitted_date: Optional[date] = None,
+    after: Optional[Tuple[date, int]] = None,
+    measurement: Optional[MeasurementFilter] = None,
+) -> Select:
+    """
+    Builds the filtered wheel specification SELECT, ordered by the (submitted_date, id)
+    keyset. `after` resumes the scan strictly after the given keyset position;
+    `measurement` filters on the parsed numeric measurements.
+    Shared by the sync functions below and their async counterparts in async_crud.
+    """
+    query = select(models.WheelSpecification)
+
+    if form_number:
+        query = query.where(models.WheelSpecification.form_number == form_number)
+    if submitted_by:
+        query = query.where(models.WheelSpecification.submitted_by == submitted_by)
+    if submitted_date:
+        query = query.where(models.WheelSpecification.submitted_date == submitted_date)
+    if after:
+        query = query.where(
+            tuple_(models.WheelSpecification.submitted_date, models.WheelSpecification.id) > tuple_(*after)
+        )
+    if measurement:
+        query = query.where(measurement_condition(measurement))
+
+    return query.order_by(models.WheelSpecification.submitted_date, models.WheelSpecification.id)
+
 def get_wheel_specifications(
     db: Session,
     form_number: Optional[str] = None,
     submitted_by: Optional[str] = None,
     submitted_date: Optional[date] = None,
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    after: Optional[Tuple[date, int]] = None,
+    measurement: Optional[MeasurementFilter] = None,
 ) -> List[models.WheelSpecification]:
     """
     Retrieves wheel specification records from the database with optional filters.
+    Prefer `after` (keyset) over `skip` (OFFSET) for paging through large tables.
     """
-    query = db.query(models.WheelSpecification)
+    query = wheel_specifications_query(form_number, submitted_by, submitted_date, after, measurement)
+    if skip:
+        query = query.offset(skip)
+    return list(db.scalars(query.limit(limit)))
 
-    if form_number:
-        query = query.filter(models.WheelSpecification.form_number == form_number)
-    if submitted_by:
-        query = query.filter(models.WheelSpecification.submitted_by == submitted_by)
-    if submitted_date:
-        query = query.filter(models.WheelSpecification.submitted_date == submitted_date)
+def iter_wheel_specifications(
+    db: Session,
+    form_number: Optional[str] = None,
+    submitted_by: Optional[str] = None,
+    submitted_date: Optional[date] = None,
+    after: Optional[Tuple[date, int]] = None,
+    measurement: Optional[MeasurementFilter] = None,
+    batch_size: int = 1000,
+) -> Iterator[models.WheelSpecification]:
+    """
+    Streams every matching wheel specification through a server-side cursor.
+    Only `batch_size` rows are buffered at a time, so memory stays constant
+    regardless of how many rows match.
+    """
+    query = wheel_specifications_query(form_number, submitted_by, submitted_date, after, measurement)
+    yield from db.scalars(query.execution_options(yield_per=batch_size))
+
+# --- Database-side JSON assembly (RESPONSE_SERIALIZATION=database) ---
+
+def _json_text(expr):
+    """SQL for the compact JSON text of a scalar (JSON null when NULL), as Pydantic renders it."""
+    return func.coalesce(cast(func.to_json(expr), Text), literal("null"))
+
+def wheel_specification_item_json():
+    """
+    SQL expression rendering one wheel_specifications row as the exact JSON text
+    of schemas.WheelSpecificationResponseDataItem.model_dump_json(): same key
+    order, no whitespace, missing fields as null.
+    """
+    spec = models.WheelSpecification
+    parts = ['{"fields":{']
+    for position, name in enumerate(schemas.WheelSpecificationFields.model_fields):
+        parts.append(f'{"," if position else ""}"{name}":')
+        parts.append(_json_text(spec.fields[name].astext))
+    parts += [
+        '},"formNumber":', _json_text(spec.form_number),
+        ',"submittedBy":', _json_text(spec.submitted_by),
+        ',"submittedDate":"', func.to_char(spec.submitted_date, "YYYY-MM-DD"), '"}',
+    ]
+    return func.concat(*[literal(part) if isinstance(part, str) else part for part in parts])
+
+def wheel_specifications_json_query(
+    form_number: Optional[str] = None,
+    submitted_by: Optional[str] = None,
+    submitted_date: Optional[date] = None,
+    limit: int = 100,
+    after: Optional[Tuple[date, int]] = None,
+    measurement: Optional[MeasurementFilter] = None,
+) -> Select:
+    """
+    Builds the single-row aggregate behind get_wheel_specifications_json:
+    items are rendered and joined in keyset order over at most limit + 1 rows.
+    """
+    spec = models.WheelSpecification
+    page = (
+        wheel_specifications_query(form_number, submitted_by, submitted_date, after, measurement)
+        .with_only_columns(
+            spec.id,
+            spec.submitted_date,
+            wheel_specification_item_json().label("item"),
+            func.row_number().over(order_by=(spec.submitted_date, spec.id)).label("position"),
+        )
+        .limit(limit + 1)
+        .subquery()
+    )
+    in_page = page.c.position <= limit
+    return select(
+        func.string_agg(page.c.item, aggregate_order_by(literal(","), page.c.position)).filter(in_page).label("items"),
+        func.count().label("matched"),
+        func.max(page.c.submitted_date).filter(page.c.position == limit).label("last_date"),
+        func.max(page.c.id).filter(page.c.position == limit).label("last_id"),
+    )
 
-    return query.offset(skip).limit(limit).all()
+def get_wheel_specifications_json(
+    db: Session,
+    form_number: Optional[str] = None,
+    submitted_by: Optional[str] = None,
+    submitted_date: Optional[date] = None,
+    limit: int = 100,
+    after: Optional[Tuple[date, int]] = None,
+    measurement: Optional[MeasurementFilter] = None,
+):
+    """
+    Renders a page of wheel specifications to JSON inside Postgres.
+    Returns one row: `items` (the comma-joined JSON items of the first `limit`
+    matches, or None), `matched` (up to limit + 1, to detect a following page)
+    and `last_date`/`last_id` (keyset position of the last returned item).
+    """
+    return db.execute(wheel_specifications_json_query(form_number, submitted_by, submitted_date, limit, after, measurement)).one()
 
 # For demonstration, let's add a function to populate some dummy data for wheel specifications
 def create_dummy_wheel_specification(db: Session, item: schemas.WheelSpecificationCreate):
     """
     Creates a dummy wheel specification record. Used for populating initial data.
     """
+    partitions.ensure_partitions(db.get_bind(), models.WheelSpecification.__tablename__, [item.submittedDate])
     db_item = models.WheelSpecification(
         form_number=item.formNumber,
         submitted_by=item.submittedBy,
         submitted_date=item.submittedDate,
         # Use model_dump(mode='json') here as well for consistency and correct date serialization
         fields=item.fields.model_dump(mode='json') if item.fields else None,
+        measurements=measurement_rows(item.fields.model_dump() if item.fields else None),
     )
+    # Claims the formNumber; a duplicate fails on the registry's primary key
+    db.add(models.WheelSpecificationFormNumber(form_number=item.formNumber, submitted_date=item.submittedDate))
     db.add(db_item)
     db.commit()
+    # Every write to wheel_specifications must invalidate the cached GET responses
+    wheel_specifications_cache.invalidate()
     db.refresh(db_item)
     return db_item
+
+# --- Read-your-writes (DATABASE_REPLICA_URLS, see replicas.py) ---
+
+def current_wal_lsn_query() -> Select:
+    return select(cast(func.pg_current_wal_lsn(), Text))
+
+def current_wal_lsn(db: Session) -> str:
+    """
+    The primary's current WAL position. Taken after a commit, it covers that
+    commit; returned to the client as its X-Consistency-Token.
+    """
+    return db.execute(current_wal_lsn_query()).scalar_one()
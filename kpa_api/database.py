@@ -1,19 +1,225 @@
 import os
-from sqlalchemy import create_engine
+import threading
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from dotenv import load_dotenv
 
+from .pool_metrics import PoolMetrics, instrumented_pool_class, instrument_engine
+from .replicas import ASYNC_DATABASE_REPLICA_URLS, DATABASE_REPLICA_URLS, replica_name, replica_router
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-if not DATABASE_URL:
-    raise ValueError("Database URL is not set in the env file")
+# "sync" (default) serves the form endpoints from threadpool workers with SessionLocal;
+# "async" serves them on the event loop with AsyncSessionLocal.
+DB_MODE = os.getenv("DB_MODE", "sync").lower()
+
+if DB_MODE not in ("sync", "async"):
+    raise ValueError(f"DB_MODE must be 'sync' or 'async', got '{DB_MODE}'")
+
+USE_ASYNC_DB = DB_MODE == "async"
+
+# --- Engine profile ---
+# DB_PROFILE picks a preset; each DB_* variable below overrides a single setting of it.
+ENGINE_PROFILES = {
+    "development": dict(pool_size=5, max_overflow=10, pool_timeout=30, pool_recycle=-1,
+                        pool_pre_ping=False, statement_timeout_ms=0, echo=True),
+    "production": dict(pool_size=10, max_overflow=5, pool_timeout=5, pool_recycle=1800,
+                       pool_pre_ping=True, statement_timeout_ms=15000, echo=False),
+}
+
+DB_PROFILE = os.getenv("DB_PROFILE", "development").lower()
+
+if DB_PROFILE not in ENGINE_PROFILES:
+    raise ValueError(f"DB_PROFILE must be one of {sorted(ENGINE_PROFILES)}, got '{DB_PROFILE}'")
+
+
+def _env_flag(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def load_engine_profile() -> dict:
+    """Resolves the engine settings for DB_PROFILE with any DB_* environment overrides applied."""
+    profile = dict(ENGINE_PROFILES[DB_PROFILE])
+    overrides = {
+        "pool_size": ("DB_POOL_SIZE", int),
+        "max_overflow": ("DB_MAX_OVERFLOW", int),
+        "pool_timeout": ("DB_POOL_TIMEOUT", float),
+        "pool_recycle": ("DB_POOL_RECYCLE", int),
+        "pool_pre_ping": ("DB_POOL_PRE_PING", _env_flag),
+        "statement_timeout_ms": ("DB_STATEMENT_TIMEOUT_MS", int),
+        "echo": ("DB_ECHO", _env_flag),
+    }
+    for setting, (env_var, parse) in overrides.items():
+        value = os.getenv(env_var)
+        if value is not None and value != "":
+            profile[setting] = parse(value)
+    return profile
+
+
+ENGINE_PROFILE = load_engine_profile()
+
+
+def _engine_kwargs(profile: dict, poolclass, metrics: PoolMetrics) -> dict:
+    return dict(
+        echo=profile["echo"],
+        poolclass=instrumented_pool_class(poolclass, metrics),
+        pool_size=profile["pool_size"],
+        max_overflow=profile["max_overflow"],
+        pool_timeout=profile["pool_timeout"],
+        pool_recycle=profile["pool_recycle"],
+        pool_pre_ping=profile["pool_pre_ping"],
+    )
+
+
+# --- Engines ---
+# Engines are created on first use, not at import: importing the app (every
+# worker, the CLIs) needs neither DATABASE_URL nor the database driver, and a
+# worker opens its first connection when its first request needs one. The schema
+# is managed separately by `python -m kpa_api.migrations upgrade` (see migrations/).
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def _database_url() -> str:
+    if not DATABASE_URL:
+        raise ValueError("Database URL is not set in the env file")
+    return DATABASE_URL
+
+
+def _create_sync_engine(name: str = "sync", url: str = None) -> Engine:
+    kwargs = _engine_kwargs(ENGINE_PROFILE, QueuePool, PoolMetrics(name))
+    if ENGINE_PROFILE["statement_timeout_ms"]:
+        # libpq startup option, applied server-side to every session on this engine
+        kwargs["connect_args"] = {"options": f"-c statement_timeout={ENGINE_PROFILE['statement_timeout_ms']}"}
+    engine = create_engine(url or _database_url(), **kwargs)
+    instrument_engine(engine, kwargs["poolclass"].metrics)
+    return engine
+
+
+def _create_async_engine(name: str = "async", url: str = None):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    # ASYNC_DATABASE_URL, or DATABASE_URL with the asyncpg driver
+    url = url or os.getenv("ASYNC_DATABASE_URL") or make_url(_database_url()).set(
+        drivername="postgresql+asyncpg"
+    ).render_as_string(hide_password=False)
+    kwargs = _engine_kwargs(ENGINE_PROFILE, AsyncAdaptedQueuePool, PoolMetrics(name))
+    if ENGINE_PROFILE["statement_timeout_ms"]:
+        kwargs["connect_args"] = {"server_settings": {"statement_timeout": str(ENGINE_PROFILE["statement_timeout_ms"])}}
+    engine = create_async_engine(url, **kwargs)
+    instrument_engine(engine.sync_engine, kwargs["poolclass"].metrics)
+    return engine
+
+
+def _watch_replica(engine: Engine, index: int) -> Engine:
+    """A lost connection takes the replica out of rotation without waiting for the next check."""
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(context):
+        if context.is_disconnect:
+            replica_router.mark_unhealthy(index, f"disconnect: {context.original_exception}".splitlines()[0])
+
+    return engine
+
+
+def _engine(name: str, create):
+    engine = _engines.get(name)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(name)
+            if engine is None:
+                engine = _engines[name] = create()
+    return engine
+
+
+def get_engine() -> Engine:
+    """The sync engine, created on first call."""
+    return _engine("sync", _create_sync_engine)
 
-engine = create_engine(DATABASE_URL, echo=True)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def get_async_engine():
+    """The AsyncEngine (DB_MODE=async), created on first call."""
+    return _engine("async", _create_async_engine)
+
+
+def get_replica_engine(index: int) -> Engine:
+    """The sync engine of replica `index` of DATABASE_REPLICA_URLS, created on first call."""
+    name = replica_name(index)
+    return _engine(name, lambda: _watch_replica(_create_sync_engine(name, DATABASE_REPLICA_URLS[index]), index))
+
+
+def get_async_replica_engine(index: int):
+    """The AsyncEngine of replica `index` (DB_MODE=async), created on first call."""
+    name = f"{replica_name(index)}-async"
+
+    def create():
+        engine = _create_async_engine(name, ASYNC_DATABASE_REPLICA_URLS[index])
+        _watch_replica(engine.sync_engine, index)
+        return engine
+
+    return _engine(name, create)
+
+
+def created_engines() -> dict:
+    """Engines created so far in this process, by name ("sync", "async", "replica-0", ...), as sync Engines."""
+    return {
+        name: getattr(engine, "sync_engine", engine)
+        for name, engine in _engines.items()
+    }
+
+
+class _LazyEngineSession(Session):
+    """Session bound to get_engine(); the engine is created when the session first needs a connection."""
+
+    def get_bind(self, mapper=None, *, bind=None, **kwargs):
+        return bind if bind is not None else get_engine()
+
+
+class _LazyAsyncEngineSession(Session):
+    """The sync side of AsyncSessionLocal sessions, bound to get_async_engine()."""
+
+    def get_bind(self, mapper=None, *, bind=None, **kwargs):
+        return bind if bind is not None else get_async_engine().sync_engine
+
+
+class _ReadSession(Session):
+    """
+    Session for read-only work, bound to the replica replica_router picks when the
+    session first needs a connection, or to the primary. info["min_lsn"] (optional)
+    is the WAL position the replica must have replayed; info["replica"] records
+    the choice (None for the primary).
+    """
+
+    def _route(self):
+        if "replica" not in self.info:
+            self.info["replica"] = replica_router.choose(self.info.get("min_lsn"))
+        return self.info["replica"]
+
+    def get_bind(self, mapper=None, *, bind=None, **kwargs):
+        if bind is not None:
+            return bind
+        index = self._route()
+        return get_engine() if index is None else get_replica_engine(index)
+
+
+class _ReadAsyncSession(_ReadSession):
+    """The sync side of AsyncReadSessionLocal sessions."""
+
+    def get_bind(self, mapper=None, *, bind=None, **kwargs):
+        if bind is not None:
+            return bind
+        index = self._route()
+        return (get_async_engine() if index is None else get_async_replica_engine(index)).sync_engine
+
+
+SessionLocal = sessionmaker(class_=_LazyEngineSession, autocommit=False, autoflush=False)
+# Without DATABASE_REPLICA_URLS, read sessions simply use the primary
+ReadSessionLocal = sessionmaker(class_=_ReadSession, autocommit=False, autoflush=False)
 
 Base = declarative_base()
 
@@ -23,4 +229,26 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()    
\ No newline at end of file
+        db.close()
+
+
+# --- Async sessions (DB_MODE=async) ---
+# Only set up when selected, so the asyncpg driver is not required for the sync path.
+AsyncSessionLocal = None
+AsyncReadSessionLocal = None
+
+if USE_ASYNC_DB:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    # expire_on_commit=False: attribute access after commit must not trigger implicit IO
+    AsyncSessionLocal = async_sessionmaker(
+        sync_session_class=_LazyAsyncEngineSession, autoflush=False, expire_on_commit=False,
+    )
+    AsyncReadSessionLocal = async_sessionmaker(
+        sync_session_class=_ReadAsyncSession, autoflush=False, expire_on_commit=False,
+    )
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,283 @@
+import argparse
+import asyncio
+import csv
+import io
+import os
+import sys
+from datetime import date
+from decimal import Decimal
+from typing import AsyncIterator, Callable, Dict, Iterator, List, NamedTuple, Optional
+
+from sqlalchemy import Select
+
+from . import conditions, crud, models, schemas
+from .measurements import MeasurementFilter
+
+# Full dumps of the form tables with their JSONB objects flattened into one
+# column per field, as CSV or Parquet. Rows are fetched from a server-side cursor
+# EXPORT_CHUNK_ROWS at a time, and every chunk is encoded and handed on before
+# the next one is fetched, so memory stays constant however many rows match.
+# Used by the /export endpoints in main.py and by `python -m kpa_api.export`.
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "10000"))
+
+# Format -> media type
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+class ExportColumn(NamedTuple):
+    name: str  # CSV header / Parquet field, e.g. bogieDetails.bogieNo
+    expression: object
+    is_date: bool = False
+    component: Optional[str] = None  # Set for component conditions, which compact rows store as codes
+
+
+def _flattened(prefix: str, column, fields, components: bool = False) -> List[ExportColumn]:
+    """One text column per key of a JSONB object column (->> yields NULL for missing keys)."""
+    return [
+        ExportColumn(f"{prefix}.{field}", column[field].astext, component=field if components else None)
+        for field in fields
+    ]
+
+
+class ExportSpec(NamedTuple):
+    columns: List[ExportColumn]
+    query: Callable[..., Select]  # filter kwargs -> SELECT of the matching forms
+
+
+_wheel = models.WheelSpecification
+_sheet = models.BogieChecksheet
+
+EXPORTS: Dict[str, ExportSpec] = {
+    "wheel-specifications": ExportSpec(
+        [
+            ExportColumn("formNumber", _wheel.form_number),
+            ExportColumn("submittedBy", _wheel.submitted_by),
+            ExportColumn("submittedDate", _wheel.submitted_date, is_date=True),
+            ExportColumn("createdAt", _wheel.created_at, is_date=True),
+            *_flattened("fields", _wheel.fields, schemas.WheelSpecificationFields.model_fields),
+        ],
+        crud.wheel_specifications_query,
+    ),
+    "bogie-checksheets": ExportSpec(
+        [
+            ExportColumn("formNumber", _sheet.form_number),
+            ExportColumn("inspectionBy", _sheet.inspection_by),
+            ExportColumn("inspectionDate", _sheet.inspection_date, is_date=True),
+            ExportColumn("createdAt", _sheet.created_at, is_date=True),
+            *_flattened("bmbcChecksheet", _sheet.bmbc_checksheet, schemas.BmbcChecksheet.model_fields, components=True),
+            *_flattened("bogieChecksheet", _sheet.bogie_checksheet_details, schemas.BogieChecksheetDetails.model_fields, components=True),
+            *_flattened("bogieDetails", _sheet.bogie_details, schemas.BogieDetails.model_fields),
+        ],
+        crud.bogie_checksheets_search_query,
+    ),
+}
+
+
+def _has_components(kind: str) -> bool:
+    return any(column.component for column in EXPORTS[kind].columns)
+
+
+def export_query(kind: str, **filters) -> Select:
+    """
+    The filtered query of the list/search endpoint of `kind`, selecting the
+    flattened columns instead, plus the conditions array if `kind` has component
+    columns (see decode_conditions).
+    """
+    spec = EXPORTS[kind]
+    columns = [column.expression.label(column.name) for column in spec.columns]
+    if _has_components(kind):
+        columns.append(models.BogieChecksheet.conditions.label("conditions"))
+    return spec.query(**filters).with_only_columns(*columns)
+
+
+def decode_conditions(kind: str, rows) -> list:
+    """
+    Drops the trailing conditions array of export_query rows, filling the component
+    columns of compact rows from it first. Its codes must be loaded (conditions.load).
+    """
+    if not _has_components(kind):
+        return rows
+    components = [column.component for column in EXPORTS[kind].columns]
+    decoded = []
+    for *values, stored in rows:
+        if stored is not None:
+            by_component = conditions.decode_components(stored)
+            values = [
+                by_component.get(component) if component else value for component, value in zip(components, values)
+            ]
+        decoded.append(values)
+    return decoded
+
+
+# --- Encoders ---
+# begin() and end() frame the file; encode() turns one chunk of rows into bytes.
+
+class CsvEncoder:
+    def __init__(self, columns: List[ExportColumn]):
+        self.columns = columns
+
+    def _lines(self, rows) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(rows)
+        return buffer.getvalue().encode()
+
+    def begin(self) -> bytes:
+        return self._lines([[column.name for column in self.columns]])
+
+    def encode(self, rows) -> bytes:
+        return self._lines(rows)
+
+    def end(self) -> bytes:
+        return b""
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file that keeps what was written until drain() takes it."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ParquetEncoder:
+    """Writes every chunk as one Parquet row group. Requires the optional `pyarrow` package."""
+
+    def __init__(self, columns: List[ExportColumn]):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Parquet export requires the pyarrow package (pip install pyarrow).")
+        self._pyarrow = pyarrow
+        self.schema = pyarrow.schema([
+            (column.name, pyarrow.date32() if column.is_date else pyarrow.string()) for column in columns
+        ])
+        self._sink = _DrainableSink()
+        self._writer = pyarrow.parquet.ParquetWriter(self._sink, self.schema)
+
+    def begin(self) -> bytes:
+        return self._sink.drain()
+
+    def encode(self, rows) -> bytes:
+        values = list(zip(*rows)) if rows else [[] for _ in self.schema]
+        table = self._pyarrow.Table.from_arrays(
+            [self._pyarrow.array(column, type=field.type) for column, field in zip(values, self.schema)],
+            schema=self.schema,
+        )
+        self._writer.write_table(table)
+        return self._sink.drain()
+
+    def end(self) -> bytes:
+        self._writer.close()  # writes the footer
+        return self._sink.drain()
+
+
+ENCODERS = {"csv": CsvEncoder, "parquet": ParquetEncoder}
+
+
+def make_encoder(kind: str, export_format: str):
+    """Raises ImportError if the format needs a package that is not installed."""
+    return ENCODERS[export_format](EXPORTS[kind].columns)
+
+
+# --- Streaming ---
+
+def stream_export(db, kind: str, encoder, chunk_rows: int = EXPORT_CHUNK_ROWS, **filters) -> Iterator[bytes]:
+    """Yields the export file of the forms of `kind` matching `filters`, one encoded chunk at a time."""
+    yield encoder.begin()
+    result = db.execute(export_query(kind, **filters).execution_options(yield_per=chunk_rows))
+    for rows in result.partitions():
+        if _has_components(kind):
+            conditions.load(db, [row[-1] for row in rows])
+        yield encoder.encode(decode_conditions(kind, rows))
+    yield encoder.end()
+
+
+async def stream_export_async(db, kind: str, encoder, chunk_rows: int = EXPORT_CHUNK_ROWS, **filters) -> AsyncIterator[bytes]:
+    """Async variant of stream_export; chunks are decoded and encoded in a worker thread, off the event loop."""
+    yield encoder.begin()
+    result = await db.stream(export_query(kind, **filters).execution_options(yield_per=chunk_rows))
+    async for rows in result.partitions():
+        if _has_components(kind):
+            await conditions.load_async(db, [row[-1] for row in rows])
+        yield await asyncio.to_thread(lambda: encoder.encode(decode_conditions(kind, rows)))
+    yield encoder.end()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m kpa_api.export", description="Export forms to CSV or Parquet.")
+    commands = parser.add_subparsers(dest="kind", required=True)
+    for kind in EXPORTS:
+        command = commands.add_parser(kind, help=f"Export {kind.replace('-', ' ')}.")
+        command.add_argument("--format", choices=sorted(ENCODERS), default="csv")
+        command.add_argument("--output", "-o", help="File to write (default: standard output)")
+        command.add_argument("--chunk-rows", type=int, default=EXPORT_CHUNK_ROWS)
+        if kind == "wheel-specifications":
+            command.add_argument("--form-number")
+            command.add_argument("--submitted-by")
+            command.add_argument("--submitted-date", type=date.fromisoformat)
+            command.add_argument("--measurement", choices=sorted(schemas.WheelSpecificationFields.model_fields))
+            command.add_argument("--measurement-min", type=Decimal)
+            command.add_argument("--measurement-max", type=Decimal)
+            command.add_argument("--out-of-tolerance", action="store_true")
+        else:
+            command.add_argument("--bogie-no")
+            command.add_argument("--inspection-by")
+            command.add_argument("--inspection-date-from", type=date.fromisoformat)
+            command.add_argument("--inspection-date-to", type=date.fromisoformat)
+            command.add_argument("--component", choices=list(crud.BOGIE_CHECKSHEET_COMPONENTS))
+            command.add_argument("--condition")
+    args = parser.parse_args()
+
+    if args.kind == "wheel-specifications":
+        if (args.measurement_min is not None or args.measurement_max is not None) and not args.measurement:
+            parser.error("--measurement-min and --measurement-max require --measurement")
+        filters = dict(form_number=args.form_number, submitted_by=args.submitted_by, submitted_date=args.submitted_date)
+        if args.measurement or args.out_of_tolerance:
+            filters["measurement"] = MeasurementFilter(
+                args.measurement, args.measurement_min, args.measurement_max, args.out_of_tolerance
+            )
+    else:
+        if args.component and not args.condition:
+            parser.error("--component requires --condition")
+        filters = dict(
+            bogie_no=args.bogie_no, inspection_by=args.inspection_by, component=args.component, condition=args.condition,
+            inspection_date_from=args.inspection_date_from, inspection_date_to=args.inspection_date_to,
+        )
+
+    try:
+        encoder = make_encoder(args.kind, args.format)
+    except ImportError as exc:
+        sys.exit(str(exc))
+
+    from .database import SessionLocal
+
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    session = SessionLocal()
+    try:
+        for chunk in stream_export(session, args.kind, encoder, args.chunk_rows, **filters):
+            output.write(chunk)
+    finally:
+        session.close()
+        if args.output:
+            output.close()
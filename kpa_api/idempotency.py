@@ -0,0 +1,115 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+
+# Placeholder stored while the first request with a key is still being processed
+_IN_FLIGHT = object()
+
+
+def request_fingerprint(payload: BaseModel) -> str:
+    """Hashes a validated request body, so a reused key with a different payload can be detected."""
+    return hashlib.sha256(payload.model_dump_json().encode()).hexdigest()
+
+
+class IdempotencyCache:
+    """
+    Bounded, in-process LRU of responses keyed by the client's Idempotency-Key.
+    Entries expire after `ttl` seconds; the least recently used entry is evicted
+    once `max_entries` is reached. Server errors are never cached, so a retry
+    after a 5xx is processed again.
+    """
+
+    def __init__(self, max_entries: int = IDEMPOTENCY_CACHE_SIZE, ttl: float = IDEMPOTENCY_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reserve(self, key: str, fingerprint: str) -> Optional[dict]:
+        """
+        Returns the stored response ({"status_code", "body"}) for `key`, or reserves
+        the key for the caller and returns None if it has not been seen yet.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < now:
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self._entries[key] = (now + self.ttl, fingerprint, _IN_FLIGHT)
+                self._evict()
+                return None
+
+            _, stored_fingerprint, response = entry
+            if stored_fingerprint != fingerprint:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="Idempotency-Key was already used with a different request payload."
+                )
+            if response is _IN_FLIGHT:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still being processed."
+                )
+            self._entries.move_to_end(key)
+            return response
+
+    def complete(self, key: Optional[str], status_code: int, response: BaseModel):
+        """Stores the response for a reserved key and passes the response through."""
+        if key is not None:
+            self._store(key, status_code, response.model_dump(mode="json"))
+        return response
+
+    def release(self, key: str):
+        """Drops a reservation without storing a response."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is _IN_FLIGHT:
+                del self._entries[key]
+
+    @contextmanager
+    def guard(self, key: Optional[str]):
+        """
+        Wraps the processing of a reserved key: client errors (HTTPException < 500)
+        are stored like any other response, anything else releases the key.
+        """
+        if key is None:
+            yield
+            return
+        try:
+            yield
+        except HTTPException as exc:
+            if exc.status_code < 500:
+                self._store(key, exc.status_code, {"detail": exc.detail})
+            else:
+                self.release(key)
+            raise
+        except BaseException:
+            self.release(key)
+            raise
+
+    def _store(self, key: str, status_code: int, body):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            self._entries[key] = (entry[0], entry[1], {"status_code": status_code, "body": body})
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+idempotency_cache = IdempotencyCache()
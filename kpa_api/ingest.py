@@ -0,0 +1,479 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import date, datetime, timezone
+from typing import Deque, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+from . import crud, partitions, schemas
+
+# Write-behind ingestion of bogie checksheets (INGEST_MODE=queued).
+# POST /api/forms/bogie-checksheet validates the form, appends it to a local
+# append-only log, fsyncs and answers 202 with a tracking id. A flusher thread
+# saves the queued forms in batches of up to INGEST_BATCH_SIZE, each batch one
+# transaction and one commit (crud.ingest_bogie_checksheet_submissions), and
+# records every submission's outcome in bogie_checksheet_submissions.
+#
+# Log layout: every worker process claims a slot directory <INGEST_LOG_DIR>/slot-<n>
+# (held with a file lock while it runs) holding numbered segment files of one
+# JSON record per line, and a checkpoint: the log position up to which every
+# record is committed to the database. On start, records after the checkpoint
+# are queued again, and slots left behind by workers that are gone are taken
+# over. Replaying a record that was committed but not yet checkpointed is
+# harmless: its tracking id and formNumber are already taken.
+
+logger = logging.getLogger(__name__)
+
+# "direct" (default): POST saves the form before answering 201.
+# "queued": POST answers 202 once the form is in the log; see above.
+INGEST_MODE = os.getenv("INGEST_MODE", "direct").lower()
+
+if INGEST_MODE not in ("direct", "queued"):
+    raise ValueError(f"INGEST_MODE must be 'direct' or 'queued', got '{INGEST_MODE}'")
+
+INGEST_LOG_DIR = os.getenv("INGEST_LOG_DIR", "ingest")
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+# How long the oldest queued form may wait for its batch to fill up
+INGEST_FLUSH_INTERVAL_MS = int(os.getenv("INGEST_FLUSH_INTERVAL_MS", "50"))
+INGEST_SEGMENT_BYTES = int(os.getenv("INGEST_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+# How long shutdown waits for the queue to drain; what is left is replayed on the next start
+INGEST_SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("INGEST_SHUTDOWN_TIMEOUT_SECONDS", "10"))
+
+_MAX_RETRY_DELAY = 30.0
+
+
+class Submission(NamedTuple):
+    tracking_id: str
+    received_at: datetime
+    form: schemas.BogieChecksheetCreate
+    position: Tuple[int, int]  # (segment, end offset) of its log record
+
+
+def _try_lock(file) -> bool:
+    """Takes an exclusive, non-blocking lock on `file`; False if another process holds it."""
+    try:
+        file.seek(0)
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def _fsync_directory(path: str):
+    """Makes a new file's directory entry durable (not needed, nor possible, on Windows)."""
+    if os.name != "nt":
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _segment_path(slot: str, segment: int) -> str:
+    return os.path.join(slot, f"{segment:08d}.log")
+
+
+def _segments(slot: str) -> List[int]:
+    return sorted(int(os.path.basename(path)[:-4]) for path in glob.glob(os.path.join(slot, "*.log")))
+
+
+def _read_checkpoint(slot: str) -> Tuple[int, int]:
+    try:
+        with open(os.path.join(slot, "checkpoint"), encoding="utf-8") as file:
+            checkpoint = json.load(file)
+        return checkpoint["segment"], checkpoint["offset"]
+    except FileNotFoundError:
+        return 0, 0
+
+
+def _write_checkpoint(slot: str, position: Tuple[int, int]):
+    # Not fsynced: a checkpoint that is lost only makes the next start replay more
+    path = os.path.join(slot, "checkpoint")
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump({"segment": position[0], "offset": position[1]}, file)
+    os.replace(path + ".tmp", path)
+
+
+def _read_records(slot: str) -> Iterator[Tuple[int, int, bytes]]:
+    """
+    Yields (segment, end offset, line) for every record after the checkpoint of
+    `slot`. Stops at a torn record (one cut short by a crash while it was written);
+    such a record was never acknowledged.
+    """
+    checkpoint = _read_checkpoint(slot)
+    for segment in _segments(slot):
+        if segment < checkpoint[0]:
+            continue
+        with open(_segment_path(slot, segment), "rb") as file:
+            if segment == checkpoint[0]:
+                file.seek(checkpoint[1])
+            for line in file:
+                if not line.endswith(b"\n"):
+                    return
+                try:
+                    json.loads(line)
+                except ValueError:
+                    return
+                yield segment, file.tell(), line
+
+
+def _submission(line: bytes, position: Tuple[int, int]) -> Submission:
+    record = json.loads(line)
+    return Submission(
+        record["trackingId"], datetime.fromisoformat(record["receivedAt"]),
+        schemas.BogieChecksheetCreate.model_validate(record["form"]), position,
+    )
+
+
+def _is_rejected_form(exc: Exception) -> bool:
+    """True if the database rejected the data itself; anything else (connection lost, missing table, ...) is retried."""
+    # A missing partition is a check violation too, but the retry creates it
+    return isinstance(exc, (DataError, IntegrityError)) and not partitions.is_missing_partition(exc)
+
+
+class IngestQueue:
+    """
+    The log and the in-memory queue of one worker process, plus the flusher thread.
+    start() and stop() are called by the application lifespan.
+    """
+
+    def __init__(
+        self,
+        directory: str = INGEST_LOG_DIR,
+        batch_size: int = INGEST_BATCH_SIZE,
+        flush_interval: float = INGEST_FLUSH_INTERVAL_MS / 1000,
+        segment_bytes: int = INGEST_SEGMENT_BYTES,
+    ):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.segment_bytes = segment_bytes
+        self.slot = None
+        self._lock_file = None
+        self._file = None
+        self._segment = 0
+        self._checkpoint_segment = 0
+        # Lock order: _sync_lock, then _condition (which guards the log file and the queue)
+        self._sync_lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._queue: Deque[Tuple[Submission, float]] = deque()  # (submission, monotonic time queued)
+        self._queued: Dict[str, Submission] = {}
+        self._synced = (0, 0)
+        self._thread = None
+        self._stopping = False
+        self.stats = {"batches": 0, "saved": 0, "duplicate": 0, "failed": 0, "retries": 0, "lastError": None}
+
+    # --- Lifecycle ---
+
+    def start(self):
+        """Claims a log slot, queues the records not committed yet and starts the flusher."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.slot = self._claim_slot()
+        self._stopping = False
+
+        # Continue in the last segment, after its last complete record
+        checkpoint = _read_checkpoint(self.slot)
+        segment = max(_segments(self.slot) + [checkpoint[0]])
+        end = checkpoint[1] if segment == checkpoint[0] else 0
+        for position_segment, position_end, line in _read_records(self.slot):
+            submission = _submission(line, (position_segment, position_end))
+            self._queue.append((submission, time.monotonic()))
+            self._queued[submission.tracking_id] = submission
+            if position_segment == segment:
+                end = position_end
+        self._checkpoint_segment = checkpoint[0]
+        self._open_segment(segment, truncate_to=end)
+        self._adopt_orphaned_slots()
+
+        self._thread = threading.Thread(target=self._run, name="ingest-flusher", daemon=True)
+        self._thread.start()
+        if self._queue:
+            logger.info("Replaying %d queued bogie checksheet(s) from %s", len(self._queue), self.slot)
+
+    def stop(self, timeout: float = INGEST_SHUTDOWN_TIMEOUT_SECONDS):
+        """Lets the flusher drain the queue for up to `timeout` seconds, then closes the log."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.warning("%d queued bogie checksheet(s) left for replay", len(self._queue))
+        with self._sync_lock, self._condition:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        if self._lock_file is not None:
+            self._lock_file.close()  # releases the slot
+            self._lock_file = None
+
+    def _claim_slot(self) -> str:
+        number = 0
+        while True:
+            slot = os.path.join(self.directory, f"slot-{number}")
+            os.makedirs(slot, exist_ok=True)
+            lock_file = open(os.path.join(slot, "lock"), "a+b")
+            if _try_lock(lock_file):
+                self._lock_file = lock_file
+                return slot
+            lock_file.close()
+            number += 1
+
+    def _open_segment(self, segment: int, truncate_to: Optional[int] = None):
+        """Opens `segment` for appending, cutting off a torn record past `truncate_to`."""
+        path = _segment_path(self.slot, segment)
+        is_new = not os.path.exists(path)
+        self._file = open(path, "ab")
+        if truncate_to is not None and self._file.tell() > truncate_to:
+            self._file.truncate(truncate_to)
+        os.fsync(self._file.fileno())
+        if is_new:
+            _fsync_directory(self.slot)
+        self._segment = segment
+        self._synced = (segment, self._file.tell())
+
+    def _adopt_orphaned_slots(self):
+        """Moves the uncommitted records of slots no running process holds into this slot's log."""
+        for slot in sorted(glob.glob(os.path.join(self.directory, "slot-*"))):
+            if slot == self.slot:
+                continue
+            with open(os.path.join(slot, "lock"), "a+b") as lock_file:
+                if not _try_lock(lock_file):
+                    continue
+                adopted = 0
+                for _, _, line in _read_records(slot):
+                    submission = self._append(line, lambda position, line=line: _submission(line, position))
+                    adopted += 1
+                if adopted:
+                    self._sync(submission.position)
+                    logger.info("Took over %d queued bogie checksheet(s) from %s", adopted, slot)
+                # Only once they are durable here
+                for segment in _segments(slot):
+                    os.remove(_segment_path(slot, segment))
+                if os.path.exists(os.path.join(slot, "checkpoint")):
+                    os.remove(os.path.join(slot, "checkpoint"))
+
+    # --- Accepting submissions ---
+
+    def submit(self, form: schemas.BogieChecksheetCreate) -> Submission:
+        """Appends `form` to the log and returns once it is on disk."""
+        tracking_id = uuid.uuid4().hex
+        received_at = datetime.now(timezone.utc)
+        line = json.dumps(
+            {"trackingId": tracking_id, "receivedAt": received_at.isoformat(), "form": form.model_dump(mode="json")},
+            separators=(",", ":"),
+        ).encode() + b"\n"
+        submission = self._append(line, lambda position: Submission(tracking_id, received_at, form, position))
+        self._sync(submission.position)
+        return submission
+
+    def _append(self, line: bytes, make_submission) -> Submission:
+        with self._condition:
+            segment, size = self._segment, self._file.tell()
+        if size > 0 and size + len(line) > self.segment_bytes:
+            self._rotate(segment)
+        with self._condition:
+            self._file.write(line)
+            self._file.flush()
+            submission = make_submission((self._segment, self._file.tell()))
+            self._queue.append((submission, time.monotonic()))
+            self._queued[submission.tracking_id] = submission
+            return submission
+
+    def _rotate(self, segment: int):
+        """Continues the log in a new segment file, unless another thread already did."""
+        with self._sync_lock, self._condition:
+            if self._segment != segment:
+                return
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._open_segment(self._segment + 1)
+
+    def _sync(self, position: Tuple[int, int]):
+        """
+        Makes the log durable up to `position`. One fsync covers every record
+        written before it, so concurrent submissions share fsyncs.
+        """
+        with self._sync_lock:
+            if self._synced >= position:
+                return
+            with self._condition:
+                target = (self._segment, self._file.tell())
+                fd = self._file.fileno()
+            os.fsync(fd)
+            with self._condition:
+                self._synced = target
+                self._condition.notify_all()
+
+    # --- Status ---
+
+    def queued(self, tracking_id: str) -> Optional[Submission]:
+        """The submission if it is still waiting in this process's queue."""
+        return self._queued.get(tracking_id)
+
+    def snapshot(self) -> dict:
+        with self._condition:
+            oldest = self._queue[0][1] if self._queue else None
+            return {
+                "slot": self.slot,
+                "queued": len(self._queue),
+                "oldestQueuedSeconds": round(time.monotonic() - oldest, 3) if oldest is not None else 0.0,
+                **self.stats,
+            }
+
+    # --- Flusher ---
+
+    def _ready_batch(self) -> List[Submission]:
+        """The oldest queued submissions that are durable, up to batch_size."""
+        batch = []
+        for submission, _ in self._queue:
+            if len(batch) == self.batch_size or submission.position > self._synced:
+                break
+            batch.append(submission)
+        return batch
+
+    def _next_batch(self) -> List[Submission]:
+        """Waits until a batch is full, or its oldest submission waited flush_interval; empty when stopping."""
+        with self._condition:
+            while True:
+                batch = self._ready_batch()
+                if not batch:
+                    if self._stopping:
+                        return []
+                    self._condition.wait()
+                    continue
+                if len(batch) == self.batch_size or self._stopping:
+                    return batch
+                remaining = self._queue[0][1] + self.flush_interval - time.monotonic()
+                if remaining <= 0:
+                    return batch
+                self._condition.wait(remaining)
+
+    def _run(self):
+        delay = 0.0
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            if self._save(batch):
+                delay = 0.0
+                continue
+            # The database is unavailable: keep the batch and try again later
+            self.stats["retries"] += 1
+            delay = min(_MAX_RETRY_DELAY, max(0.5, delay * 2))
+            with self._condition:
+                if self._stopping:
+                    return
+                self._condition.wait(delay)
+
+    def _save(self, batch: List[Submission]) -> bool:
+        """
+        Saves `batch` in one transaction. If the database rejects it, the
+        submissions are saved one by one so only the offending ones fail.
+        Returns False, leaving the rest queued, if the database cannot be reached.
+        """
+        from .database import SessionLocal
+
+        try:
+            with SessionLocal() as db:
+                outcomes = crud.ingest_bogie_checksheet_submissions(
+                    db, [(item.tracking_id, item.received_at, item.form) for item in batch]
+                )
+        except Exception as exc:
+            if not _is_rejected_form(exc):
+                self._error(exc)
+                return False
+            if len(batch) > 1:
+                return all(self._save([item]) for item in batch)
+            return self._fail(batch[0], exc)
+
+        self.stats["batches"] += 1
+        for status in outcomes.values():
+            self.stats["saved" if status == "Saved" else "duplicate"] += 1
+        self._complete(batch)
+        return True
+
+    def _fail(self, submission: Submission, exc: Exception) -> bool:
+        from .database import SessionLocal
+
+        detail = str(getattr(exc, "orig", None) or exc).strip().splitlines()[0]
+        try:
+            with SessionLocal() as db:
+                crud.record_failed_bogie_checksheet_submission(
+                    db, submission.tracking_id, submission.received_at, submission.form.formNumber, detail
+                )
+        except Exception as record_exc:
+            self._error(record_exc)
+            return False
+        self.stats["failed"] += 1
+        self._complete([submission])
+        return True
+
+    def _error(self, exc: Exception):
+        self.stats["lastError"] = f"{type(exc).__name__}: {str(exc).strip().splitlines()[0] if str(exc).strip() else ''}"
+        logger.warning("Saving queued bogie checksheets failed, will retry: %s", self.stats["lastError"])
+
+    def _complete(self, batch: List[Submission]):
+        """Removes committed submissions (the head of the queue) and moves the checkpoint past them."""
+        with self._condition:
+            for submission in batch:
+                self._queue.popleft()
+                self._queued.pop(submission.tracking_id, None)
+        checkpoint = batch[-1].position
+        _write_checkpoint(self.slot, checkpoint)
+        if checkpoint[0] != self._checkpoint_segment:
+            # Earlier segments are fully committed
+            for segment in _segments(self.slot):
+                if segment < checkpoint[0]:
+                    os.remove(_segment_path(self.slot, segment))
+            self._checkpoint_segment = checkpoint[0]
+
+
+ingest_queue = IngestQueue()
+
+
+def prune(db, before: date) -> int:
+    """Deletes the submission outcomes processed before `before`; their tracking ids then report 404. Returns the count."""
+    from sqlalchemy import delete
+
+    from . import models
+
+    deleted = db.execute(
+        delete(models.BogieChecksheetSubmission).where(models.BogieChecksheetSubmission.processed_at < before)
+    ).rowcount
+    db.commit()
+    return deleted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m kpa_api.ingest", description="Manage the bogie checksheet ingestion queue.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay_parser = commands.add_parser("replay", help="Save the queued forms of every log slot no running worker holds, then exit.")
+    replay_parser.add_argument("--dir", default=INGEST_LOG_DIR)
+    prune_parser = commands.add_parser("prune", help="Delete submission outcomes processed before a date.")
+    prune_parser.add_argument("--before", type=date.fromisoformat, required=True, help="YYYY-MM-DD")
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        queue = IngestQueue(args.dir)
+        queue.start()
+        pending = queue.snapshot()["queued"]
+        queue.stop(timeout=None)
+        print(f"Replayed {pending} queued bogie checksheet(s): {queue.stats}")
+    else:
+        from .database import SessionLocal
+
+        with SessionLocal() as db:
+            print(f"Deleted {prune(db, args.before)} submission outcome(s).")
@@ -0,0 +1,349 @@
+import asyncio
+import contextvars
+import functools
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+# Per-request timing of the hot path. InstrumentationMiddleware opens a
+# RequestTimings for every HTTP request; SQLAlchemy cursor events add each
+# statement's time to it, InstrumentedRoute marks when the endpoint function
+# starts and returns, and timed("serialization") wraps explicit body building.
+# The breakdown is sent as a Server-Timing header and aggregated per route into
+# Prometheus histograms (render_metrics, served on /metrics).
+
+# Adds the Server-Timing header to responses; set to 0 to keep timings internal.
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1").lower() in ("1", "true", "yes", "on")
+
+# Sampling profiler for slow requests (off by default): PROFILE_SAMPLE_RATE of all
+# requests are sampled every PROFILE_INTERVAL_MS; the profile of a sampled request
+# that takes at least PROFILE_SLOW_REQUEST_MS is written to PROFILE_DIR.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SLOW_REQUEST_MS = float(os.getenv("PROFILE_SLOW_REQUEST_MS", "500"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+
+class RequestTimings:
+    """Time spent by one request, in seconds, split by phase."""
+
+    __slots__ = ("started", "queries", "sql", "serialization", "endpoint_started", "endpoint_finished")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql = 0.0
+        self.serialization = 0.0
+        self.endpoint_started: Optional[float] = None
+        self.endpoint_finished: Optional[float] = None
+
+    def breakdown(self, now: float) -> Dict[str, float]:
+        """
+        Phases up to `now`: validation (request parsing and dependencies, before the
+        endpoint runs), db (SQL statements), app (the rest of the endpoint),
+        serialization (explicit body building plus everything after the endpoint
+        returned) and total.
+        """
+        total = now - self.started
+        if self.endpoint_started is None:
+            return {"db": self.sql, "serialization": self.serialization, "total": total}
+        endpoint_finished = self.endpoint_finished or now
+        return {
+            "validation": self.endpoint_started - self.started,
+            "db": self.sql,
+            "app": max(0.0, endpoint_finished - self.endpoint_started - self.sql - self.serialization),
+            "serialization": self.serialization + (now - endpoint_finished),
+            "total": total,
+        }
+
+
+_current: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar("request_timings", default=None)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    """The timings of the request being handled, or None outside a request."""
+    return _current.get()
+
+
+class timed:
+    """Adds the duration of the wrapped block to a phase of the current request: `with timed("serialization"): ...`"""
+
+    __slots__ = ("phase", "_started")
+
+    def __init__(self, phase: str):
+        self.phase = phase
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        timings = _current.get()
+        if timings is not None:
+            setattr(timings, self.phase, getattr(timings, self.phase) + time.perf_counter() - self._started)
+
+
+# --- SQL timing ---
+
+def instrument_sql(engine):
+    """
+    Adds the count and duration of every statement executed on `engine` to the
+    current request. `engine` may also be the Engine class, to cover all engines.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_execute(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(connection, cursor, statement, parameters, context, executemany):
+        started = connection.info["query_started"].pop()
+        timings = _current.get()
+        if timings is not None:
+            timings.queries += 1
+            timings.sql += time.perf_counter() - started
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(exception_context):
+        # A failed statement never reaches after_cursor_execute
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_started"):
+            connection.info["query_started"].pop()
+
+
+# --- Endpoint boundaries ---
+
+def _marked_endpoint(endpoint):
+    """Wraps an endpoint so the current request records when it starts and returns."""
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            timings = _current.get()
+            if timings is not None:
+                timings.endpoint_started = time.perf_counter()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                if timings is not None:
+                    timings.endpoint_finished = time.perf_counter()
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            timings = _current.get()
+            if timings is not None:
+                timings.endpoint_started = time.perf_counter()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                if timings is not None:
+                    timings.endpoint_finished = time.perf_counter()
+    return wrapper
+
+
+class InstrumentedRoute(APIRoute):
+    """APIRoute whose endpoint marks the validation / endpoint / serialization boundaries."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _marked_endpoint(endpoint), **kwargs)
+
+
+# --- Prometheus histograms ---
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series: Dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+            series = [(labels, list(values)) for labels, values in series]
+        for labels, values in series:
+            label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound:g}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {values[-1]}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {values[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{label_text}}} {values[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Total time to handle a request.", ("method", "route", "status"), LATENCY_BUCKETS
+)
+REQUEST_DB_DURATION = Histogram(
+    "http_request_db_duration_seconds", "Time spent in SQL statements per request.", ("method", "route"), LATENCY_BUCKETS
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements executed per request.", ("method", "route"), QUERY_COUNT_BUCKETS
+)
+REQUEST_SERIALIZATION_DURATION = Histogram(
+    "http_request_serialization_seconds", "Time spent building the response body per request.", ("method", "route"), LATENCY_BUCKETS
+)
+METRICS = [REQUEST_DURATION, REQUEST_DB_DURATION, REQUEST_DB_QUERIES, REQUEST_SERIALIZATION_DURATION]
+
+
+def render_metrics() -> str:
+    """All request histograms of this worker process, in the Prometheus text format."""
+    return "".join(histogram.render() for histogram in METRICS)
+
+
+# --- Sampling profiler ---
+
+class StackSampler:
+    """
+    Samples the Python stacks of all threads while at least one profile is open.
+    Stacks are counted in the collapsed format of flamegraph.pl / speedscope
+    ("frame;frame;frame count"). The sampler sees every thread, so a profile also
+    contains concurrent requests; it is meant for spotting where a slow request
+    spent its time, not for exact attribution.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._profiles = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> Counter:
+        profile = Counter()
+        with self._lock:
+            self._profiles.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+        return profile
+
+    def stop(self, profile: Counter):
+        with self._lock:
+            self._profiles.remove(profile)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._profiles:
+                    self._thread = None
+                    return
+                profiles = list(self._profiles)
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                collapsed = ";".join([names.get(thread_id, str(thread_id))] + stack[::-1])
+                for profile in profiles:
+                    profile[collapsed] += 1
+            time.sleep(self.interval)
+
+
+_sampler = StackSampler(PROFILE_INTERVAL_MS / 1000)
+
+
+def _write_profile(profile: Counter, method: str, path: str, duration: float) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+    file_path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%dT%H%M%S')}_{method}_{slug}_{duration * 1000:.0f}ms.folded")
+    with open(file_path, "w", encoding="utf-8") as file:
+        for stack, count in profile.most_common():
+            file.write(f"{stack} {count}\n")
+    return file_path
+
+
+# --- Middleware ---
+
+def server_timing_header(breakdown: Dict[str, float], queries: int) -> str:
+    entries = []
+    for phase, seconds in breakdown.items():
+        entry = f"{phase};dur={seconds * 1000:.2f}"
+        if phase == "db":
+            entry += f';desc="{queries} queries"'
+        entries.append(entry)
+    return ", ".join(entries)
+
+
+class InstrumentationMiddleware:
+    """
+    ASGI middleware that times every HTTP request (see RequestTimings), adds the
+    Server-Timing header and records the per-route histograms. Written as plain
+    ASGI rather than BaseHTTPMiddleware, so responses (including streams) pass
+    through untouched and the request context reaches the endpoint.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        profile = _sampler.start() if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE else None
+        response = {"status": 500, "breakdown": None}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["breakdown"] = breakdown = timings.breakdown(time.perf_counter())
+                if SERVER_TIMING:
+                    header = server_timing_header(breakdown, timings.queries)
+                    message = dict(message, headers=list(message.get("headers", [])) + [(b"server-timing", header.encode())])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            duration = time.perf_counter() - timings.started
+            _current.reset(token)
+            route = scope.get("route")
+            labels = (scope["method"], getattr(route, "path", "unmatched"))
+            REQUEST_DURATION.observe(labels + (str(response["status"]),), duration)
+            REQUEST_DB_DURATION.observe(labels, timings.sql)
+            REQUEST_DB_QUERIES.observe(labels, timings.queries)
+            # Measured when the response started, so streamed bodies do not count as serialization
+            breakdown = response["breakdown"] or timings.breakdown(timings.started + duration)
+            REQUEST_SERIALIZATION_DURATION.observe(labels, breakdown["serialization"])
+            if profile is not None:
+                _sampler.stop(profile)
+                if duration * 1000 >= PROFILE_SLOW_REQUEST_MS:
+                    _write_profile(profile, scope["method"], scope["path"], duration)
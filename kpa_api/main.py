@@ -1,26 +1,122 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Query
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Request, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, JSONResponse, Response, PlainTextResponse
+from pydantic import ValidationError
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from dotenv import load_dotenv
+import json
 import os
-from typing import Optional, List
+from contextlib import asynccontextmanager
+from typing import Optional, List, Tuple
 from datetime import date
+from decimal import Decimal
 
-from . import models, schemas, crud
-from .database import SessionLocal, engine, get_db
+from . import models, schemas, crud, async_crud
+from .database import (
+    SessionLocal, AsyncSessionLocal, ReadSessionLocal, AsyncReadSessionLocal, created_engines, get_db, get_async_db,
+    USE_ASYNC_DB, DB_PROFILE, ENGINE_PROFILE,
+)
+from .replicas import parse_lsn, replica_router
+from .pool_metrics import pool_stats
+from .admission import ADMISSION_CONTROL, AdmissionMiddleware, admission_controller
+from .instrumentation import InstrumentationMiddleware, InstrumentedRoute, instrument_sql, render_metrics, timed
+from .idempotency import idempotency_cache, request_fingerprint
+from .ingest import INGEST_MODE, ingest_queue
+from .cache import CachedResponse, etag_matches, wheel_specifications_cache
+from .measurements import MeasurementFilter
+from .rollups import ROLLUP_DIMENSIONS
+from . import changefeed, export
+from .serialization import (
+    decode_cursor, wheel_specification_item, wheel_specification_list_response, wheel_specifications_json_body,
+    bogie_checksheet_search_response, condition_counts_response,
+)
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Create database tables if they don't exist
-# This will create the tables defined in models.py if they don't already exist in the DB.
-models.Base.metadata.create_all(bind=engine)
+# The schema is not created here: tables, indexes and partitions are managed by
+# `python -m kpa_api.migrations upgrade`, run once per deploy before the workers
+# start. Importing the app does no database I/O; engines are created lazily.
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # INGEST_MODE=queued: queue the forms left in the ingestion log and start the
+    # flusher; on shutdown let it drain (see ingest.py). Only local files are read here.
+    if INGEST_MODE == "queued":
+        await run_in_threadpool(ingest_queue.start)
+    try:
+        yield
+    finally:
+        if INGEST_MODE == "queued":
+            await run_in_threadpool(ingest_queue.stop)
 
 app = FastAPI(
     title="KPA Form Data API Assignment",
     description="Backend Assignment: Implementation of Bogie Checksheet (POST) and Wheel Specifications (GET) APIs.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+# --- Admission control ---
+# ADMISSION_CONTROL=1: per-route-class concurrency limits with a bounded priority
+# queue, and 503 + Retry-After instead of queueing when the queue is full or the
+# connection pools are saturated (see admission.py). Added before the
+# instrumentation, so it runs inside it and shed requests are measured too.
+if ADMISSION_CONTROL:
+    app.add_middleware(AdmissionMiddleware)
+
+# --- Request instrumentation ---
+# Every request is timed by phase (validation, SQL, endpoint, serialization); see
+# instrumentation.py. The breakdown is returned in the Server-Timing header and
+# aggregated per route on /metrics.
+app.router.route_class = InstrumentedRoute
+app.add_middleware(InstrumentationMiddleware)
+# Listening on the Engine class covers the lazily created engines as well
+instrument_sql(Engine)
+
+# --- Read replicas ---
+# With DATABASE_REPLICA_URLS set, list/search/analytics/export reads go to a
+# replica that is healthy and not too far behind, and everything else to the
+# primary (see replicas.py). Writes return the primary's WAL position as
+# X-Consistency-Token; a read sending it back sees at least that write.
+CONSISTENCY_TOKEN_HEADER = "X-Consistency-Token"
+
+def _consistency_token(
+    token: Optional[str] = Header(None, alias=CONSISTENCY_TOKEN_HEADER, description="Token from an earlier write; the read will include that write")
+) -> Optional[int]:
+    """Parses X-Consistency-Token into the WAL position a replica must have replayed."""
+    if token is None:
+        return None
+    try:
+        return parse_lsn(token)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid {CONSISTENCY_TOKEN_HEADER}."
+        )
+
+def get_read_db(min_lsn: Optional[int] = Depends(_consistency_token)):
+    db = ReadSessionLocal(info={"min_lsn": min_lsn})
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(min_lsn: Optional[int] = Depends(_consistency_token)):
+    async with AsyncReadSessionLocal(info={"min_lsn": min_lsn}) as db:
+        yield db
+
+def _set_consistency_token(response: Response, db: Session):
+    """After a committed write: hands the client the token for reading it back (replicas only)."""
+    if replica_router.enabled:
+        response.headers[CONSISTENCY_TOKEN_HEADER] = crud.current_wal_lsn(db)
+
+async def _set_consistency_token_async(response: Response, db: AsyncSession):
+    if replica_router.enabled:
+        response.headers[CONSISTENCY_TOKEN_HEADER] = await async_crud.current_wal_lsn(db)
+
 # --- Placeholder Login API ---
 # This API is included as per the assignment's context but is not directly used
 # for authentication of the other two APIs in this simplified setup.
@@ -44,16 +140,56 @@ async def login(phone_number: str, password: str):
     )
 
 # --- API 1: POST /api/forms/bogie-checksheet ---
-@app.post(
+# Both form APIs have a sync and an async implementation; only the one matching
+# DB_MODE is registered on the route (see the bottom of each section).
+bogie_checksheet_route = app.post(
     "/api/forms/bogie-checksheet",
     response_model=schemas.BogieChecksheetResponse,
     status_code=status.HTTP_201_CREATED,
     summary="Create a New Bogie Checksheet Entry",
     description="Submits a new bogie checksheet form with various details including bogie, BMBC, and general checksheet information.",
 )
+
+def _duplicate_form_error(form_number: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Form with formNumber '{form_number}' already exists."
+    )
+
+def _bogie_checksheet_response(db_bogie_checksheet) -> schemas.BogieChecksheetResponse:
+    return schemas.BogieChecksheetResponse(
+        data=schemas.BogieChecksheetResponseData(
+            formNumber=db_bogie_checksheet.form_number,
+            inspectionBy=db_bogie_checksheet.inspection_by,
+            inspectionDate=db_bogie_checksheet.inspection_date,
+            status="Saved" # As per Swagger example
+        ),
+        # --- FIX: Explicitly pass message and success fields ---
+        message="Bogie checksheet submitted successfully.",
+        success=True
+    )
+
+def _idempotent_replay(idempotency_key: Optional[str], bogie_checksheet_data: schemas.BogieChecksheetCreate):
+    """
+    Returns the stored response for a repeated Idempotency-Key, or None after
+    reserving a new key (or when no key was sent).
+    """
+    if idempotency_key is None:
+        return None
+    cached = idempotency_cache.reserve(idempotency_key, request_fingerprint(bogie_checksheet_data))
+    if cached is None:
+        return None
+    return JSONResponse(
+        status_code=cached["status_code"],
+        content=cached["body"],
+        headers={"Idempotent-Replayed": "true"}
+    )
+
 def create_bogie_checksheet_endpoint(
     bogie_checksheet_data: schemas.BogieChecksheetCreate,
-    db: Session = Depends(get_db)
+    response: Response,
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", description="Client-generated key; retries with the same key replay the original response")
 ):
     """
     **Creates a new Bogie Checksheet record.**
@@ -91,46 +227,416 @@ def create_bogie_checksheet_endpoint(
     }
     ```
 
+    Send an `Idempotency-Key` header to make retries safe: a repeated request with
+    the same key returns the original response without touching the database.
+
+    With read replicas configured, the response carries an `X-Consistency-Token`;
+    send it with the next reads to be sure they include this form.
+
     **Responses:**
     - `201 Created`: Successfully created the bogie checksheet.
     - `400 Bad Request`: If the input data is invalid (e.g., duplicate formNumber).
+    - `409 Conflict`: A request with the same `Idempotency-Key` is still in progress.
+    - `422 Unprocessable Entity`: The `Idempotency-Key` was used with a different payload.
+    """
+    replay = _idempotent_replay(idempotency_key, bogie_checksheet_data)
+    if replay is not None:
+        return replay
+
+    with idempotency_cache.guard(idempotency_key):
+        # Duplicate check and insert are a single INSERT ... ON CONFLICT DO NOTHING
+        db_bogie_checksheet = crud.create_bogie_checksheet(db=db, bogie_checksheet=bogie_checksheet_data)
+        if db_bogie_checksheet is None:
+            raise _duplicate_form_error(bogie_checksheet_data.formNumber)
+        _set_consistency_token(response, db)
+
+        return idempotency_cache.complete(
+            idempotency_key, status.HTTP_201_CREATED, _bogie_checksheet_response(db_bogie_checksheet)
+        )
+
+async def create_bogie_checksheet_endpoint_async(
+    bogie_checksheet_data: schemas.BogieChecksheetCreate,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", description="Client-generated key; retries with the same key replay the original response")
+):
+    """
+    **Creates a new Bogie Checksheet record** (DB_MODE=async variant of
+    create_bogie_checksheet_endpoint; same request and responses).
+    """
+    replay = _idempotent_replay(idempotency_key, bogie_checksheet_data)
+    if replay is not None:
+        return replay
+
+    with idempotency_cache.guard(idempotency_key):
+        db_bogie_checksheet = await async_crud.create_bogie_checksheet(db=db, bogie_checksheet=bogie_checksheet_data)
+        if db_bogie_checksheet is None:
+            raise _duplicate_form_error(bogie_checksheet_data.formNumber)
+        await _set_consistency_token_async(response, db)
+
+        return idempotency_cache.complete(
+            idempotency_key, status.HTTP_201_CREATED, _bogie_checksheet_response(db_bogie_checksheet)
+        )
+
+def _submission_response(
+    tracking_id: str, form_number: str, submission_status: str, received_at, processed_at=None, detail=None,
+    message: str = "Bogie checksheet submission status.",
+) -> schemas.BogieChecksheetSubmissionResponse:
+    return schemas.BogieChecksheetSubmissionResponse(
+        data=schemas.BogieChecksheetSubmissionData(
+            trackingId=tracking_id,
+            formNumber=form_number,
+            status=submission_status,
+            detail=detail,
+            receivedAt=received_at,
+            processedAt=processed_at,
+        ),
+        message=message,
+        success=True
+    )
+
+def enqueue_bogie_checksheet_endpoint(
+    bogie_checksheet_data: schemas.BogieChecksheetCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", description="Client-generated key; retries with the same key replay the original response")
+):
+    """
+    **Queues a new Bogie Checksheet for saving** (INGEST_MODE=queued variant of
+    create_bogie_checksheet_endpoint; same request body).
+
+    The form is validated and appended to the ingestion log, and the response is
+    sent as soon as it is on disk. It is saved to the database shortly after,
+    together with other queued forms. Poll
+    `GET /api/forms/bogie-checksheet/submissions/{trackingId}` for the outcome:
+    `Saved`, `Duplicate` (the formNumber already exists) or `Failed`.
+
+    **Responses:**
+    - `202 Accepted`: The form is queued; `data.trackingId` identifies the submission.
+    - `409 Conflict`: A request with the same `Idempotency-Key` is still in progress.
+    - `422 Unprocessable Entity`: The payload is invalid, or the `Idempotency-Key` was used with a different payload.
+    """
+    replay = _idempotent_replay(idempotency_key, bogie_checksheet_data)
+    if replay is not None:
+        return replay
+
+    with idempotency_cache.guard(idempotency_key):
+        submission = ingest_queue.submit(bogie_checksheet_data)
+        return idempotency_cache.complete(
+            idempotency_key, status.HTTP_202_ACCEPTED,
+            _submission_response(
+                submission.tracking_id, bogie_checksheet_data.formNumber, "Queued", submission.received_at,
+                message="Bogie checksheet queued for saving.",
+            ),
+        )
+
+if INGEST_MODE == "queued":
+    app.post(
+        "/api/forms/bogie-checksheet",
+        response_model=schemas.BogieChecksheetSubmissionResponse,
+        status_code=status.HTTP_202_ACCEPTED,
+        summary="Queue a New Bogie Checksheet Entry",
+        description="Accepts a bogie checksheet form for asynchronous saving and returns a tracking id.",
+    )(enqueue_bogie_checksheet_endpoint)
+else:
+    bogie_checksheet_route(create_bogie_checksheet_endpoint_async if USE_ASYNC_DB else create_bogie_checksheet_endpoint)
+
+# --- Queued submission status: GET /api/forms/bogie-checksheet/submissions/{trackingId} ---
+# Registered in both ingest modes, so outcomes stay readable after switching back to direct.
+submission_status_route = app.get(
+    "/api/forms/bogie-checksheet/submissions/{trackingId}",
+    response_model=schemas.BogieChecksheetSubmissionResponse,
+    summary="Get the Outcome of a Queued Bogie Checksheet",
+    description="Reports whether a bogie checksheet accepted with 202 is still queued, saved, a duplicate or failed.",
+)
+
+def _unknown_submission_error(tracking_id: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"No submission with trackingId '{tracking_id}'."
+    )
+
+def _recorded_submission_response(record: models.BogieChecksheetSubmission) -> schemas.BogieChecksheetSubmissionResponse:
+    return _submission_response(
+        record.tracking_id, record.form_number, record.status, record.received_at, record.processed_at, record.detail,
+    )
+
+def get_submission_status_endpoint(trackingId: str, response: Response, db: Session = Depends(get_db)):
+    """
+    **Reports the outcome of a queued Bogie Checksheet submission.**
+
+    - `Queued`: Waiting to be saved.
+    - `Saved`: The form was saved.
+    - `Duplicate`: Not saved; the formNumber already exists.
+    - `Failed`: Not saved; the database rejected the form (`detail` says why).
+
+    With several worker processes, a submission still queued by another worker
+    is reported as `404 Not Found` until its batch is saved (normally within
+    `INGEST_FLUSH_INTERVAL_MS`).
+
+    Once the submission is processed the response carries an `X-Consistency-Token`
+    (with read replicas configured), as the direct POST does.
+
+    **Responses:**
+    - `200 OK`: See `data.status`.
+    - `404 Not Found`: Unknown trackingId.
+    """
+    # Checked before the database: a submission leaves the queue only once it is committed
+    queued = ingest_queue.queued(trackingId)
+    if queued is not None:
+        return _submission_response(queued.tracking_id, queued.form.formNumber, "Queued", queued.received_at)
+    record = db.get(models.BogieChecksheetSubmission, trackingId)
+    if record is None:
+        raise _unknown_submission_error(trackingId)
+    _set_consistency_token(response, db)
+    return _recorded_submission_response(record)
+
+async def get_submission_status_endpoint_async(trackingId: str, response: Response, db: AsyncSession = Depends(get_async_db)):
+    """
+    **Reports the outcome of a queued Bogie Checksheet submission** (DB_MODE=async
+    variant of get_submission_status_endpoint; same responses).
     """
-    # Check for duplicate formNumber before creating
-    existing_form = db.query(models.BogieChecksheet).filter(
-        models.BogieChecksheet.form_number == bogie_checksheet_data.formNumber
-    ).first()
-    if existing_form:
+    queued = ingest_queue.queued(trackingId)
+    if queued is not None:
+        return _submission_response(queued.tracking_id, queued.form.formNumber, "Queued", queued.received_at)
+    record = await db.get(models.BogieChecksheetSubmission, trackingId)
+    if record is None:
+        raise _unknown_submission_error(trackingId)
+    await _set_consistency_token_async(response, db)
+    return _recorded_submission_response(record)
+
+submission_status_route(get_submission_status_endpoint_async if USE_ASYNC_DB else get_submission_status_endpoint)
+
+# --- Bulk ingestion: POST /api/forms/bogie-checksheet/bulk ---
+# Number of forms written per multi-row INSERT statement (and per transaction).
+BULK_INSERT_CHUNK_SIZE = int(os.getenv("BULK_INSERT_CHUNK_SIZE", "1000"))
+
+async def _iter_bulk_payloads(request: Request):
+    """
+    Yields the raw form payloads of a bulk submission.
+    NDJSON bodies are consumed line by line as they stream in, so they never have
+    to be held in memory as a whole; anything else is parsed as a JSON array.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+        if buffer.strip():
+            yield buffer
+        return
+
+    try:
+        payloads = json.loads(await request.body())
+    except ValueError:
+        payloads = None
+    if not isinstance(payloads, list):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Form with formNumber '{bogie_checksheet_data.formNumber}' already exists."
+            detail="Request body must be a JSON array or an NDJSON stream of bogie checksheet forms."
         )
+    for payload in payloads:
+        yield payload
 
-    db_bogie_checksheet = crud.create_bogie_checksheet(db=db, bogie_checksheet=bogie_checksheet_data)
+@app.post(
+    "/api/forms/bogie-checksheet/bulk",
+    response_model=schemas.BogieChecksheetBulkResponse,
+    summary="Bulk Create Bogie Checksheet Entries",
+    description="Submits many bogie checksheet forms at once, as a JSON array or an NDJSON stream.",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {"type": "array", "items": {"$ref": "#/components/schemas/BogieChecksheetCreate"}}},
+                "application/x-ndjson": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def bulk_create_bogie_checksheets_endpoint(
+    request: Request,
+    response: Response,
+    db = Depends(get_async_db if USE_ASYNC_DB else get_db)
+):
+    """
+    **Creates many Bogie Checksheet records in one request.**
 
-    return schemas.BogieChecksheetResponse(
-        data=schemas.BogieChecksheetResponseData(
-            formNumber=db_bogie_checksheet.form_number,
-            inspectionBy=db_bogie_checksheet.inspection_by,
-            inspectionDate=db_bogie_checksheet.inspection_date,
-            status="Saved" # As per Swagger example
+    The body is either a JSON array of `BogieChecksheetCreate` payloads or, with
+    `Content-Type: application/x-ndjson`, one payload per line. Valid forms are
+    written in chunks of `BULK_INSERT_CHUNK_SIZE` rows, each chunk being a single
+    `INSERT ... ON CONFLICT (form_number) DO NOTHING` statement and transaction.
+
+    Every submitted item gets a result in the same order it was sent:
+    - `Saved`: The form was inserted.
+    - `Duplicate`: The formNumber already exists (or was repeated earlier in the batch).
+    - `Invalid`: The payload failed validation; `detail` explains why.
+
+    **Responses:**
+    - `200 OK`: The batch was processed; see the per-item results.
+    - `400 Bad Request`: The body is neither a JSON array nor NDJSON.
+    """
+    results: List[schemas.BogieChecksheetBulkItemResult] = []
+    pending: List[tuple] = []
+    seen_form_numbers = set()
+
+    async def flush_pending():
+        items = [item for _, item in pending]
+        if USE_ASYNC_DB:
+            inserted = await async_crud.bulk_create_bogie_checksheets(db, items)
+        else:
+            inserted = await run_in_threadpool(crud.bulk_create_bogie_checksheets, db, items)
+        for result, item in pending:
+            if item.formNumber in inserted:
+                result.status = "Saved"
+            else:
+                result.status = "Duplicate"
+                result.detail = f"Form with formNumber '{item.formNumber}' already exists."
+        pending.clear()
+
+    index = 0
+    async for payload in _iter_bulk_payloads(request):
+        result = schemas.BogieChecksheetBulkItemResult(index=index, status="Invalid")
+        results.append(result)
+        index += 1
+        try:
+            if isinstance(payload, bytes):
+                item = schemas.BogieChecksheetCreate.model_validate_json(payload)
+            else:
+                item = schemas.BogieChecksheetCreate.model_validate(payload)
+        except ValidationError as exc:
+            result.detail = "; ".join(
+                f"{'.'.join(str(loc) for loc in error['loc']) or 'body'}: {error['msg']}"
+                for error in exc.errors()
+            )
+            continue
+
+        result.formNumber = item.formNumber
+        if item.formNumber in seen_form_numbers:
+            result.status = "Duplicate"
+            result.detail = f"formNumber '{item.formNumber}' is repeated earlier in this batch."
+            continue
+        seen_form_numbers.add(item.formNumber)
+
+        pending.append((result, item))
+        if len(pending) >= BULK_INSERT_CHUNK_SIZE:
+            await flush_pending()
+
+    if pending:
+        await flush_pending()
+
+    counts = {"Saved": 0, "Duplicate": 0, "Invalid": 0}
+    for result in results:
+        counts[result.status] += 1
+
+    if counts["Saved"]:
+        if USE_ASYNC_DB:
+            await _set_consistency_token_async(response, db)
+        else:
+            await run_in_threadpool(_set_consistency_token, response, db)
+
+    return schemas.BogieChecksheetBulkResponse(
+        data=schemas.BogieChecksheetBulkResponseData(
+            total=len(results),
+            saved=counts["Saved"],
+            duplicate=counts["Duplicate"],
+            invalid=counts["Invalid"],
+            results=results,
         ),
-        # --- FIX: Explicitly pass message and success fields ---
-        message="Bogie checksheet submitted successfully.",
+        message="Bulk bogie checksheet submission processed.",
         success=True
     )
 
 # --- API 2: GET /api/forms/wheel-specifications ---
-@app.get(
+# Rows fetched per round-trip from the server-side cursor in NDJSON streaming mode.
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "1000"))
+
+# "orm" (default) builds list responses from ORM objects and Pydantic models;
+# "database" has Postgres render the JSON items, skipping per-row Python work.
+RESPONSE_SERIALIZATION = os.getenv("RESPONSE_SERIALIZATION", "orm").lower()
+
+if RESPONSE_SERIALIZATION not in ("orm", "database"):
+    raise ValueError(f"RESPONSE_SERIALIZATION must be 'orm' or 'database', got '{RESPONSE_SERIALIZATION}'")
+
+def _decode_cursor(cursor: str) -> Tuple[date, int]:
+    """Decodes a pagination cursor, rejecting anything malformed with a 400."""
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor."
+        )
+
+def _stream_wheel_specifications_ndjson(min_lsn: Optional[int], **filters):
+    """
+    Yields one JSON line per matching wheel specification.
+    Uses its own (read) session, since the response body is produced after the
+    request-scoped session from get_read_db may already be closed.
+    """
+    db = ReadSessionLocal(info={"min_lsn": min_lsn})
+    try:
+        for spec in crud.iter_wheel_specifications(db, batch_size=STREAM_BATCH_SIZE, **filters):
+            yield wheel_specification_item(spec).model_dump_json() + "\n"
+    finally:
+        db.close()
+
+async def _stream_wheel_specifications_ndjson_async(min_lsn: Optional[int], **filters):
+    """Async variant of _stream_wheel_specifications_ndjson."""
+    async with AsyncReadSessionLocal(info={"min_lsn": min_lsn}) as db:
+        async for spec in async_crud.iter_wheel_specifications(db, batch_size=STREAM_BATCH_SIZE, **filters):
+            yield wheel_specification_item(spec).model_dump_json() + "\n"
+
+def _wants_ndjson(request: Request) -> bool:
+    return "application/x-ndjson" in request.headers.get("accept", "")
+
+def _measurement_filter(measurement, measurementMin, measurementMax, outOfTolerance) -> Optional[MeasurementFilter]:
+    """Validates the numeric measurement parameters of the wheel specification list."""
+    if measurement and measurement not in schemas.WheelSpecificationFields.model_fields:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown measurement '{measurement}'."
+        )
+    if (measurementMin is not None or measurementMax is not None) and not measurement:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'measurementMin' and 'measurementMax' require 'measurement'."
+        )
+    if not (measurement or outOfTolerance):
+        return None
+    return MeasurementFilter(measurement, measurementMin, measurementMax, outOfTolerance)
+
+def _etag_response(request: Request, cached: CachedResponse) -> Response:
+    """
+    Serves a cached response body with its strong ETag, or an empty 304 when the
+    client already holds that exact representation (If-None-Match).
+    """
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), cached.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+wheel_specifications_route = app.get(
     "/api/forms/wheel-specifications",
     response_model=schemas.WheelSpecificationListResponse,
     summary="Retrieve Wheel Specifications (with filters)",
     description="Fetches a list of wheel specification forms, with optional filtering by form number, submitter, or submission date.",
 )
+
 def get_wheel_specifications_endpoint(
+    request: Request,
     formNumber: Optional[str] = Query(None, description="Filter by unique form number"),
     submittedBy: Optional[str] = Query(None, description="Filter by the ID of the user who submitted the form"),
     submittedDate: Optional[date] = Query(None, description="Filter by the submission date (YYYY-MM-DD)"),
-    db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of forms per page"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor taken from the `next` field of the previous page"),
+    measurement: Optional[str] = Query(None, description="Measurement field for numeric filters, e.g. condemningDia"),
+    measurementMin: Optional[Decimal] = Query(None, description="Minimum nominal value of `measurement`"),
+    measurementMax: Optional[Decimal] = Query(None, description="Maximum nominal value of `measurement`"),
+    outOfTolerance: bool = Query(False, description="Only forms where `measurement` (or any measurement) lies outside its own tolerance limits"),
+    min_lsn: Optional[int] = Depends(_consistency_token),
+    db: Session = Depends(get_read_db)
 ):
     """
     **Retrieves a list of Wheel Specification records.**
@@ -141,6 +647,20 @@ def get_wheel_specifications_endpoint(
     - `submittedBy`: The ID of the user who submitted the form.
     - `submittedDate`: The date on which the form was submitted (format: YYYY-MM-DD).
 
+    Numeric filters run in SQL against the measurements parsed from `fields` when
+    the form was saved:
+    - `measurement` with `measurementMin` / `measurementMax`: the field's nominal
+      value lies in the range, e.g. `measurement=condemningDia&measurementMax=830`.
+    - `outOfTolerance=true`: the nominal value lies outside its own limits, for
+      `measurement` or for any field if none is given.
+
+    Results are ordered by `submittedDate` and paginated by keyset: pass the `next`
+    value of a page as `cursor` to fetch the following page. `next` is `null` on the
+    last page.
+
+    Send `Accept: application/x-ndjson` to stream every matching form (starting after
+    `cursor`, if given) as newline-delimited JSON instead; `limit` is ignored in that mode.
+
     **Example Response:**
     ```json
     {
@@ -169,41 +689,505 @@ def get_wheel_specifications_endpoint(
         }
       ],
       "message": "Filtered wheel specification forms fetched successfully.",
-      "success": true
+      "success": true,
+      "next": null
     }
     ```
 
+    Responses carry a strong `ETag`; repeat the request with `If-None-Match` to get
+    `304 Not Modified` when nothing changed. Responses are cached per filter set for
+    `RESPONSE_CACHE_TTL_SECONDS` and invalidated whenever a wheel specification is inserted.
+    Reads with `X-Consistency-Token` bypass the cache, and pages read from a replica are
+    not stored (the replica may lag behind the insert that invalidated the cache).
+
+    With read replicas configured the forms are read from a replica; send the
+    `X-Consistency-Token` of an earlier write to read from one that includes it.
+
     **Responses:**
     - `200 OK`: Returns a list of matching wheel specification forms.
+    - `304 Not Modified`: The `If-None-Match` ETag still matches.
+    - `400 Bad Request`: If `cursor` is malformed or the measurement filters are invalid.
     """
-    wheel_specs = crud.get_wheel_specifications(
-        db=db,
+    after = _decode_cursor(cursor) if cursor else None
+    filters = dict(
         form_number=formNumber,
         submitted_by=submittedBy,
-        submitted_date=submittedDate
+        submitted_date=submittedDate,
+        after=after,
+        measurement=_measurement_filter(measurement, measurementMin, measurementMax, outOfTolerance),
     )
 
-    # Convert SQLAlchemy models to Pydantic response models
-    response_data = [
-        schemas.WheelSpecificationResponseDataItem(
-            formNumber=spec.form_number,
-            submittedBy=spec.submitted_by,
-            submittedDate=spec.submitted_date,
-            fields=schemas.WheelSpecificationFields(**spec.fields) if spec.fields else schemas.WheelSpecificationFields()
-        ) for spec in wheel_specs
-    ]
+    if _wants_ndjson(request):
+        return StreamingResponse(
+            _stream_wheel_specifications_ndjson(min_lsn, **filters),
+            media_type="application/x-ndjson"
+        )
 
-    # If no data is found, return an empty list in data and a message
-    message = "Filtered wheel specification forms fetched successfully."
-    if not response_data:
-        message = "No wheel specification forms found matching the criteria."
+    # A read with a consistency token must include that write, which a cached page may predate
+    cache_key = wheel_specifications_cache.key(dict(filters, limit=limit)) if min_lsn is None else None
+    cached = wheel_specifications_cache.get(cache_key)
+    if cached is not None:
+        return _etag_response(request, cached)
 
-    return schemas.WheelSpecificationListResponse(
-        data=response_data,
-        message=message,
-        success=True
+    if RESPONSE_SERIALIZATION == "database":
+        page = crud.get_wheel_specifications_json(db=db, limit=limit, **filters)
+        with timed("serialization"):
+            body = wheel_specifications_json_body(page, limit)
+    else:
+        # Fetch one extra row to find out whether another page follows
+        wheel_specs = crud.get_wheel_specifications(db=db, limit=limit + 1, **filters)
+        with timed("serialization"):
+            body = wheel_specification_list_response(wheel_specs, limit).model_dump_json().encode()
+    if db.info.get("replica") is not None:
+        # A replica may not have replayed the insert that last invalidated the cache:
+        # its page is served to this request only, never stored under the new generation
+        cache_key = None
+    return _etag_response(request, wheel_specifications_cache.set(cache_key, body))
+
+async def get_wheel_specifications_endpoint_async(
+    request: Request,
+    formNumber: Optional[str] = Query(None, description="Filter by unique form number"),
+    submittedBy: Optional[str] = Query(None, description="Filter by the ID of the user who submitted the form"),
+    submittedDate: Optional[date] = Query(None, description="Filter by the submission date (YYYY-MM-DD)"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of forms per page"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor taken from the `next` field of the previous page"),
+    measurement: Optional[str] = Query(None, description="Measurement field for numeric filters, e.g. condemningDia"),
+    measurementMin: Optional[Decimal] = Query(None, description="Minimum nominal value of `measurement`"),
+    measurementMax: Optional[Decimal] = Query(None, description="Maximum nominal value of `measurement`"),
+    outOfTolerance: bool = Query(False, description="Only forms where `measurement` (or any measurement) lies outside its own tolerance limits"),
+    min_lsn: Optional[int] = Depends(_consistency_token),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    **Retrieves a list of Wheel Specification records** (DB_MODE=async variant of
+    get_wheel_specifications_endpoint; same parameters and responses).
+    """
+    after = _decode_cursor(cursor) if cursor else None
+    filters = dict(
+        form_number=formNumber,
+        submitted_by=submittedBy,
+        submitted_date=submittedDate,
+        after=after,
+        measurement=_measurement_filter(measurement, measurementMin, measurementMax, outOfTolerance),
     )
 
+    if _wants_ndjson(request):
+        return StreamingResponse(
+            _stream_wheel_specifications_ndjson_async(min_lsn, **filters),
+            media_type="application/x-ndjson"
+        )
+
+    cache_key = await wheel_specifications_cache.key_async(dict(filters, limit=limit)) if min_lsn is None else None
+    cached = await wheel_specifications_cache.get_async(cache_key)
+    if cached is not None:
+        return _etag_response(request, cached)
+
+    if RESPONSE_SERIALIZATION == "database":
+        page = await async_crud.get_wheel_specifications_json(db=db, limit=limit, **filters)
+        with timed("serialization"):
+            body = wheel_specifications_json_body(page, limit)
+    else:
+        wheel_specs = await async_crud.get_wheel_specifications(db=db, limit=limit + 1, **filters)
+        with timed("serialization"):
+            body = wheel_specification_list_response(wheel_specs, limit).model_dump_json().encode()
+    if db.info.get("replica") is not None:
+        cache_key = None
+    return _etag_response(request, await wheel_specifications_cache.set_async(cache_key, body))
+
+wheel_specifications_route(get_wheel_specifications_endpoint_async if USE_ASYNC_DB else get_wheel_specifications_endpoint)
+
+# --- Search: GET /api/forms/bogie-checksheet ---
+bogie_checksheet_search_route = app.get(
+    "/api/forms/bogie-checksheet",
+    response_model=schemas.BogieChecksheetSearchResponse,
+    summary="Search Bogie Checksheets",
+    description="Finds bogie checksheets by bogie number, inspector, inspection date range, or a component's recorded condition.",
+)
+
+def _bogie_checksheet_search_filters(
+    bogieNo, inspectionBy, inspectionDateFrom, inspectionDateTo, component, condition, cursor
+) -> dict:
+    """Validates the search parameters and maps them onto crud.bogie_checksheets_search_query arguments."""
+    if component and component not in crud.BOGIE_CHECKSHEET_COMPONENTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown component '{component}'. Expected one of: {', '.join(crud.BOGIE_CHECKSHEET_COMPONENTS)}."
+        )
+    if component and not condition:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'component' can only be used together with 'condition'."
+        )
+    if inspectionDateFrom and inspectionDateTo and inspectionDateFrom > inspectionDateTo:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'inspectionDateFrom' must not be after 'inspectionDateTo'."
+        )
+    return dict(
+        bogie_no=bogieNo,
+        inspection_by=inspectionBy,
+        inspection_date_from=inspectionDateFrom,
+        inspection_date_to=inspectionDateTo,
+        component=component,
+        condition=condition,
+        after=_decode_cursor(cursor) if cursor else None,
+    )
+
+def search_bogie_checksheets_endpoint(
+    bogieNo: Optional[str] = Query(None, description="Filter by bogie number (bogieDetails.bogieNo)"),
+    inspectionBy: Optional[str] = Query(None, description="Filter by the ID of the inspector"),
+    inspectionDateFrom: Optional[date] = Query(None, description="Earliest inspection date (YYYY-MM-DD, inclusive)"),
+    inspectionDateTo: Optional[date] = Query(None, description="Latest inspection date (YYYY-MM-DD, inclusive)"),
+    component: Optional[str] = Query(None, description="Component to check, e.g. bolster or cylinderBody; requires condition"),
+    condition: Optional[str] = Query(None, description="Recorded condition, e.g. Cracked or DAMAGED; any component if none is given"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of forms per page"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor taken from the `next` field of the previous page"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    **Searches Bogie Checksheet records.**
+
+    All filters are optional and combined with AND:
+    - `bogieNo`: Exact bogie number from `bogieDetails`.
+    - `inspectionBy`: The ID of the inspector.
+    - `inspectionDateFrom` / `inspectionDateTo`: Inclusive inspection date range.
+    - `condition`: A condition such as `Cracked`, `Worn` or `DAMAGED` recorded for any
+      component in `bmbcChecksheet` or `bogieChecksheet` (matched case-insensitively
+      for the usual spellings); narrow it to one component with `component`.
+
+    Results are ordered by `inspectionDate` and paginated with `next`/`cursor`, like
+    `GET /api/forms/wheel-specifications`. Lookups use the GIN and expression indexes
+    on the JSONB columns rather than scanning the table.
+
+    **Responses:**
+    - `200 OK`: Returns the matching bogie checksheets.
+    - `400 Bad Request`: Unknown component, component without condition, inverted date range or malformed cursor.
+    """
+    filters = _bogie_checksheet_search_filters(
+        bogieNo, inspectionBy, inspectionDateFrom, inspectionDateTo, component, condition, cursor
+    )
+    sheets = crud.search_bogie_checksheets(db=db, limit=limit + 1, **filters)
+    with timed("serialization"):
+        return bogie_checksheet_search_response(sheets, limit)
+
+async def search_bogie_checksheets_endpoint_async(
+    bogieNo: Optional[str] = Query(None, description="Filter by bogie number (bogieDetails.bogieNo)"),
+    inspectionBy: Optional[str] = Query(None, description="Filter by the ID of the inspector"),
+    inspectionDateFrom: Optional[date] = Query(None, description="Earliest inspection date (YYYY-MM-DD, inclusive)"),
+    inspectionDateTo: Optional[date] = Query(None, description="Latest inspection date (YYYY-MM-DD, inclusive)"),
+    component: Optional[str] = Query(None, description="Component to check, e.g. bolster or cylinderBody; requires condition"),
+    condition: Optional[str] = Query(None, description="Recorded condition, e.g. Cracked or DAMAGED; any component if none is given"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of forms per page"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor taken from the `next` field of the previous page"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    **Searches Bogie Checksheet records** (DB_MODE=async variant of
+    search_bogie_checksheets_endpoint; same parameters and responses).
+    """
+    filters = _bogie_checksheet_search_filters(
+        bogieNo, inspectionBy, inspectionDateFrom, inspectionDateTo, component, condition, cursor
+    )
+    sheets = await async_crud.search_bogie_checksheets(db=db, limit=limit + 1, **filters)
+    with timed("serialization"):
+        return bogie_checksheet_search_response(sheets, limit)
+
+bogie_checksheet_search_route(search_bogie_checksheets_endpoint_async if USE_ASYNC_DB else search_bogie_checksheets_endpoint)
+
+# --- Analytics: GET /api/analytics/bogie-checksheet-conditions ---
+condition_counts_route = app.get(
+    "/api/analytics/bogie-checksheet-conditions",
+    response_model=schemas.BogieChecksheetConditionCountResponse,
+    response_model_exclude_none=True,
+    summary="Count Bogie Checksheet Conditions",
+    description="Counts recorded component conditions per week, component, condition, division and maker year.",
+)
+
+def _condition_counts_filters(groupBy, component, condition, division, makerYear, dateFrom, dateTo) -> dict:
+    """Validates the analytics parameters and maps them onto crud.get_condition_counts arguments."""
+    unknown = [name for name in groupBy if name not in ROLLUP_DIMENSIONS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown groupBy '{unknown[0]}'. Expected any of: {', '.join(ROLLUP_DIMENSIONS)}."
+        )
+    if component and component not in crud.BOGIE_CHECKSHEET_COMPONENTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown component '{component}'. Expected one of: {', '.join(crud.BOGIE_CHECKSHEET_COMPONENTS)}."
+        )
+    if dateFrom and dateTo and dateFrom > dateTo:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'dateFrom' must not be after 'dateTo'."
+        )
+    return dict(
+        group_by=list(dict.fromkeys(groupBy)),
+        component=component,
+        condition=condition,
+        division=division,
+        maker_year=makerYear,
+        date_from=dateFrom,
+        date_to=dateTo,
+    )
+
+def get_condition_counts_endpoint(
+    groupBy: List[str] = Query(["week", "component", "condition"], description="Dimensions to group by: week, component, condition, division, makerYear"),
+    component: Optional[str] = Query(None, description="Only this component, e.g. bolster or cylinderBody"),
+    condition: Optional[str] = Query(None, description="Only this condition, e.g. Cracked (case-insensitive)"),
+    division: Optional[str] = Query(None, description="Only this incoming division, e.g. NR"),
+    makerYear: Optional[str] = Query(None, description="Only bogies built in this year, e.g. 2018"),
+    dateFrom: Optional[date] = Query(None, description="First inspection date (YYYY-MM-DD); counted from the start of its week"),
+    dateTo: Optional[date] = Query(None, description="Last inspection date (YYYY-MM-DD); counted to the end of its week"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    **Counts recorded conditions of bogie checksheet components.**
+
+    Answers questions such as "bolsters marked Cracked per division per week"
+    (`component=bolster&condition=Cracked&groupBy=division&groupBy=week`) or
+    "worn-out cylinder bodies by maker year"
+    (`component=cylinderBody&condition=WORN OUT&groupBy=makerYear`).
+
+    Counts come from the `bogie_checksheet_condition_rollups` table, which is updated
+    with every saved form, so they are read without scanning the checksheets themselves.
+    Time is bucketed by week (starting Monday); conditions are reported upper-cased.
+
+    **Responses:**
+    - `200 OK`: One entry per group, ordered by the `groupBy` dimensions.
+    - `400 Bad Request`: Unknown groupBy dimension or component, or inverted date range.
+    """
+    filters = _condition_counts_filters(groupBy, component, condition, division, makerYear, dateFrom, dateTo)
+    rows = crud.get_condition_counts(db=db, **filters)
+    with timed("serialization"):
+        return condition_counts_response(rows)
+
+async def get_condition_counts_endpoint_async(
+    groupBy: List[str] = Query(["week", "component", "condition"], description="Dimensions to group by: week, component, condition, division, makerYear"),
+    component: Optional[str] = Query(None, description="Only this component, e.g. bolster or cylinderBody"),
+    condition: Optional[str] = Query(None, description="Only this condition, e.g. Cracked (case-insensitive)"),
+    division: Optional[str] = Query(None, description="Only this incoming division, e.g. NR"),
+    makerYear: Optional[str] = Query(None, description="Only bogies built in this year, e.g. 2018"),
+    dateFrom: Optional[date] = Query(None, description="First inspection date (YYYY-MM-DD); counted from the start of its week"),
+    dateTo: Optional[date] = Query(None, description="Last inspection date (YYYY-MM-DD); counted to the end of its week"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    **Counts recorded conditions of bogie checksheet components** (DB_MODE=async
+    variant of get_condition_counts_endpoint; same parameters and responses).
+    """
+    filters = _condition_counts_filters(groupBy, component, condition, division, makerYear, dateFrom, dateTo)
+    rows = await async_crud.get_condition_counts(db=db, **filters)
+    with timed("serialization"):
+        return condition_counts_response(rows)
+
+condition_counts_route(get_condition_counts_endpoint_async if USE_ASYNC_DB else get_condition_counts_endpoint)
+
+# --- Exports: GET /api/forms/wheel-specifications/export, GET /api/forms/bogie-checksheet/export ---
+# Full dumps as CSV or Parquet with the JSONB objects flattened into columns,
+# streamed chunk by chunk from a server-side cursor (see export.py).
+EXPORT_RESPONSES = {200: {"content": {media_type.split(";")[0]: {} for media_type in export.EXPORT_FORMATS.values()}}}
+
+def _export_response(kind: str, export_format: str, min_lsn: Optional[int], **filters) -> StreamingResponse:
+    """Streams the export of `kind`; fails with 400/501 before anything is sent if the format is unusable."""
+    if export_format not in export.EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown export format '{export_format}'. Expected one of: {', '.join(export.EXPORT_FORMATS)}."
+        )
+    try:
+        encoder = export.make_encoder(kind, export_format)
+    except ImportError as exc:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(exc))
+
+    filename = f"{kind.replace('-', '_')}.{export_format}"
+    return StreamingResponse(
+        _stream_export_async(kind, encoder, min_lsn, **filters) if USE_ASYNC_DB else _stream_export(kind, encoder, min_lsn, **filters),
+        media_type=export.EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+def _stream_export(kind: str, encoder, min_lsn: Optional[int], **filters):
+    """Yields the export file; uses its own read session, like _stream_wheel_specifications_ndjson."""
+    db = ReadSessionLocal(info={"min_lsn": min_lsn})
+    try:
+        yield from export.stream_export(db, kind, encoder, **filters)
+    finally:
+        db.close()
+
+async def _stream_export_async(kind: str, encoder, min_lsn: Optional[int], **filters):
+    """Async variant of _stream_export."""
+    async with AsyncReadSessionLocal(info={"min_lsn": min_lsn}) as db:
+        async for chunk in export.stream_export_async(db, kind, encoder, **filters):
+            yield chunk
+
+@app.get(
+    "/api/forms/wheel-specifications/export",
+    response_class=StreamingResponse,
+    responses=EXPORT_RESPONSES,
+    summary="Export Wheel Specifications",
+    description="Streams every matching wheel specification as CSV or Parquet, with one column per measurement field.",
+)
+def export_wheel_specifications_endpoint(
+    exportFormat: str = Query("csv", alias="format", description="csv or parquet"),
+    formNumber: Optional[str] = Query(None, description="Filter by unique form number"),
+    submittedBy: Optional[str] = Query(None, description="Filter by the ID of the user who submitted the form"),
+    submittedDate: Optional[date] = Query(None, description="Filter by the submission date (YYYY-MM-DD)"),
+    measurement: Optional[str] = Query(None, description="Measurement field for numeric filters, e.g. condemningDia"),
+    measurementMin: Optional[Decimal] = Query(None, description="Minimum nominal value of `measurement`"),
+    measurementMax: Optional[Decimal] = Query(None, description="Maximum nominal value of `measurement`"),
+    outOfTolerance: bool = Query(False, description="Only forms where `measurement` (or any measurement) lies outside its own tolerance limits"),
+    min_lsn: Optional[int] = Depends(_consistency_token),
+):
+    """
+    **Exports Wheel Specification records.**
+
+    Takes the filters of `GET /api/forms/wheel-specifications` and returns all
+    matching forms in submittedDate order, unpaginated:
+    formNumber, submittedBy, submittedDate, createdAt and one `fields.<name>`
+    column per measurement field. `format=parquet` writes one row group per
+    `EXPORT_CHUNK_ROWS` rows and needs the pyarrow package on the server.
+
+    **Responses:**
+    - `200 OK`: The file, streamed (`Content-Disposition: attachment`).
+    - `400 Bad Request`: Unknown format or invalid filters.
+    - `501 Not Implemented`: Parquet was requested but pyarrow is not installed.
+    """
+    return _export_response(
+        "wheel-specifications", exportFormat, min_lsn,
+        form_number=formNumber,
+        submitted_by=submittedBy,
+        submitted_date=submittedDate,
+        measurement=_measurement_filter(measurement, measurementMin, measurementMax, outOfTolerance),
+    )
+
+@app.get(
+    "/api/forms/bogie-checksheet/export",
+    response_class=StreamingResponse,
+    responses=EXPORT_RESPONSES,
+    summary="Export Bogie Checksheets",
+    description="Streams every matching bogie checksheet as CSV or Parquet, with one column per checksheet field.",
+)
+def export_bogie_checksheets_endpoint(
+    exportFormat: str = Query("csv", alias="format", description="csv or parquet"),
+    bogieNo: Optional[str] = Query(None, description="Filter by bogie number (bogieDetails.bogieNo)"),
+    inspectionBy: Optional[str] = Query(None, description="Filter by the ID of the inspector"),
+    inspectionDateFrom: Optional[date] = Query(None, description="Earliest inspection date (YYYY-MM-DD, inclusive)"),
+    inspectionDateTo: Optional[date] = Query(None, description="Latest inspection date (YYYY-MM-DD, inclusive)"),
+    component: Optional[str] = Query(None, description="Component to check, e.g. bolster or cylinderBody; requires condition"),
+    condition: Optional[str] = Query(None, description="Recorded condition, e.g. Cracked or DAMAGED; any component if none is given"),
+    min_lsn: Optional[int] = Depends(_consistency_token),
+):
+    """
+    **Exports Bogie Checksheet records.**
+
+    Takes the filters of `GET /api/forms/bogie-checksheet` and returns all
+    matching forms in inspection date order, unpaginated: formNumber,
+    inspectionBy, inspectionDate, createdAt and one column per field of
+    bmbcChecksheet, bogieChecksheet and bogieDetails (e.g. `bogieDetails.bogieNo`).
+
+    **Responses:**
+    - `200 OK`: The file, streamed (`Content-Disposition: attachment`).
+    - `400 Bad Request`: Unknown format or invalid filters.
+    - `501 Not Implemented`: Parquet was requested but pyarrow is not installed.
+    """
+    filters = _bogie_checksheet_search_filters(
+        bogieNo, inspectionBy, inspectionDateFrom, inspectionDateTo, component, condition, None
+    )
+    return _export_response("bogie-checksheets", exportFormat, min_lsn, **filters)
+
+# --- Change feed ---
+# New forms pushed as Server-Sent Events instead of polled for: one LISTEN
+# connection per worker serves every subscriber (see changefeed.py).
+CHANGE_FEED_RESPONSES = {200: {"content": {"text/event-stream": {}}}}
+
+def _last_event_id(
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID", description="Sent by EventSource when it reconnects"),
+    lastEventId: Optional[str] = Query(None, description="Resume after this event id (for the first connection)"),
+) -> Optional[changefeed.Cursor]:
+    value = last_event_id or lastEventId
+    if value is None or value == "":
+        return None
+    try:
+        return changefeed.parse_cursor(value)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid Last-Event-ID."
+        )
+
+def _replay_changes(kind: str, after: changefeed.Cursor, **filters):
+    """Missed forms, read from the primary: a replica may not have them yet."""
+    db = SessionLocal()
+    try:
+        return changefeed.replay(db, kind, after, **filters)
+    finally:
+        db.close()
+
+async def _replay_changes_async(kind: str, after: changefeed.Cursor, **filters):
+    """Async variant of _replay_changes; in sync mode runs it in the threadpool."""
+    if not USE_ASYNC_DB:
+        return await run_in_threadpool(_replay_changes, kind, after, **filters)
+    async with AsyncSessionLocal() as db:
+        return await changefeed.replay_async(db, kind, after, **filters)
+
+def _change_feed_response(kind: str, after: Optional[changefeed.Cursor], by: Optional[str], on_date: Optional[date]) -> StreamingResponse:
+    return StreamingResponse(
+        changefeed.stream_events(kind, after, _replay_changes_async, by=by, on_date=on_date),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: stop nginx from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get(
+    "/api/forms/wheel-specifications/changes",
+    response_class=StreamingResponse,
+    responses=CHANGE_FEED_RESPONSES,
+    summary="Wheel Specification Change Feed",
+    description="Streams newly saved wheel specifications as Server-Sent Events.",
+)
+async def wheel_specification_changes_endpoint(
+    submittedBy: Optional[str] = Query(None, description="Filter by the ID of the user who submitted the form"),
+    submittedDate: Optional[date] = Query(None, description="Filter by the submission date (YYYY-MM-DD)"),
+    after: Optional[changefeed.Cursor] = Depends(_last_event_id),
+):
+    """
+    **Streams new Wheel Specifications (Server-Sent Events).**
+
+    Each saved form matching the filters is sent as a `created` event whose data is
+    `{"id", "formNumber", "submittedBy", "submittedDate"}` and whose id is a cursor
+    into the feed. With `Last-Event-ID` (or `lastEventId`), the forms saved after
+    that event are sent first; if more than `CHANGE_FEED_REPLAY_LIMIT` were missed,
+    or they are no longer in the change log, a `reset` event is sent instead and
+    the client should reload the list. Idle streams get a comment
+    line every `CHANGE_FEED_KEEPALIVE_SECONDS`.
+
+    **Responses:**
+    - `200 OK`: The event stream (`text/event-stream`).
+    - `400 Bad Request`: Invalid `Last-Event-ID`.
+    """
+    return _change_feed_response("wheel-specifications", after, submittedBy, submittedDate)
+
+@app.get(
+    "/api/forms/bogie-checksheet/changes",
+    response_class=StreamingResponse,
+    responses=CHANGE_FEED_RESPONSES,
+    summary="Bogie Checksheet Change Feed",
+    description="Streams newly saved bogie checksheets as Server-Sent Events.",
+)
+async def bogie_checksheet_changes_endpoint(
+    inspectionBy: Optional[str] = Query(None, description="Filter by inspector"),
+    inspectionDate: Optional[date] = Query(None, description="Filter by the inspection date (YYYY-MM-DD)"),
+    after: Optional[changefeed.Cursor] = Depends(_last_event_id),
+):
+    """
+    **Streams new Bogie Checksheets (Server-Sent Events).**
+
+    Like `GET /api/forms/wheel-specifications/changes`; the event data is
+    `{"id", "formNumber", "inspectionBy", "inspectionDate"}`.
+    """
+    return _change_feed_response("bogie-checksheet", after, inspectionBy, inspectionDate)
+
 # --- Endpoint to populate dummy data (Optional, for testing convenience) ---
 @app.post("/populate-dummy-wheel-data", status_code=status.HTTP_201_CREATED, include_in_schema=False)
 def populate_dummy_wheel_data(db: Session = Depends(get_db)):
@@ -249,10 +1233,61 @@ def populate_dummy_wheel_data(db: Session = Depends(get_db)):
 
     for item in dummy_data:
         # Check if already exists to prevent duplicates on repeated calls
-        existing = db.query(models.WheelSpecification).filter(
-            models.WheelSpecification.form_number == item.formNumber
-        ).first()
-        if not existing:
+        # (looked up in the form number registry, which also covers archived forms)
+        if db.get(models.WheelSpecificationFormNumber, item.formNumber) is None:
             crud.create_dummy_wheel_specification(db, item)
 
     return {"message": "Dummy wheel specification data populated successfully."}
+
+# --- Internal: connection pool telemetry ---
+@app.get("/internal/pool-stats", include_in_schema=False)
+def get_pool_stats():
+    """
+    Reports the engine profile in effect and live connection-pool numbers for this
+    worker process (occupancy, peaks, checkout wait times, invalidations).
+    Use it to size DB_POOL_SIZE / DB_MAX_OVERFLOW per worker from real load.
+    """
+    return {
+        "profile": DB_PROFILE,
+        "settings": ENGINE_PROFILE,
+        # Only engines this worker has created so far (they are created on first use)
+        "pools": pool_stats(created_engines()),
+        # As last measured by this worker's replica monitor (DATABASE_REPLICA_URLS)
+        "replicas": replica_router.snapshot(),
+    }
+
+# --- Internal: ingestion queue telemetry ---
+@app.get("/internal/ingest-stats", include_in_schema=False)
+def get_ingest_stats():
+    """
+    Reports this worker's ingestion queue (INGEST_MODE=queued): forms waiting,
+    age of the oldest, batches committed, outcomes so far, retries and the last error.
+    """
+    return {"mode": INGEST_MODE, **(ingest_queue.snapshot() if INGEST_MODE == "queued" else {})}
+
+# --- Internal: admission control telemetry ---
+@app.get("/internal/admission-stats", include_in_schema=False)
+async def get_admission_stats():
+    """
+    Reports this worker's admission control (ADMISSION_CONTROL=1): requests running
+    and queued per route class, queue wait times and rejections by reason.
+    """
+    return {"enabled": ADMISSION_CONTROL, **(admission_controller.snapshot() if ADMISSION_CONTROL else {})}
+
+# --- Internal: change feed telemetry ---
+@app.get("/internal/change-feed-stats", include_in_schema=False)
+def get_change_feed_stats():
+    """
+    Reports this worker's change feed listener: whether its LISTEN connection is up,
+    subscribers per form kind, notifications received, connects and the last error.
+    """
+    return changefeed.change_listener.snapshot()
+
+# --- Internal: request metrics ---
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """
+    Per-route histograms of request duration, SQL time, SQL statement count and
+    serialization time for this worker process, in the Prometheus text format.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
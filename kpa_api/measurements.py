@@ -0,0 +1,172 @@
+import re
+import sys
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import delete, exists, or_, select
+
+from . import models
+
+# Parses the free-text wheel specification measurements into numbers at write
+# time, so range and tolerance questions can be answered in SQL from the
+# wheel_specification_measurements side table.
+
+_NUMBER = r"\d+(?:\.\d+)?"
+_SIGNED = r"[+-]\d+(?:\.\d+)?"
+
+# "130.043 TO 130.068"
+_RANGE = re.compile(rf"^\s*({_NUMBER})\s*TO\s*({_NUMBER})\s*$", re.IGNORECASE)
+# "825 (800-900)", "1600 (+2,-1)", "280.041 (+0.030/+0.052)"
+_WITH_TOLERANCE = re.compile(rf"^\s*({_NUMBER})\s*\((.*)\)\s*$")
+_ABSOLUTE_LIMITS = re.compile(rf"^\s*({_NUMBER})\s*-\s*({_NUMBER})\s*$")
+_DEVIATIONS = re.compile(rf"^\s*({_SIGNED})\s*[,/]\s*({_SIGNED})\s*$")
+# "0.5", "29.4 Flange Thickness"
+_LEADING_NUMBER = re.compile(rf"^\s*({_NUMBER})(?:\s|$)")
+
+# Deviation notation is used both for the specification itself, "280 (+0.030/+0.052)"
+# (size 280, limits 280.030-280.052), and for readings against it, wheelGauge
+# "1601 (+2,-1)" (reading 1601, limits 1600 +2/-1, not 1601 +2/-1). Only the
+# specified size tells them apart, so it is listed here for the fields whose forms
+# record readings. For any other field the number is taken as the specified size.
+SPEC_NOMINALS: Dict[str, Decimal] = {
+    "wheelGauge": Decimal("1600"),
+    "axleBoxHousingBoreDia": Decimal("280"),
+    "rollerBearingBoreDia": Decimal("130"),
+    "rollerBearingOuterDia": Decimal("280"),
+    "rollerBearingWidth": Decimal("93"),
+    "wheelDiscWidth": Decimal("127"),
+}
+
+
+class MeasurementFilter(NamedTuple):
+    """Query-side filter: `field`'s value within [minimum, maximum] and/or outside its own tolerance."""
+    field: Optional[str] = None
+    minimum: Optional[Decimal] = None
+    maximum: Optional[Decimal] = None
+    out_of_tolerance: bool = False
+
+
+class Measurement(NamedTuple):
+    nominal: Optional[Decimal]
+    min_value: Optional[Decimal]
+    max_value: Optional[Decimal]
+
+
+def parse_measurement(text: Optional[str], field: Optional[str] = None) -> Optional[Measurement]:
+    """
+    Parses one measurement string of `field` into nominal/min/max values.
+
+    - "825 (800-900)"        -> 825, 800, 900 (absolute limits)
+    - "1601 (+2,-1)"         -> 1601, 1599, 1602 (reading; deviations from the wheelGauge spec size 1600)
+    - "280.041 (+0.030/+0.052)" -> 280.041, 280.030, 280.052 (axleBoxHousingBoreDia, spec size 280)
+    - "280 (+0.030/+0.052)"  -> 280.041, 280.030, 280.052 (the specification: the number is the
+      field's spec size, or the field is not in SPEC_NOMINALS; like a range, nominal is the midpoint)
+    - "130.043 TO 130.068"   -> 130.0555, 130.043, 130.068 (range; nominal is the midpoint)
+    - "0.5", "29.4 Flange Thickness" -> nominal only
+    Returns None if the text holds no recognisable number.
+    """
+    if not text:
+        return None
+
+    match = _RANGE.match(text)
+    if match:
+        low, high = sorted(Decimal(value) for value in match.groups())
+        return Measurement((low + high) / 2, low, high)
+
+    match = _WITH_TOLERANCE.match(text)
+    if match:
+        nominal = Decimal(match.group(1))
+        tolerance = match.group(2)
+        limits = _ABSOLUTE_LIMITS.match(tolerance)
+        if limits:
+            low, high = sorted(Decimal(value) for value in limits.groups())
+            return Measurement(nominal, low, high)
+        deviations = _DEVIATIONS.match(tolerance)
+        if deviations:
+            low, high = sorted(Decimal(value) for value in deviations.groups())
+            spec = SPEC_NOMINALS.get(field)
+            if spec is None or nominal == spec:
+                return Measurement(nominal + (low + high) / 2, nominal + low, nominal + high)
+            return Measurement(nominal, spec + low, spec + high)
+        return Measurement(nominal, None, None)
+
+    match = _LEADING_NUMBER.match(text)
+    if match:
+        return Measurement(Decimal(match.group(1)), None, None)
+    return None
+
+
+def measurement_rows(fields: Optional[dict]) -> List[models.WheelSpecificationMeasurement]:
+    """Builds the side-table rows for every parsable entry of a wheel specification's fields."""
+    rows = []
+    for field, text in (fields or {}).items():
+        parsed = parse_measurement(text, field) if isinstance(text, str) else None
+        if parsed is not None:
+            rows.append(models.WheelSpecificationMeasurement(
+                field=field,
+                nominal=parsed.nominal,
+                min_value=parsed.min_value,
+                max_value=parsed.max_value,
+            ))
+    return rows
+
+
+def measurement_condition(measurement: MeasurementFilter):
+    """
+    EXISTS condition over wheel_specification_measurements for a wheel specification
+    query. Range filters on one field are served by the (field, nominal) index.
+    """
+    row = models.WheelSpecificationMeasurement
+    conditions = [row.wheel_specification_id == models.WheelSpecification.id]
+    if measurement.field:
+        conditions.append(row.field == measurement.field)
+    if measurement.minimum is not None:
+        conditions.append(row.nominal >= measurement.minimum)
+    if measurement.maximum is not None:
+        conditions.append(row.nominal <= measurement.maximum)
+    if measurement.out_of_tolerance:
+        conditions.append(or_(row.nominal < row.min_value, row.nominal > row.max_value))
+    return exists().where(*conditions)
+
+
+def backfill(db, batch_size: int = 1000, reparse: bool = False) -> int:
+    """
+    Parses the measurements of existing wheel specifications that have none yet
+    (with `reparse`, of all of them, replacing their rows, e.g. after a parser fix),
+    walking the table in id order one batch (and one commit) at a time.
+    Returns the number of wheel specifications that received measurements.
+    """
+    spec, measurement = models.WheelSpecification, models.WheelSpecificationMeasurement
+    processed = 0
+    last_id = 0
+    while True:
+        query = select(spec).where(spec.id > last_id)
+        if not reparse:
+            query = query.where(~exists().where(measurement.wheel_specification_id == spec.id))
+        specs = list(db.scalars(query.order_by(spec.id).limit(batch_size)))
+        if not specs:
+            return processed
+        if reparse:
+            db.execute(delete(measurement).where(measurement.wheel_specification_id.in_([wheel_spec.id for wheel_spec in specs])))
+        for wheel_spec in specs:
+            rows = measurement_rows(wheel_spec.fields)
+            for row in rows:
+                row.wheel_specification_id = wheel_spec.id
+            db.add_all(rows)
+            processed += bool(rows)
+        last_id = specs[-1].id
+        db.commit()
+
+
+if __name__ == "__main__":
+    # python -m kpa_api.measurements backfill [--reparse]
+    if sys.argv[1:] not in (["backfill"], ["backfill", "--reparse"]):
+        sys.exit("usage: python -m kpa_api.measurements backfill [--reparse]")
+
+    from .database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        print(f"Parsed measurements for {backfill(session, reparse='--reparse' in sys.argv)} wheel specifications.")
+    finally:
+        session.close()
@@ -0,0 +1,105 @@
+import importlib
+import pkgutil
+import re
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import text
+
+# Versioned schema migrations. Every change to the database schema (tables,
+# indexes, data backfills) is a module vNNNN_<name>.py in this package with a
+# docstring describing it and an upgrade(connection) function. They are applied in
+# version order by `python -m kpa_api.migrations upgrade`, each in its own
+# transaction together with its row in schema_migrations. Applied migrations are
+# never edited; a later change gets a new module with the next version number.
+# The application itself never creates or alters tables.
+
+MIGRATIONS_TABLE = "schema_migrations"
+
+# pg_advisory_lock key held while migrating, so concurrent runs (e.g. several
+# deploy jobs starting at once) apply each migration exactly once.
+MIGRATION_LOCK_KEY = 7_013_614_001
+
+_MODULE_NAME = re.compile(r"^v(?P<version>\d{4})_(?P<name>\w+)$")
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    description: str
+    upgrade: Callable
+
+
+def discover() -> List[Migration]:
+    """All migrations in this package, in version order."""
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        match = _MODULE_NAME.match(module_info.name)
+        if not match:
+            continue
+        module = importlib.import_module(f"{__name__}.{module_info.name}")
+        # The first paragraph of the docstring
+        description = " ".join((module.__doc__ or "").strip().split("\n\n")[0].split())
+        migrations.append(Migration(int(match.group("version")), match.group("name"), description, module.upgrade))
+    migrations.sort(key=lambda migration: migration.version)
+    versions = [migration.version for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f"Duplicate migration versions in {versions}")
+    return migrations
+
+
+def _ensure_migrations_table(connection):
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ("
+        " version INTEGER PRIMARY KEY,"
+        " name VARCHAR NOT NULL,"
+        " applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+    ))
+
+
+def applied_versions(connection) -> Dict[int, object]:
+    """Applied migration versions -> time applied; empty if no migration has run yet."""
+    exists = connection.execute(text("SELECT to_regclass(:table) IS NOT NULL"), {"table": MIGRATIONS_TABLE}).scalar()
+    if not exists:
+        return {}
+    return dict(connection.execute(text(f"SELECT version, applied_at FROM {MIGRATIONS_TABLE}")).all())
+
+
+def pending(connection, target: Optional[int] = None) -> List[Migration]:
+    """Migrations not applied yet, up to and including version `target` (all by default)."""
+    applied = applied_versions(connection)
+    return [
+        migration for migration in discover()
+        if migration.version not in applied and (target is None or migration.version <= target)
+    ]
+
+
+def upgrade(engine, target: Optional[int] = None, on_apply: Callable[[Migration], None] = None) -> List[Migration]:
+    """
+    Applies the pending migrations (up to version `target`) in order, each in its
+    own transaction, and returns them. Holds an advisory lock for the duration,
+    so a concurrent run waits and then finds nothing left to do.
+    """
+    applied = []
+    with engine.connect() as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        connection.commit()
+        try:
+            with connection.begin():
+                _ensure_migrations_table(connection)
+                migrations = pending(connection, target)
+            for migration in migrations:
+                if on_apply is not None:
+                    on_apply(migration)
+                with connection.begin():
+                    migration.upgrade(connection)
+                    connection.execute(
+                        text(f"INSERT INTO {MIGRATIONS_TABLE} (version, name) VALUES (:version, :name)"),
+                        {"version": migration.version, "name": migration.name},
+                    )
+                applied.append(migration)
+        finally:
+            # Leave any failed transaction before releasing the session-level lock
+            connection.rollback()
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            connection.commit()
+    return applied
@@ -0,0 +1,33 @@
+import argparse
+
+from .. import partitions
+from . import applied_versions, discover, upgrade
+
+parser = argparse.ArgumentParser(prog="python -m kpa_api.migrations", description="Manage the database schema.")
+commands = parser.add_subparsers(dest="command", required=True)
+upgrade_parser = commands.add_parser(
+    "upgrade", help="Apply pending migrations, then create partitions for the current and upcoming months.",
+)
+upgrade_parser.add_argument("--target", type=int, help="Stop after this migration version")
+upgrade_parser.add_argument("--months-ahead", type=int, default=partitions.PARTITION_MONTHS_AHEAD)
+commands.add_parser("status", help="List migrations and whether each has been applied.")
+args = parser.parse_args()
+
+from ..database import get_engine
+
+engine = get_engine()
+
+if args.command == "upgrade":
+    applied = upgrade(engine, args.target, on_apply=lambda migration: print(
+        f"Applying {migration.version:04d}_{migration.name}: {migration.description}", flush=True,
+    ))
+    print(f"Applied {len(applied)} migration(s)." if applied else "Schema is up to date.")
+    partitions.maintain(engine, args.months_ahead)
+    print(f"Partitions exist up to {args.months_ahead} months ahead.")
+else:
+    with engine.connect() as connection:
+        applied = applied_versions(connection)
+    for migration in discover():
+        applied_at = applied.get(migration.version)
+        state = f"applied {applied_at:%Y-%m-%d %H:%M:%S}" if applied_at else "pending"
+        print(f"{migration.version:04d}_{migration.name:<30} {state:<28} {migration.description}")
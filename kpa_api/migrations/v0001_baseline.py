@@ -0,0 +1,103 @@
+"""
+Baseline schema: form tables partitioned by month, form number registries,
+condition rollups, parsed wheel measurements and their indexes.
+
+Every statement is IF NOT EXISTS, so databases created by the application
+before migrations existed adopt this baseline as they are (older unpartitioned
+form tables stay unpartitioned; see partitions.py).
+"""
+from sqlalchemy import text
+
+from .. import partitions
+
+STATEMENTS = [
+    # --- Bogie checksheets ---
+    """
+    CREATE TABLE IF NOT EXISTS bogie_checksheets (
+        id SERIAL NOT NULL,
+        form_number VARCHAR NOT NULL,
+        inspection_by VARCHAR NOT NULL,
+        inspection_date DATE NOT NULL,
+        bmbc_checksheet JSONB,
+        bogie_checksheet_details JSONB,
+        bogie_details JSONB,
+        created_at DATE DEFAULT now(),
+        PRIMARY KEY (id, inspection_date)
+    ) PARTITION BY RANGE (inspection_date)
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_bogie_checksheets_id ON bogie_checksheets (id)",
+    "CREATE INDEX IF NOT EXISTS ix_bogie_checksheets_form_number ON bogie_checksheets (form_number)",
+    "CREATE INDEX IF NOT EXISTS ix_bogie_checksheets_bmbc_checksheet_gin"
+    " ON bogie_checksheets USING gin (bmbc_checksheet jsonb_path_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_bogie_checksheets_bogie_checksheet_details_gin"
+    " ON bogie_checksheets USING gin (bogie_checksheet_details jsonb_path_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_bogie_checksheets_bogie_details_gin"
+    " ON bogie_checksheets USING gin (bogie_details jsonb_path_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_bogie_checksheets_bogie_no ON bogie_checksheets ((bogie_details ->> 'bogieNo'))",
+    "CREATE INDEX IF NOT EXISTS ix_bogie_checksheets_inspection_date_id ON bogie_checksheets (inspection_date, id)",
+    """
+    CREATE TABLE IF NOT EXISTS bogie_checksheet_form_numbers (
+        form_number VARCHAR NOT NULL,
+        inspection_date DATE NOT NULL,
+        PRIMARY KEY (form_number)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bogie_checksheet_condition_rollups (
+        week DATE NOT NULL,
+        component VARCHAR NOT NULL,
+        condition VARCHAR NOT NULL,
+        division VARCHAR NOT NULL,
+        maker_year VARCHAR NOT NULL,
+        count BIGINT NOT NULL,
+        PRIMARY KEY (component, condition, week, division, maker_year)
+    )
+    """,
+    # --- Wheel specifications ---
+    """
+    CREATE TABLE IF NOT EXISTS wheel_specifications (
+        id SERIAL NOT NULL,
+        form_number VARCHAR NOT NULL,
+        submitted_by VARCHAR NOT NULL,
+        submitted_date DATE NOT NULL,
+        fields JSONB,
+        created_at DATE DEFAULT now(),
+        PRIMARY KEY (id, submitted_date)
+    ) PARTITION BY RANGE (submitted_date)
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_wheel_specifications_id ON wheel_specifications (id)",
+    "CREATE INDEX IF NOT EXISTS ix_wheel_specifications_form_number ON wheel_specifications (form_number)",
+    "CREATE INDEX IF NOT EXISTS ix_wheel_specifications_submitted_date_id ON wheel_specifications (submitted_date, id)",
+    """
+    CREATE TABLE IF NOT EXISTS wheel_specification_form_numbers (
+        form_number VARCHAR NOT NULL,
+        submitted_date DATE NOT NULL,
+        PRIMARY KEY (form_number)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS wheel_specification_measurements (
+        id SERIAL NOT NULL,
+        wheel_specification_id INTEGER NOT NULL,
+        field VARCHAR NOT NULL,
+        nominal NUMERIC,
+        min_value NUMERIC,
+        max_value NUMERIC,
+        PRIMARY KEY (id),
+        CONSTRAINT uq_wheel_specification_measurements_spec_field UNIQUE (wheel_specification_id, field)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_wheel_specification_measurements_field_nominal"
+    " ON wheel_specification_measurements (field, nominal)",
+    "CREATE INDEX IF NOT EXISTS ix_wheel_specification_measurements_field_min_value"
+    " ON wheel_specification_measurements (field, min_value)",
+    "CREATE INDEX IF NOT EXISTS ix_wheel_specification_measurements_field_max_value"
+    " ON wheel_specification_measurements (field, max_value)",
+]
+
+
+def upgrade(connection):
+    for statement in STATEMENTS:
+        connection.execute(text(statement))
+    # Registries of databases whose form tables predate them
+    partitions.backfill_form_numbers(connection)
@@ -0,0 +1,24 @@
+"""
+Table of queued bogie checksheet submission outcomes (INGEST_MODE=queued).
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    """
+    CREATE TABLE bogie_checksheet_submissions (
+        tracking_id VARCHAR NOT NULL,
+        form_number VARCHAR NOT NULL,
+        status VARCHAR NOT NULL,
+        detail VARCHAR,
+        received_at TIMESTAMP WITH TIME ZONE NOT NULL,
+        processed_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        PRIMARY KEY (tracking_id)
+    )
+    """,
+    "CREATE INDEX ix_bogie_checksheet_submissions_processed_at ON bogie_checksheet_submissions (processed_at)",
+]
+
+
+def upgrade(connection):
+    for statement in STATEMENTS:
+        connection.execute(text(statement))
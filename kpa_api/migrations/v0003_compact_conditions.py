@@ -0,0 +1,27 @@
+"""
+Compact storage of bogie checksheet conditions (BOGIE_CONDITION_STORAGE=compact):
+the condition code dictionary, bogie_checksheets.conditions and its GIN index.
+
+Existing rows stay in the JSONB format; `python -m kpa_api.conditions encode`
+converts them in batches (see conditions.py).
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    """
+    CREATE TABLE bogie_checksheet_condition_codes (
+        code INTEGER GENERATED BY DEFAULT AS IDENTITY (START WITH 1) NOT NULL,
+        condition VARCHAR NOT NULL,
+        PRIMARY KEY (code),
+        UNIQUE (condition)
+    )
+    """,
+    # No default, so adding the column does not rewrite the table
+    "ALTER TABLE bogie_checksheets ADD COLUMN conditions INTEGER[]",
+    "CREATE INDEX ix_bogie_checksheets_conditions_gin ON bogie_checksheets USING gin (conditions)",
+]
+
+
+def upgrade(connection):
+    for statement in STATEMENTS:
+        connection.execute(text(statement))
@@ -0,0 +1,53 @@
+"""
+Change feed: every form inserted into wheel_specifications or bogie_checksheets
+sends a NOTIFY on the form_changes channel, delivered when its transaction commits.
+
+The payload is small JSON (kind, id, formNumber, by, date); subscribers read the
+rest of a form through the API (see changefeed.py).
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    """
+    CREATE FUNCTION notify_wheel_specification_insert() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        PERFORM pg_notify('form_changes', json_build_object(
+            'kind', 'wheel-specifications',
+            'id', NEW.id,
+            'formNumber', NEW.form_number,
+            'by', NEW.submitted_by,
+            'date', NEW.submitted_date
+        )::text);
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE FUNCTION notify_bogie_checksheet_insert() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        PERFORM pg_notify('form_changes', json_build_object(
+            'kind', 'bogie-checksheet',
+            'id', NEW.id,
+            'formNumber', NEW.form_number,
+            'by', NEW.inspection_by,
+            'date', NEW.inspection_date
+        )::text);
+        RETURN NULL;
+    END
+    $$
+    """,
+    # Row triggers on the partitioned tables apply to current and future partitions
+    """
+    CREATE TRIGGER wheel_specifications_notify_insert AFTER INSERT ON wheel_specifications
+    FOR EACH ROW EXECUTE FUNCTION notify_wheel_specification_insert()
+    """,
+    """
+    CREATE TRIGGER bogie_checksheets_notify_insert AFTER INSERT ON bogie_checksheets
+    FOR EACH ROW EXECUTE FUNCTION notify_bogie_checksheet_insert()
+    """,
+]
+
+
+def upgrade(connection):
+    for statement in STATEMENTS:
+        connection.execute(text(statement))
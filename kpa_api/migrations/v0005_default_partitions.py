@@ -0,0 +1,12 @@
+"""
+DEFAULT partitions for the partitioned form tables, so an insert for a month
+without a partition is stored instead of failing; creating the month's partition
+moves its rows out (see partitions.py). Unpartitioned tables are left alone.
+"""
+from .. import partitions
+
+
+def upgrade(connection):
+    for table in partitions.PARTITIONED_TABLES:
+        if partitions.is_partitioned(connection, table):
+            partitions.create_default_partition(connection, table)
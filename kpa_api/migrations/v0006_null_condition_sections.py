@@ -0,0 +1,21 @@
+"""
+Stores absent bmbc_checksheet / bogie_checksheet_details sections as SQL NULL.
+
+Compact rows, rows converted back with `python -m kpa_api.conditions decode` and
+forms sent without a section used to store JSON null there instead.
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    """
+    UPDATE bogie_checksheets SET
+        bmbc_checksheet = NULLIF(bmbc_checksheet, 'null'::jsonb),
+        bogie_checksheet_details = NULLIF(bogie_checksheet_details, 'null'::jsonb)
+    WHERE bmbc_checksheet = 'null'::jsonb OR bogie_checksheet_details = 'null'::jsonb
+    """,
+]
+
+
+def upgrade(connection):
+    for statement in STATEMENTS:
+        connection.execute(text(statement))
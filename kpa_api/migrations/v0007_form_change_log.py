@@ -0,0 +1,70 @@
+"""
+Change feed log: inserts into wheel_specifications and bogie_checksheets append
+one form_change_log row per form, tagged with the inserting transaction, and
+NOTIFY form_changes with the kind of form.
+
+Readers order the log by (transaction, position) and only read rows of
+transactions older than every transaction still running, so a resume cursor never
+skips a form committed late (see changefeed.py). The row triggers of v0004 are
+replaced by statement triggers reading the inserted rows from a transition table.
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    """
+    CREATE TABLE form_change_log (
+        position BIGINT GENERATED BY DEFAULT AS IDENTITY (START WITH 1) NOT NULL,
+        xact_id BIGINT NOT NULL DEFAULT CAST(CAST(pg_current_xact_id() AS TEXT) AS BIGINT),
+        kind VARCHAR NOT NULL,
+        form_id INTEGER NOT NULL,
+        form_number VARCHAR NOT NULL,
+        submitter VARCHAR NOT NULL,
+        form_date DATE NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        PRIMARY KEY (position)
+    )
+    """,
+    "CREATE INDEX ix_form_change_log_xact_id_position ON form_change_log (xact_id, position)",
+    "CREATE INDEX ix_form_change_log_created_at ON form_change_log (created_at)",
+    "DROP TRIGGER wheel_specifications_notify_insert ON wheel_specifications",
+    "DROP TRIGGER bogie_checksheets_notify_insert ON bogie_checksheets",
+    "DROP FUNCTION notify_wheel_specification_insert()",
+    "DROP FUNCTION notify_bogie_checksheet_insert()",
+    """
+    CREATE FUNCTION log_wheel_specification_inserts() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO form_change_log (kind, form_id, form_number, submitter, form_date)
+        SELECT 'wheel-specifications', id, form_number, submitted_by, submitted_date FROM inserted ORDER BY id;
+        IF FOUND THEN
+            PERFORM pg_notify('form_changes', 'wheel-specifications');
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE FUNCTION log_bogie_checksheet_inserts() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO form_change_log (kind, form_id, form_number, submitter, form_date)
+        SELECT 'bogie-checksheet', id, form_number, inspection_by, inspection_date FROM inserted ORDER BY id;
+        IF FOUND THEN
+            PERFORM pg_notify('form_changes', 'bogie-checksheet');
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE TRIGGER wheel_specifications_log_inserts AFTER INSERT ON wheel_specifications
+    REFERENCING NEW TABLE AS inserted FOR EACH STATEMENT EXECUTE FUNCTION log_wheel_specification_inserts()
+    """,
+    """
+    CREATE TRIGGER bogie_checksheets_log_inserts AFTER INSERT ON bogie_checksheets
+    REFERENCING NEW TABLE AS inserted FOR EACH STATEMENT EXECUTE FUNCTION log_bogie_checksheet_inserts()
+    """,
+]
+
+
+def upgrade(connection):
+    for statement in STATEMENTS:
+        connection.execute(text(statement))
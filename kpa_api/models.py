@@ -1,41 +1,210 @@
-from sqlalchemy import Column, Integer, String, Date
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, Date, DateTime, Numeric, Index, UniqueConstraint, PrimaryKeyConstraint,
+    Identity, literal_column, text,
+)
+from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.sql import func
 from .database import Base
 
+# --- Partitioned form tables ---
+# bogie_checksheets and wheel_specifications are range-partitioned by month on
+# their form date (partitions are managed by partitions.py). Postgres requires
+# the partition key in every unique constraint, so the primary key is (id, date)
+# and form_number uniqueness is enforced by the *_form_numbers tables instead,
+# which every insert claims first (see crud.py).
+
 class BogieChecksheet(Base):
     __tablename__ = "bogie_checksheets"
 
-    id = Column(Integer, primary_key=True, index=True)
-    form_number = Column(String, unique=True, index=True, nullable=False)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    form_number = Column(String, index=True, nullable=False)
     inspection_by = Column(String, nullable=False)
-    inspection_date = Column(Date, nullable=False)
+    inspection_date = Column(Date, primary_key=True, nullable=False)  # Partition key
 
-    bmbc_checksheet = Column(JSONB)
-    bogie_checksheet_details = Column(JSONB)
-    bogie_details = Column(JSONB)
+    # None is stored as SQL NULL, not as JSON null (compact rows, omitted sections)
+    bmbc_checksheet = Column(JSONB(none_as_null=True))
+    bogie_checksheet_details = Column(JSONB(none_as_null=True))
+    # BOGIE_CONDITION_STORAGE=compact: the two objects above as dictionary codes
+    # instead (see conditions.py); NULL for rows stored as JSONB
+    conditions = Column(ARRAY(Integer))
+    bogie_details = Column(JSONB(none_as_null=True))
     # Add a timestamp for when the record was created in the DB
     created_at = Column(Date, server_default=func.now())
 
+    __table_args__ = {"postgresql_partition_by": "RANGE (inspection_date)"}
+
     def __repr__(self):
         return f"<BogieChecksheet(form_number='{self.form_number}', inspection_by='{self.inspection_by}')>"
 
+class BogieChecksheetConditionCode(Base):
+    """Dictionary of the compact condition format: one code per exact condition spelling (see conditions.py)."""
+    __tablename__ = "bogie_checksheet_condition_codes"
+
+    code = Column(Integer, Identity(start=1), primary_key=True)
+    condition = Column(String, nullable=False, unique=True)
+
+class BogieChecksheetFormNumber(Base):
+    """Every bogie checksheet formNumber ever saved, including those in archived partitions."""
+    __tablename__ = "bogie_checksheet_form_numbers"
+
+    form_number = Column(String, primary_key=True)
+    inspection_date = Column(Date, nullable=False)
+
+# --- Search indexes for bogie checksheets ---
+# GIN (jsonb_path_ops) indexes serve containment lookups such as
+# bmbc_checksheet @> '{"cylinderBody": "WORN OUT"}'; expression and B-tree
+# indexes serve the hot scalar filters (bogieNo, inspection date range + keyset).
+Index(
+    "ix_bogie_checksheets_bmbc_checksheet_gin",
+    BogieChecksheet.bmbc_checksheet,
+    postgresql_using="gin",
+    postgresql_ops={"bmbc_checksheet": "jsonb_path_ops"},
+)
+Index(
+    "ix_bogie_checksheets_bogie_checksheet_details_gin",
+    BogieChecksheet.bogie_checksheet_details,
+    postgresql_using="gin",
+    postgresql_ops={"bogie_checksheet_details": "jsonb_path_ops"},
+)
+Index(
+    "ix_bogie_checksheets_bogie_details_gin",
+    BogieChecksheet.bogie_details,
+    postgresql_using="gin",
+    postgresql_ops={"bogie_details": "jsonb_path_ops"},
+)
+# Overlap lookups (conditions && ARRAY[...]) on compact rows, see conditions.condition_filter
+Index("ix_bogie_checksheets_conditions_gin", BogieChecksheet.conditions, postgresql_using="gin")
+# The key is rendered as a SQL literal (not a bind parameter), so queries using this
+# expression match the index definition even with server-side prepared statements.
+bogie_no_expression = BogieChecksheet.bogie_details.op("->>", return_type=String)(literal_column("'bogieNo'"))
+Index("ix_bogie_checksheets_bogie_no", bogie_no_expression)
+Index("ix_bogie_checksheets_inspection_date_id", BogieChecksheet.inspection_date, BogieChecksheet.id)
+
+# --- Rollup of bogie checksheet conditions ---
+class BogieChecksheetConditionRollup(Base):
+    """
+    Number of bogie checksheets per (week, component, condition, division, maker year).
+    Kept up to date by the create paths in crud.py / async_crud.py and rebuilt
+    from bogie_checksheets by `python -m kpa_api.rollups rebuild` (see rollups.py).
+    Missing division / maker year are stored as '' so they can be part of the key.
+    """
+    __tablename__ = "bogie_checksheet_condition_rollups"
+
+    week = Column(Date, nullable=False)  # Monday of the inspection week
+    component = Column(String, nullable=False)
+    condition = Column(String, nullable=False)  # Upper-cased, e.g. CRACKED
+    division = Column(String, nullable=False)
+    maker_year = Column(String, nullable=False)
+    count = Column(BigInteger, nullable=False)
+
+    __table_args__ = (
+        # Leading (component, condition, week) serves the usual analytics filters
+        PrimaryKeyConstraint("component", "condition", "week", "division", "maker_year"),
+    )
+
+# --- Queued bogie checksheet submissions ---
+class BogieChecksheetSubmission(Base):
+    """
+    Outcome of a bogie checksheet accepted by the ingestion queue (INGEST_MODE=queued),
+    by the tracking id returned to the client. Written in the same transaction as
+    the forms of its batch (see ingest.py).
+    """
+    __tablename__ = "bogie_checksheet_submissions"
+
+    tracking_id = Column(String, primary_key=True)
+    form_number = Column(String, nullable=False)
+    status = Column(String, nullable=False)  # Saved, Duplicate or Failed
+    detail = Column(String)
+    received_at = Column(DateTime(timezone=True), nullable=False)
+    processed_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        # Serves `python -m kpa_api.ingest prune`
+        Index("ix_bogie_checksheet_submissions_processed_at", "processed_at"),
+    )
+
 # --- SQLAlchemy Model for Wheel Specifications ---
 class WheelSpecification(Base):
     """SQLAlchemy model for the 'wheel_specifications' table."""
     __tablename__ = "wheel_specifications"
 
-    id = Column(Integer, primary_key=True, index=True)
-    form_number = Column(String, unique=True, index=True, nullable=False)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    form_number = Column(String, index=True, nullable=False)
     submitted_by = Column(String, nullable=False)
-    submitted_date = Column(Date, nullable=False)
+    submitted_date = Column(Date, primary_key=True, nullable=False)  # Partition key
     # Store nested JSON objects as JSONB columns
     fields = Column(JSONB)
     # Add a timestamp for when the record was created in the DB
     created_at = Column(Date, server_default=func.now())
 
+    # Numeric values parsed from `fields` at write time (see measurements.py).
+    # raise: they are only written; a read that touches them (instead of querying
+    # wheel_specification_measurements) fails instead of loading them per row.
+    # There is no foreign key: id alone is not unique across partitions, and archiving
+    # a partition removes its measurements explicitly (see partitions.archive).
+    measurements = relationship(
+        "WheelSpecificationMeasurement",
+        primaryjoin="WheelSpecification.id == foreign(WheelSpecificationMeasurement.wheel_specification_id)",
+        cascade="all, delete-orphan",
+        lazy="raise",
+    )
+
+    __table_args__ = (
+        # Backs keyset pagination on (submitted_date, id)
+        Index("ix_wheel_specifications_submitted_date_id", "submitted_date", "id"),
+        {"postgresql_partition_by": "RANGE (submitted_date)"},
+    )
+
     def __repr__(self):
         return f"<WheelSpecification(form_number='{self.form_number}', submitted_by='{self.submitted_by}')>"
 
+class WheelSpecificationFormNumber(Base):
+    """Every wheel specification formNumber ever saved, including those in archived partitions."""
+    __tablename__ = "wheel_specification_form_numbers"
+
+    form_number = Column(String, primary_key=True)
+    submitted_date = Column(Date, nullable=False)
+
+class WheelSpecificationMeasurement(Base):
+    """One parsed measurement (nominal value and tolerance limits) of a wheel specification field."""
+    __tablename__ = "wheel_specification_measurements"
+
+    id = Column(Integer, primary_key=True)
+    wheel_specification_id = Column(Integer, nullable=False)
+    field = Column(String, nullable=False)
+    nominal = Column(Numeric)
+    min_value = Column(Numeric)
+    max_value = Column(Numeric)
+
+    __table_args__ = (
+        UniqueConstraint("wheel_specification_id", "field", name="uq_wheel_specification_measurements_spec_field"),
+        # Range scans per field, e.g. condemningDia nominal between 800 and 830
+        Index("ix_wheel_specification_measurements_field_nominal", "field", "nominal"),
+        Index("ix_wheel_specification_measurements_field_min_value", "field", "min_value"),
+        Index("ix_wheel_specification_measurements_field_max_value", "field", "max_value"),
+    )
+
+
+
+
+# --- Change feed ---
+class FormChangeLogEntry(Base):
+    """One saved form in the change feed's log (see changefeed.py), written by the insert triggers."""
+    __tablename__ = "form_change_log"
 
+    position = Column(BigInteger, Identity(start=1), primary_key=True)
+    # The inserting transaction (pg_current_xact_id()); readers order by (xact_id, position)
+    xact_id = Column(BigInteger, nullable=False, server_default=text("CAST(CAST(pg_current_xact_id() AS TEXT) AS BIGINT)"))
+    kind = Column(String, nullable=False)
+    form_id = Column(Integer, nullable=False)
+    form_number = Column(String, nullable=False)
+    submitter = Column(String, nullable=False)
+    form_date = Column(Date, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_form_change_log_xact_id_position", "xact_id", "position"),
+        # Serves `python -m kpa_api.changefeed prune`
+        Index("ix_form_change_log_created_at", "created_at"),
+    )
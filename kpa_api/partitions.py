@@ -0,0 +1,446 @@
+import argparse
+import gzip
+import os
+import re
+import threading
+from datetime import date
+from typing import Dict, Iterable, List, Set
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+from . import models, rollups
+from .cache import wheel_specifications_cache
+
+# Monthly range partitions of the form tables. Partitions are named
+# <table>_pYYYY_MM and cover [first of the month, first of the next month).
+# Upcoming months are created ahead of time by maintain() (run by
+# `python -m kpa_api.migrations upgrade` and `python -m kpa_api.partitions maintain`,
+# e.g. from a monthly cron job); a form dated in a month without a
+# partition gets one on first write (ensure_partitions). archive() detaches old
+# partitions and writes them to gzip-compressed CSV files.
+#
+# Every partitioned table also has a DEFAULT partition, <table>_default (migration
+# v0005). Rows only land there when a process inserts for a month whose partition
+# it wrongly believes exists (e.g. a month another worker has just archived);
+# creating that month's partition moves them out of it. Should an insert still find
+# no partition (a database without v0005), the process forgets the partitions it
+# knew, so the next write of that month creates its partition again.
+#
+# Tables created before partitioning are converted with convert().
+
+# Partitioned table -> (partition key column, form number registry table)
+PARTITIONED_TABLES = {
+    models.BogieChecksheet.__tablename__: ("inspection_date", models.BogieChecksheetFormNumber.__tablename__),
+    models.WheelSpecification.__tablename__: ("submitted_date", models.WheelSpecificationFormNumber.__tablename__),
+}
+
+# Months after the current one that maintain() creates partitions for.
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+
+_PARTITION_NAME = re.compile(r"^(?P<table>\w+)_p(?P<year>\d{4})_(?P<month>\d{2})$")
+
+# First key of the pg_advisory_xact_lock taken while creating a partition (the
+# second is the hash of its name), so concurrent first writes of a month in
+# different processes create its partition once.
+PARTITION_LOCK_NAMESPACE = 7_013_614
+
+# (table, month) pairs known to have a partition in this process, and whether each
+# table is partitioned at all (tables created before partitioning are plain heaps).
+_known_partitions: Set[tuple] = set()
+_partitioned: Dict[str, bool] = {}
+_lock = threading.Lock()
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def is_partitioned(connection, table: str) -> bool:
+    return connection.execute(
+        text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid"
+            " WHERE c.relname = :table AND pg_table_is_visible(c.oid))"
+        ),
+        {"table": table},
+    ).scalar()
+
+
+def _create_partitions(connection, table: str, months: Iterable[date]) -> List[date]:
+    """Creates the partitions of `table` for `months` that do not exist yet; returns the months covered."""
+    if table not in _partitioned:
+        _partitioned[table] = is_partitioned(connection, table)
+    if not _partitioned[table]:
+        return []
+
+    covered = []
+    for month in sorted(months):
+        _create_partition(connection, table, month)
+        covered.append(month)
+    return covered
+
+
+def _exists(connection, relation: str) -> bool:
+    return connection.execute(text("SELECT to_regclass(:relation) IS NOT NULL"), {"relation": relation}).scalar()
+
+
+def _create_partition(connection, table: str, month: date):
+    name = partition_name(table, month)
+    # Held until the transaction ends: a concurrent creator waits, then finds the table
+    connection.execute(
+        text("SELECT pg_advisory_xact_lock(:namespace, hashtext(:name))"),
+        {"namespace": PARTITION_LOCK_NAMESPACE, "name": name},
+    )
+    if _exists(connection, name):
+        return
+
+    column = PARTITIONED_TABLES[table][0]
+    low, high = month.isoformat(), add_months(month, 1).isoformat()
+    bounds = f"FOR VALUES FROM ('{low}') TO ('{high}')"
+    default = default_partition_name(table)
+    in_month = f"{column} >= '{low}' AND {column} < '{high}'"
+    if _exists(connection, default) and connection.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_month})")
+    ).scalar():
+        # The month's rows in the default partition move to the new partition,
+        # which could not be created next to them
+        connection.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+        connection.execute(text(
+            f"WITH moved AS (DELETE FROM {default} WHERE {in_month} RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+        ))
+        connection.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} {bounds}"))
+    else:
+        connection.execute(text(f"CREATE TABLE {name} PARTITION OF {table} {bounds}"))
+
+
+def create_default_partition(connection, table: str):
+    connection.execute(text(f"CREATE TABLE IF NOT EXISTS {default_partition_name(table)} PARTITION OF {table} DEFAULT"))
+
+
+def drain_default_partition(connection, table: str) -> List[date]:
+    """Creates the partitions of the months that have rows in the default partition, moving the rows there."""
+    default = default_partition_name(table)
+    if not _exists(connection, default):
+        return []
+    column = PARTITIONED_TABLES[table][0]
+    months = connection.execute(
+        text(f"SELECT DISTINCT CAST(date_trunc('month', {column}) AS DATE) FROM {default}")
+    ).scalars().all()
+    return _create_partitions(connection, table, months)
+
+
+def _missing_months(table: str, dates: Iterable[date]) -> Set[date]:
+    return {month_start(day) for day in dates if (table, month_start(day)) not in _known_partitions}
+
+
+def ensure_partitions(engine, table: str, dates: Iterable[date]):
+    """
+    Makes sure `table` has a partition for the month of every date in `dates`.
+    Months already seen by this process cost nothing; new ones are created in a
+    separate, immediately committed transaction, so a rollback of the caller's
+    transaction cannot undo them.
+    """
+    months = _missing_months(table, dates)
+    if not months:
+        return
+    with _lock:
+        months = _missing_months(table, months)
+        if not months:
+            return
+        with engine.begin() as connection:
+            _create_partitions(connection, table, months)
+        _known_partitions.update((table, month) for month in months)
+
+
+async def ensure_partitions_async(engine, table: str, dates: Iterable[date]):
+    """Async counterpart of ensure_partitions for an AsyncEngine."""
+    months = _missing_months(table, dates)
+    if not months:
+        return
+    async with engine.begin() as connection:
+        await connection.run_sync(_create_partitions, table, months)
+    _known_partitions.update((table, month) for month in months)
+
+
+def forget_partitions(table: str = None):
+    """Drops what this process knows about the partitions of `table` (of every table by default)."""
+    _known_partitions.difference_update([key for key in list(_known_partitions) if table is None or key[0] == table])
+    if table is None:
+        _partitioned.clear()
+    else:
+        _partitioned.pop(table, None)
+
+
+def is_missing_partition(exc: BaseException) -> bool:
+    """True if `exc` is Postgres rejecting a row because no partition exists for it."""
+    return "no partition of relation" in str(getattr(exc, "orig", None) or exc)
+
+
+@event.listens_for(Engine, "handle_error")
+def _on_error(context):
+    if is_missing_partition(context.original_exception):
+        forget_partitions()
+
+
+def backfill_form_numbers(connection):
+    """
+    Fills an empty form number registry from its form table, for databases whose
+    form tables were created before the registries existed (run by the baseline
+    migration). A no-op otherwise.
+    """
+    for table, (date_column, registry) in PARTITIONED_TABLES.items():
+        connection.execute(text(
+            f"INSERT INTO {registry} (form_number, {date_column})"
+            f" SELECT form_number, {date_column} FROM {table}"
+            f" WHERE NOT EXISTS (SELECT 1 FROM {registry})"
+            " ON CONFLICT (form_number) DO NOTHING"
+        ))
+
+
+def maintain(engine, months_ahead: int = PARTITION_MONTHS_AHEAD, today: date = None):
+    """Creates partitions from the current month up to `months_ahead` months ahead for every form table."""
+    current = month_start(today or date.today())
+    months = [add_months(current, offset) for offset in range(months_ahead + 1)]
+    with engine.begin() as connection:
+        for table in PARTITIONED_TABLES:
+            covered = _create_partitions(connection, table, months)
+            if covered:
+                covered += drain_default_partition(connection, table)
+            _known_partitions.update((table, month) for month in covered)
+
+
+def list_partitions(connection, table: str) -> Dict[str, date]:
+    """Partitions of `table` created by this module, as name -> month."""
+    names = connection.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i"
+            " JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent"
+            " WHERE p.relname = :table AND pg_table_is_visible(p.oid)"
+        ),
+        {"table": table},
+    ).scalars()
+    partitions = {}
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match and match.group("table") == table:
+            partitions[name] = date(int(match.group("year")), int(match.group("month")), 1)
+    return partitions
+
+
+def convert(engine, table: str) -> int:
+    """
+    Converts `table`, created before partitioning as a plain table, to a
+    partitioned one with a default partition and a partition per month of its rows.
+    The rows (ids included), the id sequence position and the table's triggers move
+    to the new table; the old one is kept as <table>_unpartitioned, with its
+    indexes and sequence renamed with an _old suffix, for the operator to drop once
+    satisfied. Runs in one transaction that blocks writes to the table.
+    Returns the number of rows copied.
+    """
+    old = f"{table}_unpartitioned"
+    column = PARTITIONED_TABLES[table][0]
+    with engine.begin() as connection:
+        if is_partitioned(connection, table):
+            raise ValueError(f"{table} is already partitioned")
+        if _exists(connection, old):
+            raise ValueError(f"{old} already exists; drop it first")
+        connection.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+
+        # Triggers (e.g. the change feed's) are recreated on the new table from their definitions
+        triggers = connection.execute(
+            text("SELECT tgname, pg_get_triggerdef(oid) FROM pg_trigger WHERE tgrelid = CAST(:table AS regclass) AND NOT tgisinternal"),
+            {"table": table},
+        ).all()
+        indexes = connection.execute(
+            text("SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE i.indrelid = CAST(:table AS regclass)"),
+            {"table": table},
+        ).scalars().all()
+        sequence = connection.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table}).scalar()
+        old_columns = set(connection.execute(
+            text("SELECT attname FROM pg_attribute WHERE attrelid = CAST(:table AS regclass) AND attnum > 0 AND NOT attisdropped"),
+            {"table": table},
+        ).scalars())
+
+        for name, _ in triggers:
+            connection.execute(text(f"DROP TRIGGER {name} ON {table}"))
+        connection.execute(text(f"ALTER TABLE {table} RENAME TO {old}"))
+        # The new table's indexes and sequence get the same names
+        for index in indexes:
+            connection.execute(text(f"ALTER INDEX {index} RENAME TO {index[:59]}_old"))
+        if sequence:
+            connection.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO {table}_id_seq_old"))
+
+        model_table = models.Base.metadata.tables[table]
+        model_table.create(connection)
+        _partitioned[table] = True
+        create_default_partition(connection, table)
+        months = connection.execute(
+            text(f"SELECT DISTINCT CAST(date_trunc('month', {column}) AS DATE) FROM {old}")
+        ).scalars().all()
+        _create_partitions(connection, table, months)
+
+        columns = ", ".join(c.name for c in model_table.columns if c.name in old_columns)
+        copied = connection.execute(text(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {old}")).rowcount
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), coalesce(max(id), 0) + 1, false) FROM {table}"
+        ))
+        for _, definition in triggers:
+            connection.exec_driver_sql(definition)
+    _known_partitions.update((table, month) for month in months)
+    return copied
+
+
+def _copy_to_gzip(cursor, query: str, path: str):
+    """Writes the result of `query` as CSV with a header to `path`, gzip-compressed."""
+    with gzip.open(path, "wt", encoding="utf-8") as file:
+        cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", file)
+
+
+def _archive_version(directory: str, name: str, suffixes: List[str]) -> str:
+    """
+    The file name stem for archiving partition `name`: the name itself, or
+    <name>.vN when files of an earlier archive of the same month exist (rows that
+    arrived for the month after it was archived).
+    """
+    stem, version = name, 1
+    while any(os.path.exists(os.path.join(directory, f"{stem}{suffix}.csv.gz")) for suffix in suffixes):
+        version += 1
+        stem = f"{name}.v{version}"
+    return stem
+
+
+def _execute(cursor, dialect, statement):
+    """Runs a SQLAlchemy statement on a DBAPI cursor."""
+    compiled = statement.compile(dialect=dialect, compile_kwargs={"render_postcompile": True})
+    cursor.execute(str(compiled), compiled.params)
+
+
+def archive(engine, before: date, directory: str = ARCHIVE_DIR) -> List[str]:
+    """
+    Detaches every partition for a month before the month of `before`,
+    writes its rows to <directory>/<partition>.csv.gz (wheel specification
+    partitions also to <partition>_measurements.csv.gz, together with their parsed
+    measurements; bogie checksheet partitions with the condition code dictionary
+    in <partition>_condition_codes.csv.gz) and drops it. Each partition is handled in its own transaction;
+    its files are complete on disk before the drop is committed.
+    Rows of those months in the default partitions are archived too. Existing
+    archive files are never overwritten: a month archived again is written to
+    <partition>.v2.csv.gz, and so on.
+    Form numbers stay registered, so archived forms cannot be submitted again.
+    The condition rollups lose the archived bogie checksheets' counts in the same
+    transaction, and the wheel specification response cache is invalidated.
+    Returns the paths written.
+    """
+    cutoff = month_start(before)
+    os.makedirs(directory, exist_ok=True)
+    written = []
+
+    with engine.begin() as connection:
+        for table in PARTITIONED_TABLES:
+            drain_default_partition(connection, table)
+    with engine.connect() as connection:
+        candidates = [
+            (table, name, month)
+            for table in PARTITIONED_TABLES
+            for name, month in sorted(list_partitions(connection, table).items())
+            if month < cutoff
+        ]
+
+    for table, name, month in candidates:
+        if table == models.WheelSpecification.__tablename__:
+            measurements = models.WheelSpecificationMeasurement.__tablename__
+            queries = {
+                "": f"SELECT * FROM {name}",
+                "_measurements": f"SELECT m.* FROM {measurements} m JOIN {name} w ON w.id = m.wheel_specification_id",
+            }
+        else:
+            queries = {
+                "": f"SELECT * FROM {name}",
+                # Compact rows hold condition codes (see conditions.py); keep the dictionary with them
+                "_condition_codes": f"SELECT * FROM {models.BogieChecksheetConditionCode.__tablename__}",
+            }
+        stem = _archive_version(directory, name, list(queries))
+        exports = [(os.path.join(directory, f"{stem}{suffix}.csv.gz"), query) for suffix, query in queries.items()]
+
+        published = []
+        raw_connection = engine.raw_connection()
+        try:
+            cursor = raw_connection.cursor()
+            if table == models.BogieChecksheet.__tablename__:
+                # No new forms for the month until the drop, so the counts removed are exactly the forms archived
+                cursor.execute(f"LOCK TABLE {name} IN SHARE MODE")
+                for statement in rollups.subtract_statements(month, add_months(month, 1)):
+                    _execute(cursor, engine.dialect, statement)
+            cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+            for path, query in exports:
+                _copy_to_gzip(cursor, query, path + ".tmp")
+            if table == models.WheelSpecification.__tablename__:
+                cursor.execute(f"DELETE FROM {measurements} m USING {name} w WHERE w.id = m.wheel_specification_id")
+            cursor.execute(f"DROP TABLE {name}")
+            for path, _ in exports:
+                # Fails instead of replacing a file written meanwhile
+                os.link(path + ".tmp", path)
+                published.append(path)
+                os.remove(path + ".tmp")
+            raw_connection.commit()
+        except BaseException:
+            raw_connection.rollback()
+            for path in published:
+                os.remove(path)
+            for path, _ in exports:
+                if os.path.exists(path + ".tmp"):
+                    os.remove(path + ".tmp")
+            raise
+        finally:
+            raw_connection.close()
+
+        # A later write of this month creates its partition again
+        _known_partitions.discard((table, month))
+        if table == models.WheelSpecification.__tablename__:
+            # Cached list pages may hold archived forms (only this process's, without RESPONSE_CACHE_URL)
+            wheel_specifications_cache.invalidate()
+        written.extend(path for path, _ in exports)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m kpa_api.partitions", description="Manage monthly form table partitions.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    maintain_parser = commands.add_parser("maintain", help="Create partitions for the current and upcoming months.")
+    maintain_parser.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+    archive_parser = commands.add_parser("archive", help="Detach partitions of months before a date and archive them.")
+    archive_parser.add_argument("--before", type=date.fromisoformat, required=True, help="YYYY-MM-DD; months before this date's month are archived")
+    archive_parser.add_argument("--dir", default=ARCHIVE_DIR, help="Directory for the .csv.gz files")
+    commands.add_parser("convert", help="Convert form tables created before partitioning to partitioned tables.")
+    args = parser.parse_args()
+
+    from .database import get_engine
+
+    engine = get_engine()
+    if args.command == "maintain":
+        maintain(engine, args.months_ahead)
+        print(f"Partitions exist up to {args.months_ahead} months ahead.")
+    elif args.command == "convert":
+        for table in PARTITIONED_TABLES:
+            with engine.connect() as connection:
+                if not _exists(connection, table) or is_partitioned(connection, table):
+                    continue
+            print(f"Converted {table}: {convert(engine, table)} rows copied, old table kept as {table}_unpartitioned.")
+        maintain(engine)
+    else:
+        for path in archive(engine, args.before, args.dir):
+            print(f"Archived {path}")
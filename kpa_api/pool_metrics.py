@@ -0,0 +1,162 @@
+import threading
+import time
+from typing import Dict, Type
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+# recent_checkout_wait() is an average over the latest checkouts (each weighs
+# RECENT_WAIT_WEIGHT) that halves every RECENT_WAIT_HALF_LIFE_SECONDS without
+# checkouts, so it falls back once the pool is quiet. Admission control reads it.
+RECENT_WAIT_WEIGHT = 0.3
+RECENT_WAIT_HALF_LIFE_SECONDS = 2.0
+
+
+class PoolMetrics:
+    """
+    Per-process counters for one connection pool.
+    Fed by the pool subclass from instrumented_pool_class (checkout wait time)
+    and by SQLAlchemy pool and engine events (connects, checkouts, invalidations,
+    statements and commits sent to the database).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+        self.checkout_failures = 0
+        self.connections_opened = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+        self.peak_in_use = 0
+        self.peak_overflow = 0
+        self.statements = 0
+        self.commits = 0
+        self._recent_wait = 0.0
+        self._recent_wait_at = time.monotonic()
+
+    def _decayed_recent_wait(self, now: float) -> float:
+        return self._recent_wait * 0.5 ** ((now - self._recent_wait_at) / RECENT_WAIT_HALF_LIFE_SECONDS)
+
+    def recent_checkout_wait(self) -> float:
+        """Seconds a checkout has recently waited for a free connection."""
+        with self._lock:
+            return self._decayed_recent_wait(time.monotonic())
+
+    def record_checkout_wait(self, seconds: float, failed: bool = False):
+        now = time.monotonic()
+        with self._lock:
+            # A failed checkout waited the whole pool timeout
+            recent = self._decayed_recent_wait(now)
+            self._recent_wait = recent + RECENT_WAIT_WEIGHT * (seconds - recent)
+            self._recent_wait_at = now
+            if failed:
+                self.checkout_failures += 1
+                return
+            self.checkouts += 1
+            self.checkout_wait_total += seconds
+            self.checkout_wait_max = max(self.checkout_wait_max, seconds)
+
+    def record_usage(self, pool):
+        with self._lock:
+            self.peak_in_use = max(self.peak_in_use, pool.checkedout())
+            self.peak_overflow = max(self.peak_overflow, pool.overflow(), 0)
+
+    def increment(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self, pool) -> dict:
+        """Returns the counters together with the pool's live occupancy numbers."""
+        with self._lock:
+            return {
+                "pool": self.name,
+                "poolClass": type(pool).__name__,
+                "size": pool.size(),
+                "inUse": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(0, pool.overflow()),  # negative while the pool is not yet full
+                "peakInUse": self.peak_in_use,
+                "peakOverflow": self.peak_overflow,
+                "checkouts": self.checkouts,
+                "checkoutWaitAvgMs": round(1000 * self.checkout_wait_total / self.checkouts, 3) if self.checkouts else 0.0,
+                "checkoutWaitMaxMs": round(1000 * self.checkout_wait_max, 3),
+                "recentCheckoutWaitMs": round(1000 * self._decayed_recent_wait(time.monotonic()), 3),
+                "checkoutFailures": self.checkout_failures,
+                "connectionsOpened": self.connections_opened,
+                "invalidations": self.invalidations,
+                "softInvalidations": self.soft_invalidations,
+                "statements": self.statements,
+                "commits": self.commits,
+            }
+
+
+# Metrics for every instrumented pool in this process, keyed by name ("sync", "async", ...)
+POOL_METRICS: Dict[str, PoolMetrics] = {}
+
+
+def instrumented_pool_class(base: Type[QueuePool], metrics: PoolMetrics) -> Type[QueuePool]:
+    """
+    Returns a subclass of `base` that times how long each checkout waits for a
+    free connection. The metrics live on the class, so they survive pool.recreate().
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = base._do_get(self)
+        except Exception:
+            metrics.record_checkout_wait(time.perf_counter() - start, failed=True)
+            raise
+        metrics.record_checkout_wait(time.perf_counter() - start)
+        return connection
+
+    return type(f"Instrumented{base.__name__}", (base,), {"_do_get": _do_get, "metrics": metrics})
+
+
+def instrument_engine(engine, metrics: PoolMetrics):
+    """Attaches pool and engine event listeners that keep `metrics` up to date."""
+    pool = engine.pool
+
+    @event.listens_for(pool, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        metrics.increment("connections_opened")
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.record_usage(engine.pool)
+
+    @event.listens_for(pool, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.increment("invalidations")
+
+    @event.listens_for(pool, "soft_invalidate")
+    def _on_soft_invalidate(dbapi_connection, connection_record, exception):
+        metrics.increment("soft_invalidations")
+
+    # Each statement and each COMMIT is one database round-trip
+    @event.listens_for(engine, "before_cursor_execute")
+    def _on_execute(connection, cursor, statement, parameters, context, executemany):
+        metrics.increment("statements")
+
+    @event.listens_for(engine, "commit")
+    def _on_commit(connection):
+        metrics.increment("commits")
+
+    POOL_METRICS[metrics.name] = metrics
+
+
+def recent_checkout_wait() -> float:
+    """The highest recent checkout wait of any pool in this process, in seconds."""
+    return max((metrics.recent_checkout_wait() for metrics in list(POOL_METRICS.values())), default=0.0)
+
+
+def pool_stats(engines: dict) -> list:
+    """Snapshots the metrics of each instrumented engine in `engines` (name -> engine)."""
+    return [
+        POOL_METRICS[name].snapshot(engine.pool)
+        for name, engine in engines.items()
+        if engine is not None and name in POOL_METRICS
+    ]
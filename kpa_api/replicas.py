@@ -0,0 +1,183 @@
+import itertools
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+# Read replicas. Read-only endpoints use sessions from database.ReadSessionLocal,
+# which bind to a replica picked round-robin among those that are healthy and at
+# most REPLICA_MAX_LAG_SECONDS behind, and to the primary when none is. A monitor
+# thread, started with the first read, measures every replica each
+# REPLICA_CHECK_INTERVAL_SECONDS; until a replica has been measured it is not used.
+#
+# Read-your-writes: write endpoints return the primary's WAL position after their
+# commit as an X-Consistency-Token header. A read that sends it back is only
+# served by a replica that has replayed at least that far, else by the primary.
+
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# Same replicas for DB_MODE=async; by default DATABASE_REPLICA_URLS with the asyncpg driver
+ASYNC_DATABASE_REPLICA_URLS = [
+    url.strip() for url in os.getenv("ASYNC_DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+] or [
+    make_url(url).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+    for url in DATABASE_REPLICA_URLS
+]
+
+if len(ASYNC_DATABASE_REPLICA_URLS) != len(DATABASE_REPLICA_URLS):
+    raise ValueError("ASYNC_DATABASE_REPLICA_URLS must list the same replicas as DATABASE_REPLICA_URLS")
+
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv("REPLICA_CHECK_INTERVAL_SECONDS", "2"))
+REPLICA_CHECK_TIMEOUT_SECONDS = int(os.getenv("REPLICA_CHECK_TIMEOUT_SECONDS", "3"))
+
+# Lag is 0 while the replica streams from the primary and has replayed everything
+# it received; otherwise the age of the last replayed transaction.
+# (pg_last_xact_replay_timestamp alone would report an idle primary as lag; the
+# WAL positions alone would report a replica that lost its upstream as current.)
+# pg_stat_wal_receiver.status is only shown to superusers and pg_read_all_stats
+# (e.g. pg_monitor) members; for other check users a running WAL receiver counts
+# as streaming.
+_REPLICA_STATUS = text("""
+    WITH receiver AS (
+        SELECT EXISTS (
+            SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming' OR status IS NULL
+        ) AS streaming
+    )
+    SELECT
+        pg_is_in_recovery() AS in_recovery,
+        receiver.streaming,
+        CASE
+            WHEN receiver.streaming AND pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END AS lag_seconds,
+        pg_last_wal_replay_lsn()::text AS replay_lsn
+    FROM receiver
+""")
+
+
+def parse_lsn(lsn: str) -> int:
+    """'16/B374D848' -> integer position, for comparing WAL locations."""
+    high, low = lsn.split("/")
+    return (int(high, 16) << 32) | int(low, 16)
+
+
+def replica_name(index: int) -> str:
+    return f"replica-{index}"
+
+
+class ReplicaState:
+    def __init__(self, index: int, url: str):
+        self.index = index
+        self.name = replica_name(index)
+        self.url = url
+        self.healthy = False
+        self.lag_seconds: Optional[float] = None
+        self.streaming: Optional[bool] = None
+        self.replay_lsn: Optional[int] = None
+        self.checked_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+
+class ReplicaRouter:
+    """Per-process replica health, lag and round-robin choice."""
+
+    def __init__(
+        self,
+        urls: List[str],
+        max_lag: float = REPLICA_MAX_LAG_SECONDS,
+        check_interval: float = REPLICA_CHECK_INTERVAL_SECONDS,
+    ):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.replicas = [ReplicaState(index, url) for index, url in enumerate(urls)]
+        self._round_robin = itertools.count()
+        self._monitor = None
+        self._monitor_lock = threading.Lock()
+        self._check_engines: Dict[int, object] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def choose(self, min_lsn: Optional[int] = None) -> Optional[int]:
+        """
+        Index of the replica to read from, or None for the primary. With `min_lsn`,
+        only replicas known to have replayed up to that WAL position qualify.
+        """
+        if not self.replicas:
+            return None
+        self._start_monitor()
+        eligible = [
+            replica for replica in self.replicas
+            if replica.healthy
+            and replica.lag_seconds is not None and replica.lag_seconds <= self.max_lag
+            and (min_lsn is None or (replica.replay_lsn is not None and replica.replay_lsn >= min_lsn))
+        ]
+        if not eligible:
+            return None
+        return eligible[next(self._round_robin) % len(eligible)].index
+
+    def mark_unhealthy(self, index: int, error: str):
+        """Takes a replica out of rotation until the monitor finds it healthy again."""
+        replica = self.replicas[index]
+        replica.healthy = False
+        replica.error = error
+
+    def check(self, replica: ReplicaState):
+        """Measures one replica (on a dedicated connection, outside the request pools)."""
+        try:
+            # Inside the try: a malformed URL marks this replica unhealthy instead of ending the monitor
+            engine = self._check_engines.get(replica.index)
+            if engine is None:
+                engine = self._check_engines[replica.index] = create_engine(
+                    replica.url, poolclass=NullPool, connect_args={"connect_timeout": REPLICA_CHECK_TIMEOUT_SECONDS},
+                )
+            with engine.connect() as connection:
+                status = connection.execute(_REPLICA_STATUS).one()
+        except Exception as exc:
+            replica.healthy = False
+            replica.error = f"{type(exc).__name__}: {exc}".strip().splitlines()[0]
+        else:
+            # A replica that was promoted is no longer following the primary
+            replica.healthy = bool(status.in_recovery)
+            replica.error = None if status.in_recovery else "not in recovery (promoted?)"
+            replica.lag_seconds = float(status.lag_seconds)
+            replica.streaming = bool(status.streaming)
+            if status.in_recovery and not status.streaming:
+                replica.error = "WAL receiver not streaming; lag measured from the last replayed transaction"
+            replica.replay_lsn = parse_lsn(status.replay_lsn) if status.replay_lsn else None
+        replica.checked_at = time.time()
+
+    def _start_monitor(self):
+        if self._monitor is not None:
+            return
+        with self._monitor_lock:
+            if self._monitor is None:
+                self._monitor = threading.Thread(target=self._run_monitor, name="replica-monitor", daemon=True)
+                self._monitor.start()
+
+    def _run_monitor(self):
+        while True:
+            for replica in self.replicas:
+                self.check(replica)
+            time.sleep(self.check_interval)
+
+    def snapshot(self) -> List[dict]:
+        return [
+            {
+                "name": replica.name,
+                "healthy": replica.healthy,
+                "lagSeconds": replica.lag_seconds,
+                "streaming": replica.streaming,
+                "checkedSecondsAgo": round(time.time() - replica.checked_at, 1) if replica.checked_at else None,
+                "error": replica.error,
+            }
+            for replica in self.replicas
+        ]
+
+
+replica_router = ReplicaRouter(DATABASE_REPLICA_URLS)
@@ -0,0 +1,205 @@
+import re
+import sys
+from collections import Counter
+from datetime import date, timedelta
+from typing import Iterable, List, Optional
+
+from sqlalchemy import BigInteger, Date, Select, cast, delete, func, insert, select, text, true, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from . import conditions, models, schemas
+
+# Condition counts per (week, component, condition, division, maker year), kept in
+# bogie_checksheet_condition_rollups so analytics never scan the JSONB rows.
+# The create paths add each new form's counts in the same transaction as the
+# insert; rebuild() recomputes the table from bogie_checksheets in SQL. Both
+# derive the keys the same way (see condition_rollup_counts / _rebuild_select).
+# Archiving a month subtracts its forms' counts (subtract_statements).
+
+# API name -> rollup column, for grouping and filtering analytics queries
+ROLLUP_DIMENSIONS = {
+    "week": models.BogieChecksheetConditionRollup.week,
+    "component": models.BogieChecksheetConditionRollup.component,
+    "condition": models.BogieChecksheetConditionRollup.condition,
+    "division": models.BogieChecksheetConditionRollup.division,
+    "makerYear": models.BogieChecksheetConditionRollup.maker_year,
+}
+
+# Components whose conditions are counted, from bmbcChecksheet and bogieChecksheet
+ROLLUP_COMPONENTS = [*schemas.BmbcChecksheet.model_fields, *schemas.BogieChecksheetDetails.model_fields]
+
+_MAKER_YEAR = "[0-9]{4}"
+
+
+def week_start(day: date) -> date:
+    """Monday of the week containing `day`, matching Postgres date_trunc('week', ...)."""
+    return day - timedelta(days=day.weekday())
+
+
+def normalize_condition(condition: str) -> str:
+    """Conditions are recorded in mixed case ("Cracked", "DAMAGED"); rollups store them upper-cased."""
+    return condition.strip(" ").upper()
+
+
+def normalize_division(division: str) -> str:
+    return division.strip(" ").upper()
+
+
+def _division(bogie_details: Optional[schemas.BogieDetails]) -> str:
+    """'NR / 2025-06-25' -> 'NR'."""
+    text = bogie_details.incomingDivAndDate if bogie_details else None
+    return normalize_division((text or "").split("/", 1)[0])
+
+
+def _maker_year(bogie_details: Optional[schemas.BogieDetails]) -> str:
+    """'RDSO/2018' -> '2018'."""
+    match = re.search(_MAKER_YEAR, (bogie_details.makerYearBuilt if bogie_details else None) or "")
+    return match.group(0) if match else ""
+
+
+def condition_rollup_counts(bogie_checksheets: Iterable[schemas.BogieChecksheetCreate]) -> Counter:
+    """Counts the given forms per rollup key (week, component, condition, division, maker_year)."""
+    counts = Counter()
+    for sheet in bogie_checksheets:
+        week = week_start(sheet.inspectionDate)
+        division, maker_year = _division(sheet.bogieDetails), _maker_year(sheet.bogieDetails)
+        for section in (sheet.bmbcChecksheet, sheet.bogieChecksheet):
+            for component, condition in (section.model_dump() if section else {}).items():
+                if isinstance(condition, str) and normalize_condition(condition):
+                    counts[(week, component, normalize_condition(condition), division, maker_year)] += 1
+    return counts
+
+
+def increment_statement(bogie_checksheets: Iterable[schemas.BogieChecksheetCreate]):
+    """
+    Builds one multi-row upsert adding the forms' counts to the rollup table,
+    or returns None if they record no conditions. Rows are sent in key order, so
+    concurrent inserts lock shared rollup rows in the same order and cannot deadlock.
+    """
+    counts = condition_rollup_counts(bogie_checksheets)
+    if not counts:
+        return None
+
+    table = models.BogieChecksheetConditionRollup.__table__
+    statement = pg_insert(table).values([
+        dict(week=week, component=component, condition=condition, division=division, maker_year=maker_year, count=count)
+        for (week, component, condition, division, maker_year), count in sorted(counts.items())
+    ])
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.component, table.c.condition, table.c.week, table.c.division, table.c.maker_year],
+        set_={"count": table.c.count + statement.excluded.count},
+    )
+
+
+def condition_counts_query(
+    group_by: List[str],
+    component: Optional[str] = None,
+    condition: Optional[str] = None,
+    division: Optional[str] = None,
+    maker_year: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+) -> Select:
+    """
+    Sums rollup counts grouped by the `group_by` dimensions (keys of ROLLUP_DIMENSIONS).
+    Dates select whole weeks: a week is included if it overlaps [date_from, date_to].
+    """
+    rollup = models.BogieChecksheetConditionRollup
+    columns = [ROLLUP_DIMENSIONS[name].label(name) for name in group_by]
+    query = select(*columns, cast(func.sum(rollup.count), BigInteger).label("count"))
+
+    if component:
+        query = query.where(rollup.component == component)
+    if condition:
+        query = query.where(rollup.condition == normalize_condition(condition))
+    if division:
+        query = query.where(rollup.division == normalize_division(division))
+    if maker_year:
+        query = query.where(rollup.maker_year == maker_year)
+    if date_from:
+        query = query.where(rollup.week >= week_start(date_from))
+    if date_to:
+        query = query.where(rollup.week <= date_to)
+
+    if columns:
+        query = query.group_by(*columns).order_by(*columns)
+    return query
+
+
+def _rebuild_select() -> Select:
+    """
+    The rollup rows computed from bogie_checksheets, mirroring condition_rollup_counts.
+    A section that is not a JSON object (a form sent without it) contributes no
+    conditions, like a None section there (see conditions.entries).
+    Columns are labeled like the rollup table's.
+    """
+    sheet = models.BogieChecksheet
+    entry = conditions.entries(sheet)
+
+    week = cast(func.date_trunc("week", sheet.inspection_date), Date)
+    condition = func.upper(func.btrim(entry.c.value))
+    division = func.upper(func.btrim(func.split_part(func.coalesce(sheet.bogie_details["incomingDivAndDate"].astext, ""), "/", 1)))
+    maker_year = func.coalesce(func.substring(sheet.bogie_details["makerYearBuilt"].astext, _MAKER_YEAR), "")
+
+    return (
+        select(
+            week.label("week"), entry.c.key.label("component"), condition.label("condition"),
+            division.label("division"), maker_year.label("maker_year"), func.count().label("count"),
+        )
+        .select_from(sheet)
+        .join(entry, true())
+        .where(entry.c.key.in_(ROLLUP_COMPONENTS), condition != "")
+        .group_by(week, entry.c.key, condition, division, maker_year)
+    )
+
+
+def rebuild(db) -> int:
+    """
+    Recomputes the whole rollup table from bogie_checksheets in one transaction.
+    The table is locked first, so forms saved meanwhile wait and are then counted
+    exactly once. Returns the number of rollup rows.
+    """
+    rollup = models.BogieChecksheetConditionRollup
+    db.execute(text(f"LOCK TABLE {rollup.__tablename__} IN EXCLUSIVE MODE"))
+    db.execute(delete(rollup))
+    db.execute(
+        insert(rollup).from_select(
+            ["week", "component", "condition", "division", "maker_year", "count"], _rebuild_select()
+        )
+    )
+    rows = db.scalar(select(func.count()).select_from(rollup))
+    db.commit()
+    return rows
+
+
+def subtract_statements(date_from: date, date_to: date) -> list:
+    """
+    Statements removing the counts of the forms inspected in [date_from, date_to)
+    from the rollup table, and the rows left at zero. Run them in the transaction
+    that removes the forms, after locking them against new inserts (see
+    partitions.archive).
+    """
+    sheet, rollup = models.BogieChecksheet, models.BogieChecksheetConditionRollup
+    removed = _rebuild_select().where(
+        sheet.inspection_date >= date_from, sheet.inspection_date < date_to
+    ).subquery("removed")
+    return [
+        update(rollup)
+        .values(count=rollup.count - removed.c["count"])
+        .where(*(getattr(rollup, name) == removed.c[name] for name in ("week", "component", "condition", "division", "maker_year"))),
+        delete(rollup).where(rollup.count <= 0),
+    ]
+
+
+if __name__ == "__main__":
+    # python -m kpa_api.rollups rebuild
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m kpa_api.rollups rebuild")
+
+    from .database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        print(f"Rebuilt {rebuild(session)} bogie checksheet condition rollup rows.")
+    finally:
+        session.close()
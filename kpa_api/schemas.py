@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from typing import Optional, List
-from datetime import date
+from datetime import date, datetime
 
 
 class BmbcChecksheet(BaseModel):
@@ -50,6 +50,77 @@ class BogieChecksheetResponse(BaseModel):
     message: str = Field(..., example="Bogie checksheet submitted successfully.")
     success: bool = Field(..., example=True)
 
+# --- Response Schemas for POST /api/forms/bogie-checksheet/bulk ---
+class BogieChecksheetBulkItemResult(BaseModel):
+    """Outcome of a single form within a bulk submission."""
+    index: int = Field(..., example=0)
+    formNumber: Optional[str] = Field(None, example="BOGIE-2025-001")
+    status: str = Field(..., example="Saved") # Saved, Duplicate or Invalid
+    detail: Optional[str] = Field(None, example=None)
+
+class BogieChecksheetBulkResponseData(BaseModel):
+    """Data part of the bulk Bogie Checksheet submission response."""
+    total: int = Field(..., example=3)
+    saved: int = Field(..., example=1)
+    duplicate: int = Field(..., example=1)
+    invalid: int = Field(..., example=1)
+    results: List[BogieChecksheetBulkItemResult]
+
+class BogieChecksheetBulkResponse(BaseModel):
+    """Full response schema for bulk Bogie Checksheet submission."""
+    data: BogieChecksheetBulkResponseData
+    message: str = Field(..., example="Bulk bogie checksheet submission processed.")
+    success: bool = Field(..., example=True)
+
+# --- Response Schemas for queued submissions (INGEST_MODE=queued) ---
+class BogieChecksheetSubmissionData(BaseModel):
+    """Where a bogie checksheet accepted by the ingestion queue stands."""
+    trackingId: str = Field(..., example="3f2b8c1e9d4a4f0e8b6c2d1a7e5f9b3c")
+    formNumber: str = Field(..., example="BOGIE-2025-001")
+    status: str = Field(..., example="Queued") # Queued, Saved, Duplicate or Failed
+    detail: Optional[str] = Field(None, example=None)
+    receivedAt: datetime
+    processedAt: Optional[datetime] = None
+
+class BogieChecksheetSubmissionResponse(BaseModel):
+    """Response of a queued submission (202) and of its status endpoint."""
+    data: BogieChecksheetSubmissionData
+    message: str = Field(..., example="Bogie checksheet queued for saving.")
+    success: bool = Field(..., example=True)
+
+# --- Response Schemas for GET /api/forms/bogie-checksheet (search) ---
+class BogieChecksheetSearchItem(BaseModel):
+    """Individual item schema for Bogie Checksheet search results."""
+    bmbcChecksheet: Optional[BmbcChecksheet] = None
+    bogieChecksheet: Optional[BogieChecksheetDetails] = None
+    bogieDetails: Optional[BogieDetails] = None
+    formNumber: str = Field(..., example="BOGIE-2025-001")
+    inspectionBy: str = Field(..., example="user_id_456")
+    inspectionDate: date = Field(..., example="2025-07-03")
+
+class BogieChecksheetSearchResponse(BaseModel):
+    """Full response schema for searching Bogie Checksheets."""
+    data: List[BogieChecksheetSearchItem]
+    message: str = Field(..., example="Matching bogie checksheets fetched successfully.")
+    success: bool = Field(..., example=True)
+    next: Optional[str] = Field(None, example="WyIyMDI1LTA3LTAzIiwgMV0") # Opaque cursor for the next page
+
+
+# --- Response Schemas for GET /api/analytics/bogie-checksheet-conditions ---
+class BogieChecksheetConditionCount(BaseModel):
+    """Number of checksheets in one group; only the requested groupBy dimensions are set."""
+    week: Optional[date] = Field(None, example="2025-06-30") # Monday of the inspection week
+    component: Optional[str] = Field(None, example="bolster")
+    condition: Optional[str] = Field(None, example="CRACKED")
+    division: Optional[str] = Field(None, example="NR")
+    makerYear: Optional[str] = Field(None, example="2018")
+    count: int = Field(..., example=12)
+
+class BogieChecksheetConditionCountResponse(BaseModel):
+    """Full response schema for bogie checksheet condition analytics."""
+    data: List[BogieChecksheetConditionCount]
+    message: str = Field(..., example="Bogie checksheet condition counts fetched successfully.")
+    success: bool = Field(..., example=True)
 
     # Get Method api
 
@@ -92,6 +163,7 @@ class WheelSpecificationListResponse(BaseModel):
     data: List[WheelSpecificationResponseDataItem]
     message: str = Field(..., example="Filtered wheel specification forms fetched successfully.")
     success: bool = Field(..., example=True)
+    next: Optional[str] = Field(None, example="WyIyMDI1LTA3LTAzIiwgMV0") # Opaque cursor for the next page
 
 # --- Request Body Schema for POST /api/forms/wheel-specifications (if you were to implement it) ---
 # This is included for completeness based on the swagger, but we are only implementing GET for this path.
@@ -0,0 +1,119 @@
+import base64
+import binascii
+import json
+from datetime import date
+from typing import List, Tuple
+
+from . import conditions, models, schemas
+
+# Response bodies for the list endpoints. For GET /api/forms/wheel-specifications
+# both serialization modes (ORM objects + Pydantic, or items rendered by Postgres)
+# go through here and must produce byte-identical output.
+
+WHEEL_SPECIFICATIONS_FOUND_MESSAGE = "Filtered wheel specification forms fetched successfully."
+WHEEL_SPECIFICATIONS_EMPTY_MESSAGE = "No wheel specification forms found matching the criteria."
+
+def encode_cursor(row_date: date, row_id: int) -> str:
+    """Encodes the (date, id) keyset position of a row as an opaque token."""
+    raw = json.dumps([row_date.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[date, int]:
+    """Decodes a token produced by encode_cursor; raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        row_date, row_id = json.loads(raw)
+        return date.fromisoformat(row_date), int(row_id)
+    except (binascii.Error, ValueError, TypeError) as exc:
+        raise ValueError("Invalid pagination cursor.") from exc
+
+def wheel_specification_item(spec: models.WheelSpecification) -> schemas.WheelSpecificationResponseDataItem:
+    """Converts a WheelSpecification row into its response item."""
+    return schemas.WheelSpecificationResponseDataItem(
+        formNumber=spec.form_number,
+        submittedBy=spec.submitted_by,
+        submittedDate=spec.submitted_date,
+        fields=schemas.WheelSpecificationFields(**spec.fields) if spec.fields else schemas.WheelSpecificationFields()
+    )
+
+def wheel_specifications_json_body(page, limit: int) -> bytes:
+    """
+    Wraps the items rendered by Postgres (crud.get_wheel_specifications_json) in the
+    list envelope. The bytes are identical to what the ORM path produces with
+    wheel_specification_list_response(...).model_dump_json().
+    """
+    next_cursor = None
+    if page.matched > limit:
+        next_cursor = encode_cursor(page.last_date, page.last_id)
+    message = WHEEL_SPECIFICATIONS_FOUND_MESSAGE if page.items else WHEEL_SPECIFICATIONS_EMPTY_MESSAGE
+    envelope = (
+        '{"data":[' + (page.items or "") + '],'
+        '"message":' + json.dumps(message) + ','
+        '"success":true,'
+        '"next":' + (json.dumps(next_cursor) if next_cursor else "null") + '}'
+    )
+    return envelope.encode()
+
+def wheel_specification_list_response(
+    wheel_specs: List[models.WheelSpecification], limit: int
+) -> schemas.WheelSpecificationListResponse:
+    """
+    Builds the list response from up to `limit + 1` rows; the extra row only
+    signals that another page follows.
+    """
+    next_cursor = None
+    if len(wheel_specs) > limit:
+        wheel_specs = wheel_specs[:limit]
+        next_cursor = encode_cursor(wheel_specs[-1].submitted_date, wheel_specs[-1].id)
+
+    # Convert SQLAlchemy models to Pydantic response models
+    response_data = [wheel_specification_item(spec) for spec in wheel_specs]
+
+    # If no data is found, return an empty list in data and a message
+    message = WHEEL_SPECIFICATIONS_FOUND_MESSAGE if response_data else WHEEL_SPECIFICATIONS_EMPTY_MESSAGE
+
+    return schemas.WheelSpecificationListResponse(
+        data=response_data,
+        message=message,
+        success=True,
+        next=next_cursor
+    )
+
+def bogie_checksheet_search_item(sheet: models.BogieChecksheet) -> schemas.BogieChecksheetSearchItem:
+    """Converts a BogieChecksheet row (in either condition format) into its search result item."""
+    bmbc_checksheet, bogie_checksheet_details = sheet.bmbc_checksheet, sheet.bogie_checksheet_details
+    if sheet.conditions is not None:
+        bmbc_checksheet, bogie_checksheet_details = conditions.decode(sheet.conditions)
+    return schemas.BogieChecksheetSearchItem(
+        bmbcChecksheet=bmbc_checksheet,
+        bogieChecksheet=bogie_checksheet_details,
+        bogieDetails=sheet.bogie_details,
+        formNumber=sheet.form_number,
+        inspectionBy=sheet.inspection_by,
+        inspectionDate=sheet.inspection_date,
+    )
+
+def bogie_checksheet_search_response(
+    sheets: List[models.BogieChecksheet], limit: int
+) -> schemas.BogieChecksheetSearchResponse:
+    """Builds the search response from up to `limit + 1` rows, like wheel_specification_list_response."""
+    next_cursor = None
+    if len(sheets) > limit:
+        sheets = sheets[:limit]
+        next_cursor = encode_cursor(sheets[-1].inspection_date, sheets[-1].id)
+
+    data = [bogie_checksheet_search_item(sheet) for sheet in sheets]
+    return schemas.BogieChecksheetSearchResponse(
+        data=data,
+        message="Matching bogie checksheets fetched successfully." if data else "No bogie checksheets found matching the criteria.",
+        success=True,
+        next=next_cursor
+    )
+
+def condition_counts_response(rows) -> schemas.BogieChecksheetConditionCountResponse:
+    """Builds the analytics response from crud.get_condition_counts rows."""
+    return schemas.BogieChecksheetConditionCountResponse(
+        data=[schemas.BogieChecksheetConditionCount(**row._mapping) for row in rows],
+        message="Bogie checksheet condition counts fetched successfully.",
+        success=True
+    )
@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+# Tests that need Postgres take the `database` fixture. They run against the
+# scratch database TEST_DATABASE_URL (migrated on first use, its form tables emptied
+# after every test) and are skipped without it.
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+if TEST_DATABASE_URL:
+    # Before kpa_api.database is imported: the code under test uses get_engine()
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+    os.environ.setdefault("DB_ECHO", "0")
+
+
+@pytest.fixture(scope="session")
+def database_engine():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    from kpa_api import migrations, partitions
+    from kpa_api.database import get_engine
+
+    engine = get_engine()
+    migrations.upgrade(engine)
+    partitions.maintain(engine)
+    return engine
+
+
+@pytest.fixture
+def database(database_engine):
+    """The sync engine of TEST_DATABASE_URL."""
+    from sqlalchemy import text
+
+    from kpa_api import models
+
+    yield database_engine
+    # The condition code dictionary stays: codes are cached per process (conditions.condition_codes)
+    kept = {models.BogieChecksheetConditionCode.__tablename__}
+    tables = ", ".join(table.name for table in models.Base.metadata.sorted_tables if table.name not in kept)
+    with database_engine.begin() as connection:
+        connection.execute(text(f"TRUNCATE {tables} RESTART IDENTITY"))
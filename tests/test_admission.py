@@ -0,0 +1,151 @@
+import asyncio
+import json
+
+import pytest
+
+from kpa_api.admission import ADMISSION_RETRY_AFTER_SECONDS, AdmissionController, AdmissionMiddleware, Rejected
+
+READ, WRITE, BULK = ("GET", "/api/forms/wheel-specifications"), ("POST", "/api/forms/bogie-checksheet"), ("GET", "/api/forms/wheel-specifications/export")
+
+
+def _controller(max_concurrency=1, queue_size=10, queue_timeout=5.0) -> AdmissionController:
+    return AdmissionController(
+        {"write": max_concurrency, "read": max_concurrency, "bulk": max_concurrency},
+        max_concurrency=max_concurrency, queue_size=queue_size, queue_timeout=queue_timeout, max_checkout_wait=0,
+    )
+
+
+class App:
+    """ASGI app whose requests hold their admission slot until finish() is called."""
+
+    def __init__(self):
+        self.started = []
+        self._finish = asyncio.Event()
+
+    def finish(self):
+        self._finish.set()
+
+    async def __call__(self, scope, receive, send):
+        self.started.append(scope["method"])
+        await self._finish.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def _request(middleware, method_path) -> dict:
+    method, path = method_path
+    scope = {"type": "http", "method": method, "path": path, "headers": []}
+    response = {}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response.update(status=message["status"], headers=dict(message["headers"]))
+        else:
+            response["body"] = message.get("body", b"")
+
+    await middleware(scope, receive, send)
+    return response
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_cancelled_waiter_does_not_leak_its_slot():
+    async def scenario():
+        controller = _controller()
+        await controller.acquire("read")
+        waiter = asyncio.create_task(controller.acquire("read"))
+        await _settle()
+        # The slot is handed to the waiter, whose client goes away before it resumes
+        controller.release("read")
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert waiter.cancelled()
+        assert controller.active == 0 and controller.classes["read"].active == 0
+        await controller.acquire("read")
+        assert controller.active == 1
+
+    asyncio.run(scenario())
+
+
+def test_writes_are_dispatched_before_reads():
+    async def scenario():
+        controller = _controller()
+        await controller.acquire("bulk")
+        order = []
+
+        async def queued(name):
+            await controller.acquire(name)
+            order.append(name)
+            controller.release(name)
+
+        tasks = [asyncio.create_task(queued(name)) for name in ("bulk", "read", "write")]
+        await _settle()
+        controller.release("bulk")
+        await asyncio.gather(*tasks)
+        assert order == ["write", "read", "bulk"]
+
+    asyncio.run(scenario())
+
+
+def test_write_displaces_newest_queued_read_with_503():
+    async def scenario():
+        controller, app = _controller(queue_size=2), App()
+        middleware = AdmissionMiddleware(app, controller)
+        running = asyncio.create_task(_request(middleware, WRITE))
+        await _settle()
+        older_read = asyncio.create_task(_request(middleware, READ))
+        bulk = asyncio.create_task(_request(middleware, BULK))
+        await _settle()
+        # The queue is full: the write takes the place of the bulk read, the newest read
+        write = asyncio.create_task(_request(middleware, WRITE))
+        displaced = await asyncio.wait_for(bulk, 1)
+        assert displaced["status"] == 503
+        assert displaced["headers"][b"retry-after"] == str(ADMISSION_RETRY_AFTER_SECONDS).encode()
+        assert "gave way to writes" in json.loads(displaced["body"])["detail"]
+        assert controller.classes["bulk"].rejected["displaced"] == 1
+
+        app.finish()
+        assert [(await task)["status"] for task in (running, write, older_read)] == [200, 200, 200]
+        assert app.started == ["POST", "POST", "GET"]
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_write_at_a_queue_of_writes_is_rejected():
+    async def scenario():
+        controller = _controller(queue_size=1)
+        await controller.acquire("write")
+        waiting = asyncio.create_task(controller.acquire("write"))
+        await _settle()
+        with pytest.raises(Rejected) as rejected:
+            await controller.acquire("write")
+        assert rejected.value.reason == "queue_full"
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_answers_503_with_retry_after():
+    async def scenario():
+        controller, app = _controller(queue_timeout=0.05), App()
+        middleware = AdmissionMiddleware(app, controller)
+        running = asyncio.create_task(_request(middleware, READ))
+        await _settle()
+        timed_out = await _request(middleware, READ)
+        assert timed_out["status"] == 503
+        assert timed_out["headers"][b"retry-after"] == str(ADMISSION_RETRY_AFTER_SECONDS).encode()
+        assert controller.classes["read"].rejected["queue_timeout"] == 1
+        assert not controller.classes["read"].waiting
+        app.finish()
+        assert (await running)["status"] == 200
+        assert controller.active == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from kpa_api import changefeed
+from kpa_api.changefeed import ChangeFeedListener, FormChange, format_cursor
+
+
+def _change(cursor, by="user-1") -> FormChange:
+    return FormChange("wheel-specifications", cursor[1], f"WS-{cursor[1]}", by, "2024-05-08", cursor)
+
+
+@pytest.fixture
+def listener(monkeypatch):
+    listener = ChangeFeedListener(lambda: "postgresql://unused")
+    # Pretend the listener thread is running: the tests publish by hand
+    listener._thread = object()
+    monkeypatch.setattr(changefeed, "change_listener", listener)
+    return listener
+
+
+async def _no_replay(*args, **kwargs):
+    raise AssertionError("a fresh subscriber replays nothing")
+
+
+def _events(listener, count, **filters):
+    async def collect():
+        stream = changefeed.stream_events("wheel-specifications", None, _no_replay, **filters)
+        try:
+            return [await asyncio.wait_for(stream.__anext__(), 1) for _ in range(count)]
+        finally:
+            await stream.aclose()
+    return asyncio.run(collect())
+
+
+def test_change_published_while_subscribing_is_delivered(listener):
+    listener.cursor = (10, 1)
+    subscribe = listener.subscribe
+
+    def subscribe_then_publish(kind):
+        subscription = subscribe(kind)
+        # The listener thread publishes before the stream looks at the cursor
+        listener.publish(_change((10, 2)))
+        return subscription
+
+    listener.subscribe = subscribe_then_publish
+    first, second = _events(listener, 2)
+    assert first == f"id: {format_cursor((10, 1))}\n\n"
+    assert second == _change((10, 2)).event()
+
+
+def test_live_changes_are_deduplicated(listener):
+    listener.cursor = (10, 1)
+    subscribe = listener.subscribe
+
+    def subscribe_then_publish(kind):
+        subscription = subscribe(kind)
+        # A change published twice (e.g. read again after a reconnect) and one filtered out
+        for cursor, by in (((10, 2), "user-1"), ((10, 2), "user-1"), ((11, 1), "user-2"), ((11, 2), "user-1")):
+            listener.publish(_change(cursor, by))
+        return subscription
+
+    listener.subscribe = subscribe_then_publish
+    events = _events(listener, 3, by="user-1")
+    assert events[1:] == [_change((10, 2)).event(), _change((11, 2)).event()]
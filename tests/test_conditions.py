@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy.orm import Session
+
+from benchmarks import datagen
+from kpa_api import conditions, crud, export, schemas
+
+# Spellings are stored exactly as sent: padding, case and characters outside any
+# expected vocabulary each get their own code
+_SPELLINGS = ["GOOD", "good", " Good ", "wörn — out", "", "CRACKED"]
+
+
+def _form(form_number: str, index: int = 0, **sections) -> schemas.BogieChecksheetCreate:
+    payload = next(datagen.generate("bogie", 1, seed=1))
+    for number, section in enumerate(("bmbcChecksheet", "bogieChecksheet")):
+        payload[section] = {
+            component: _SPELLINGS[(index + number + position) % len(_SPELLINGS)] if (index + position) % 4 else None
+            for position, component in enumerate(payload[section])
+        }
+    payload.update(sections, formNumber=form_number)
+    return schemas.BogieChecksheetCreate.model_validate(payload)
+
+
+@pytest.fixture
+def codes(monkeypatch):
+    codes = conditions.ConditionCodes()
+    codes.add((code, spelling) for code, spelling in enumerate(_SPELLINGS, start=1))
+    monkeypatch.setattr(conditions, "condition_codes", codes)
+    return codes
+
+
+@pytest.mark.parametrize("index", range(4))
+@pytest.mark.parametrize("omitted", [None, "bmbcChecksheet", "bogieChecksheet"])
+def test_decode_restores_the_encoded_components(codes, index, omitted):
+    form = _form("CODES-1", index, **({omitted: None} if omitted else {}))
+    sections = [None if section is None else section.model_dump() for section in (form.bmbcChecksheet, form.bogieChecksheet)]
+    stored = conditions.encode(form)
+    assert conditions.decode(stored) == tuple(sections)
+    assert conditions.decode_components(stored) == {
+        component: condition for section in sections if section for component, condition in section.items()
+    }
+
+
+def test_form_without_sections_stores_no_components(codes):
+    form = _form("CODES-1", bmbcChecksheet=None, bogieChecksheet=None)
+    assert conditions.encode(form) == []
+    assert conditions.decode([]) == (None, None)
+
+
+def test_unknown_codes_need_the_dictionary(codes):
+    stored = conditions.encode(_form("CODES-1"))
+    assert codes.has_codes([stored, None])
+    unknown = conditions.COMPONENT_NUMBERS["bolster"] << conditions.CODE_BITS | len(_SPELLINGS) + 1
+    assert not codes.has_codes([stored + [unknown]])
+    assert codes.missing_conditions(["GOOD", "Good"]) == {"Good"}
+
+
+@pytest.mark.parametrize("omitted", [None, "bmbcChecksheet"])
+def test_compact_and_jsonb_rows_export_the_same_csv(database, monkeypatch, omitted):
+    with Session(database) as db:
+        for compact in (False, True):
+            monkeypatch.setattr(conditions, "COMPACT", compact)
+            form = _form(f"EXPORT-{compact}", 1, **({omitted: None} if omitted else {}))
+            assert crud.create_bogie_checksheet(db, form) is not None
+        assert [sheet.conditions is not None for sheet in crud.search_bogie_checksheets(db)] == [False, True]
+
+        csv = b"".join(export.stream_export(db, "bogie-checksheets", export.make_encoder("bogie-checksheets", "csv")))
+    header, jsonb, compact, end = csv.decode().split("\n")
+    assert end == ""
+    assert jsonb.replace("EXPORT-False", "EXPORT-") == compact.replace("EXPORT-True", "EXPORT-")
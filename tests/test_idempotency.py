@@ -0,0 +1,117 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from benchmarks import datagen
+from kpa_api import crud, main, schemas
+from kpa_api.idempotency import IdempotencyCache, request_fingerprint
+
+PATH = "/api/forms/bogie-checksheet"
+
+
+def _response(form_number: str = "BOGIE-1") -> schemas.BogieChecksheetResponse:
+    return schemas.BogieChecksheetResponse(
+        data=schemas.BogieChecksheetResponseData(
+            formNumber=form_number, inspectionBy="user_id_1", inspectionDate="2024-05-08", status="Saved"
+        ),
+        message="Bogie checksheet submitted successfully.",
+        success=True,
+    )
+
+
+def test_same_key_and_payload_replays_the_response():
+    cache = IdempotencyCache()
+    assert cache.reserve("key", "payload") is None
+    with cache.guard("key"):
+        cache.complete("key", 201, _response())
+    assert cache.reserve("key", "payload") == {"status_code": 201, "body": _response().model_dump(mode="json")}
+
+
+def test_same_key_with_another_payload_conflicts():
+    cache = IdempotencyCache()
+    cache.reserve("key", "payload")
+    cache.complete("key", 201, _response())
+    with pytest.raises(HTTPException) as raised:
+        cache.reserve("key", "another payload")
+    assert raised.value.status_code == 422
+
+
+def test_key_in_flight_is_rejected():
+    cache = IdempotencyCache()
+    cache.reserve("key", "payload")
+    # A concurrent retry while the first request is still being processed
+    with pytest.raises(HTTPException) as raised:
+        cache.reserve("key", "payload")
+    assert raised.value.status_code == 409
+
+
+def test_client_errors_are_replayed():
+    cache = IdempotencyCache()
+    cache.reserve("key", "payload")
+    with pytest.raises(HTTPException):
+        with cache.guard("key"):
+            raise HTTPException(status_code=400, detail="duplicate")
+    assert cache.reserve("key", "payload") == {"status_code": 400, "body": {"detail": "duplicate"}}
+
+
+@pytest.mark.parametrize("error", [HTTPException(status_code=503), RuntimeError("database down")])
+def test_failures_release_the_key(error):
+    cache = IdempotencyCache()
+    cache.reserve("key", "payload")
+    with pytest.raises(type(error)):
+        with cache.guard("key"):
+            raise error
+    # The retry is processed again
+    assert cache.reserve("key", "payload") is None
+
+
+def test_expired_and_evicted_keys_are_processed_again():
+    cache = IdempotencyCache(ttl=-1)
+    cache.reserve("key", "payload")
+    cache.complete("key", 201, _response())
+    assert cache.reserve("key", "payload") is None
+
+    cache = IdempotencyCache(max_entries=1)
+    cache.reserve("first", "payload")
+    cache.reserve("second", "payload")
+    assert cache.reserve("first", "payload") is None
+
+
+def test_fingerprint_ignores_formatting_but_not_content():
+    payload = next(datagen.generate("bogie", 1, seed=1))
+    form = schemas.BogieChecksheetCreate.model_validate(payload)
+    reordered = schemas.BogieChecksheetCreate.model_validate(dict(reversed(list(payload.items()))))
+    changed = schemas.BogieChecksheetCreate.model_validate(dict(payload, inspectionBy="someone else"))
+    assert request_fingerprint(form) == request_fingerprint(reordered)
+    assert request_fingerprint(form) != request_fingerprint(changed)
+
+
+def test_endpoint_replays_without_saving_again(monkeypatch):
+    monkeypatch.setattr(main, "idempotency_cache", IdempotencyCache())
+    saved = []
+
+    def create_bogie_checksheet(db, bogie_checksheet):
+        saved.append(bogie_checksheet.formNumber)
+        return SimpleNamespace(
+            form_number=bogie_checksheet.formNumber,
+            inspection_by=bogie_checksheet.inspectionBy,
+            inspection_date=bogie_checksheet.inspectionDate,
+        )
+
+    monkeypatch.setattr(crud, "create_bogie_checksheet", create_bogie_checksheet)
+    main.app.dependency_overrides[main.get_db] = lambda: None
+    try:
+        client = TestClient(main.app)
+        payload = next(datagen.generate("bogie", 1, seed=1))
+        first = client.post(PATH, json=payload, headers={"Idempotency-Key": "retry-1"})
+        again = client.post(PATH, json=payload, headers={"Idempotency-Key": "retry-1"})
+        other = client.post(PATH, json=dict(payload, inspectionBy="someone else"), headers={"Idempotency-Key": "retry-1"})
+    finally:
+        main.app.dependency_overrides.pop(main.get_db)
+    assert first.status_code == again.status_code == 201
+    assert again.json() == first.json()
+    assert again.headers["Idempotent-Replayed"] == "true"
+    assert other.status_code == 422
+    assert saved == [payload["formNumber"]]
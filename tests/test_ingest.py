@@ -0,0 +1,97 @@
+import os
+from datetime import date, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from benchmarks import datagen
+from kpa_api import crud, ingest, models, schemas
+from kpa_api.ingest import IngestQueue
+
+
+def _forms(count: int, prefix: str):
+    return [schemas.BogieChecksheetCreate.model_validate(payload) for payload in datagen.generate("bogie", count, prefix=prefix)]
+
+
+def _crash(queue: IngestQueue, torn: bytes = b""):
+    """
+    Stops `queue` the way a killed worker would leave it: nothing is saved on the
+    way out, and `torn` is the start of a record that was being written.
+    """
+    queue._save = lambda batch: False
+    queue.stop(timeout=1)
+    if torn:
+        with open(ingest._segment_path(queue.slot, ingest._segments(queue.slot)[-1]), "ab") as file:
+            file.write(torn)
+
+
+def _records(slot: str):
+    return [ingest._submission(line, (segment, end)).tracking_id for segment, end, line in ingest._read_records(slot)]
+
+
+def test_restart_replays_unsaved_records_and_drops_the_torn_tail(tmp_path, monkeypatch):
+    saved = []
+
+    def save(queue, batch):
+        saved.extend(item.tracking_id for item in batch)
+        queue._complete(batch)
+        return True
+
+    queue = IngestQueue(str(tmp_path), segment_bytes=2048)
+    queue.start()
+    submitted = [queue.submit(form).tracking_id for form in _forms(5, "CRASH")]
+    _crash(queue, torn=b'{"trackingId":"never-acknowledged","form":{')
+    assert _records(queue.slot) == submitted
+
+    monkeypatch.setattr(IngestQueue, "_save", save)
+    restarted = IngestQueue(str(tmp_path), segment_bytes=2048)
+    restarted.start()
+    assert restarted.slot == queue.slot
+    # The torn record is cut off, so the next one is appended after the last complete record
+    later = restarted.submit(_forms(1, "LATER")[0]).tracking_id
+    restarted.stop(timeout=5)
+    assert saved == submitted + [later]
+    assert _records(restarted.slot) == []
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_replay_after_crash_saves_every_form_once(database, tmp_path):
+    queue = IngestQueue(str(tmp_path), batch_size=3)
+    queue.start()
+    forms = _forms(6, "REPLAY")
+    # Two submissions of one formNumber: only the first is saved
+    forms.append(forms[0].model_copy(update={"inspectionBy": "someone else"}))
+    submissions = [queue.submit(form) for form in forms]
+    _crash(queue, torn=b'{"trackingId":"torn"')
+
+    # The first batch was committed, but the worker died before it moved the checkpoint
+    with Session(database) as db:
+        crud.ingest_bogie_checksheet_submissions(db, [(item.tracking_id, item.received_at, item.form) for item in submissions[:3]])
+
+    restarted = IngestQueue(str(tmp_path), batch_size=3)
+    restarted.start()
+    restarted.stop(timeout=10)
+    assert restarted.stats["lastError"] is None
+    assert _records(restarted.slot) == []
+
+    with Session(database) as db:
+        saved = db.execute(
+            select(models.BogieChecksheet.form_number, func.count()).group_by(models.BogieChecksheet.form_number)
+        ).all()
+        outcomes = dict(db.execute(select(models.BogieChecksheetSubmission.tracking_id, models.BogieChecksheetSubmission.status)).all())
+    assert sorted(saved) == sorted((form.formNumber, 1) for form in forms[:6])
+    assert outcomes == {
+        item.tracking_id: "Duplicate" if index == 6 else "Saved" for index, item in enumerate(submissions)
+    }
+
+
+def test_prune_deletes_outcomes_processed_before_the_date(database, tmp_path):
+    queue = IngestQueue(str(tmp_path))
+    queue.start()
+    for form in _forms(2, "PRUNE"):
+        queue.submit(form)
+    queue.stop(timeout=10)
+    with Session(database) as db:
+        assert ingest.prune(db, date.today() - timedelta(days=1)) == 0
+        assert ingest.prune(db, date.today() + timedelta(days=1)) == 2
+        assert db.scalar(select(func.count()).select_from(models.BogieChecksheetSubmission)) == 0
@@ -0,0 +1,75 @@
+import random
+from decimal import Decimal
+
+import pytest
+
+from benchmarks import datagen
+from kpa_api.measurements import Measurement, measurement_rows, parse_measurement
+
+
+def _out_of_tolerance(measurement: Measurement) -> bool:
+    """The outOfTolerance condition of measurements.measurement_condition, in Python."""
+    return (
+        measurement.min_value is not None and measurement.nominal < measurement.min_value
+    ) or (
+        measurement.max_value is not None and measurement.nominal > measurement.max_value
+    )
+
+
+@pytest.mark.parametrize(
+    "text, field, expected",
+    [
+        # Absolute limits
+        ("825 (800-900)", "condemningDia", ("825", "800", "900")),
+        ("950 (1000-900)", "treadDiameterNew", ("950", "900", "1000")),
+        # Range: nominal is the midpoint
+        ("130.043 TO 130.068", "bearingSeatDiameter", ("130.0555", "130.043", "130.068")),
+        ("20 to 28", "intermediateWWP", ("24", "20", "28")),
+        # Readings: deviations apply to the field's specified size, not to the reading
+        ("1603 (+2,-1)", "wheelGauge", ("1603", "1599", "1602")),
+        ("280.041 (+0.030/+0.052)", "axleBoxHousingBoreDia", ("280.041", "280.030", "280.052")),
+        ("92.9 (+0/-0.250)", "rollerBearingWidth", ("92.9", "92.750", "93")),
+        ("129 (+4/-0)", "wheelDiscWidth", ("129", "127", "131")),
+        # The specification itself: nominal is the midpoint of its limits
+        ("1600 (+2,-1)", "wheelGauge", ("1600.5", "1599", "1602")),
+        ("280 (+0.030/+0.052)", "axleBoxHousingBoreDia", ("280.041", "280.030", "280.052")),
+        ("130 (+0.0/-0.025)", "rollerBearingBoreDia", ("129.9875", "129.975", "130.0")),
+        # Fields without a listed size: the number is the specified size
+        ("5 (+1,-1)", "variationSameBogie", ("5", "4", "6")),
+        ("5 (+1,-1)", None, ("5", "4", "6")),
+        # Unrecognised tolerance, nominal only
+        ("280 (H7)", "axleBoxHousingBoreDia", ("280", None, None)),
+        ("0.5", "variationSameAxle", ("0.5", None, None)),
+        ("29.4 Flange Thickness", "wheelProfile", ("29.4", None, None)),
+    ],
+)
+def test_parse_measurement(text, field, expected):
+    assert parse_measurement(text, field) == Measurement(
+        *(Decimal(value) if value is not None else None for value in expected)
+    )
+
+
+@pytest.mark.parametrize("text", [None, "", "N/A", "approx. 5"])
+def test_parse_measurement_without_number(text):
+    assert parse_measurement(text, "condemningDia") is None
+
+
+def test_deviation_reading_outside_spec_is_out_of_tolerance():
+    assert _out_of_tolerance(parse_measurement("1603 (+2,-1)", "wheelGauge"))
+    assert _out_of_tolerance(parse_measurement("280.060 (+0.030/+0.052)", "axleBoxHousingBoreDia"))
+    assert not _out_of_tolerance(parse_measurement("280.041 (+0.030/+0.052)", "axleBoxHousingBoreDia"))
+
+
+def test_specification_is_not_out_of_tolerance():
+    # The documented sample form records the specification, not a reading
+    for field, text in (("axleBoxHousingBoreDia", "280 (+0.030/+0.052)"), ("rollerBearingWidth", "93 (+0/-0.250)")):
+        assert not _out_of_tolerance(parse_measurement(text, field))
+
+
+def test_generated_in_tolerance_readings_are_in_tolerance(monkeypatch):
+    # benchmarks.datagen writes readings within each field's limits, except at OUT_OF_TOLERANCE_RATE
+    monkeypatch.setattr(datagen, "OUT_OF_TOLERANCE_RATE", 0)
+    rng = random.Random(1)
+    for _ in range(200):
+        for row in measurement_rows(datagen.wheel_specification_fields(rng)):
+            assert not _out_of_tolerance(Measurement(row.nominal, row.min_value, row.max_value)), row.field
@@ -0,0 +1,67 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from kpa_api import crud, main
+from kpa_api.cache import LocalCacheBackend, ResponseCache, make_etag
+from kpa_api.serialization import wheel_specification_list_response
+
+PATH = "/api/forms/wheel-specifications"
+
+
+class FakeReadSession:
+    """Stands in for a ReadSessionLocal session; info["replica"] is what the router picked."""
+
+    def __init__(self, replica=None):
+        self.info = {"replica": replica}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    cache = ResponseCache("wheel_specifications", LocalCacheBackend(), ttl=60)
+    monkeypatch.setattr(main, "wheel_specifications_cache", cache)
+    monkeypatch.setattr(main, "RESPONSE_SERIALIZATION", "pydantic")
+    reads = []
+
+    def get_wheel_specifications(db, limit, **filters):
+        reads.append(db.info["replica"])
+        return []
+
+    monkeypatch.setattr(crud, "get_wheel_specifications", get_wheel_specifications)
+    session = FakeReadSession()
+    main.app.dependency_overrides[main.get_read_db] = lambda: session
+    try:
+        yield TestClient(main.app), session, cache, reads
+    finally:
+        main.app.dependency_overrides.pop(main.get_read_db)
+
+
+def test_primary_reads_are_cached(client):
+    http, session, cache, reads = client
+    assert http.get(PATH).status_code == 200
+    assert http.get(PATH).status_code == 200
+    assert reads == [None]
+
+
+def test_replica_reads_are_not_cached(client):
+    # The replica may not have replayed the insert that bumped the generation
+    http, session, cache, reads = client
+    session.info["replica"] = 0
+    cache.invalidate()
+    etag = http.get(PATH).headers["ETag"]
+    assert etag == make_etag(wheel_specification_list_response([], 100).model_dump_json().encode())
+    http.get(PATH)
+    assert reads == [0, 0]
+
+
+def test_consistency_token_bypasses_the_cache(client):
+    http, session, cache, reads = client
+    token = {main.CONSISTENCY_TOKEN_HEADER: "0/16B3748"}
+    # Neither served from the cache (a cached page may predate the token's write) ...
+    http.get(PATH)
+    assert http.get(PATH, headers=token).status_code == 200
+    assert reads == [None, None]
+    # ... nor stored in it
+    cache.invalidate()
+    http.get(PATH, headers=token)
+    http.get(PATH)
+    assert reads == [None, None, None, None]
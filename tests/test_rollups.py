@@ -0,0 +1,73 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from benchmarks import datagen
+from kpa_api import conditions, crud, models, rollups, schemas
+
+
+def _form(**overrides) -> schemas.BogieChecksheetCreate:
+    payload = next(datagen.generate("bogie", 1, seed=1))
+    payload.update(overrides)
+    return schemas.BogieChecksheetCreate.model_validate(payload)
+
+
+def test_counts_skip_omitted_sections():
+    form = _form(bmbcChecksheet=None, inspectionDate="2024-05-08")
+    counts = rollups.condition_rollup_counts([form])
+    components = {component for _, component, _, _, _ in counts}
+    assert components == set(form.bogieChecksheet.model_dump())
+    assert {week for week, _, _, _, _ in counts} == {date(2024, 5, 6)}
+
+
+def test_omitted_sections_are_inserted_as_sql_null():
+    form = _form(bmbcChecksheet=None, bogieChecksheet=None, bogieDetails=None)
+    sql = str(crud.insert_bogie_checksheet_statement(form).compile(dialect=postgresql.dialect()))
+    values = sql[sql.index("VALUES"):sql.index("AS payload")]
+    assert values.count("NULL") == 3
+    assert "::JSONB" not in values
+
+
+# Spellings the two normalizations must agree on: padding, case, the "/" split of
+# the division and the first four-digit run of the maker year
+_DETAILS = [
+    {"incomingDivAndDate": " nr / 2025-06-25", "makerYearBuilt": "RDSO/2018"},
+    {"incomingDivAndDate": "NR/2025-06-25 ", "makerYearBuilt": "built 1999, rebuilt 2012"},
+    {"incomingDivAndDate": "Cr", "makerYearBuilt": "unknown"},
+    {"incomingDivAndDate": "", "makerYearBuilt": ""},
+    {},
+    None,
+]
+_CONDITIONS = [" cracked ", "CRACKED", "Good", "  ", "worn out"]
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_rebuild_matches_condition_rollup_counts(database, monkeypatch, compact):
+    monkeypatch.setattr(conditions, "COMPACT", compact)
+    forms = []
+    for index, details in enumerate(_DETAILS):
+        form = _form(formNumber=f"ROLLUP-{compact}-{index}", inspectionDate=f"2024-05-{6 + index:02d}")
+        sections = form.model_dump(mode="json")
+        for section in ("bmbcChecksheet", "bogieChecksheet"):
+            sections[section] = {
+                component: _CONDITIONS[(index + number) % len(_CONDITIONS)]
+                for number, component in enumerate(sections[section])
+            }
+        if index == 2:
+            sections["bmbcChecksheet"] = None
+        sections["bogieDetails"] = details
+        forms.append(schemas.BogieChecksheetCreate.model_validate(sections))
+
+    with Session(database) as db:
+        for form in forms:
+            assert crud.create_bogie_checksheet(db, form) is not None
+        rebuilt = {tuple(row[:5]): row[5] for row in db.execute(rollups._rebuild_select())}
+        stored = {
+            (row.week, row.component, row.condition, row.division, row.maker_year): row.count
+            for row in db.scalars(select(models.BogieChecksheetConditionRollup))
+        }
+    assert rebuilt and rebuilt == dict(rollups.condition_rollup_counts(forms))
+    assert stored == rebuilt
@@ -0,0 +1,94 @@
+import base64
+import json
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from benchmarks import datagen
+from kpa_api import crud, main, schemas
+from kpa_api.serialization import (
+    decode_cursor, encode_cursor, wheel_specification_list_response, wheel_specifications_json_body,
+)
+
+
+def _token(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("row_date, row_id", [(date(2024, 5, 8), 1), (date(1999, 12, 31), 2**31 - 1), (date(2025, 1, 1), 0)])
+def test_cursor_round_trip(row_date, row_id):
+    cursor = encode_cursor(row_date, row_id)
+    # Opaque and safe in a query string without escaping
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+    assert decode_cursor(cursor) == (row_date, row_id)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "",
+        "!!!",
+        "a",
+        "é",
+        _token(None),
+        _token({}),
+        _token(["2024-05-08"]),
+        _token(["2024-05-08", 1, 2]),
+        _token(["2024-13-01", 1]),
+        _token(["2024-05-08", "one"]),
+        _token(["2024-05-08", None]),
+        _token([20240508, 1]),
+        base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+    ],
+)
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid pagination cursor"):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("path", ["/api/forms/wheel-specifications", "/api/forms/bogie-checksheet"])
+def test_malformed_cursor_is_400(path):
+    # Rejected before the database is queried
+    main.app.dependency_overrides[main.get_read_db] = lambda: None
+    try:
+        response = TestClient(main.app).get(path, params={"cursor": _token(["not a date", 1])})
+    finally:
+        main.app.dependency_overrides.pop(main.get_read_db)
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid pagination cursor."}
+
+
+# Text the two renderers must escape alike: quotes, backslashes, control and non-ASCII characters
+_AWKWARD = ['say "880"', "C:\\wheels\\", "tab\tnew\nline\r", "\x01\x1f\x7f", "é ✓ ∅ 🚆", "</script>", "\u2028\u2029"]
+
+
+def _wheel_forms():
+    payloads = list(datagen.generate("wheel", 6, seed=1, prefix="JSON"))
+    for index, payload in enumerate(payloads):
+        payload["submittedDate"] = f"2024-0{1 + index % 3}-0{1 + index}"
+        fields = payload["fields"]
+        for position, name in enumerate(fields):
+            if (index + position) % 3 == 0:
+                fields[name] = None
+            elif (index + position) % 3 == 1:
+                fields[name] = _AWKWARD[(index + position) % len(_AWKWARD)]
+    payloads[0]["fields"] = {}
+    payloads[1]["submittedBy"] = _AWKWARD[0]
+    return [schemas.WheelSpecificationCreate.model_validate(payload) for payload in payloads]
+
+
+def test_database_rendering_matches_pydantic(database):
+    for form in _wheel_forms():
+        # One session per form: a partition is created outside the caller's transaction
+        with Session(database) as db:
+            crud.create_dummy_wheel_specification(db, form)
+    with Session(database) as db:
+        second_page = decode_cursor(wheel_specification_list_response(crud.get_wheel_specifications(db, limit=3), 2).next)
+        # Pages followed by another, exactly filled, short, empty, and a second page
+        pages = [({}, 2), ({}, 6), ({}, 100), ({"submitted_by": "nobody"}, 10), ({"after": second_page}, 2)]
+        for filters, limit in pages:
+            rendered = wheel_specifications_json_body(crud.get_wheel_specifications_json(db, limit=limit, **filters), limit)
+            orm = wheel_specification_list_response(crud.get_wheel_specifications(db, limit=limit + 1, **filters), limit)
+            assert rendered == orm.model_dump_json().encode(), (filters, limit)